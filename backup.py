@@ -1,15 +1,30 @@
-## This script backs up a local SQLite database to Dropbox.
+## This script backs up a local SQLite database to Dropbox or a local directory.
+## The snapshot is taken through SQLite's online backup API, so it is consistent even
+## while the app is writing, and it is gzip-compressed on disk before upload; the
+## database is never read into memory. Old backups are rotated out after each run.
+## With --incremental only the pages that changed since earlier backups are stored,
+## and --restore rebuilds the backup of any stored day.
+##
+##   python backup.py --db-path db/trading_journal.db --local-dir /mnt/backup --incremental
+##   python backup.py --local-dir /mnt/backup --list
+##   python backup.py --local-dir /mnt/backup --restore 20250131 --output restored.db
 ## It reads Dropbox API credentials from environment variables using python-dotenv.
 ## This scripts can be run as a standalone script, provided the required libraries are installed.
 
 import sys
 import argparse
+import gzip
+import hashlib
+import json
 import logging
-import dotenv
-from datetime import date
-import dropbox
-from dropbox.files import WriteMode
-from dropbox.exceptions import ApiError, AuthError
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from pathlib import Path
 
 logging.basicConfig(
     level=logging.INFO,
@@ -17,73 +32,548 @@ logging.basicConfig(
     handlers=[logging.StreamHandler(sys.stdout)],
 )
 
+backup_prefix = "trade_diary_backup_"
+# Full backups (.db.gz, or uncompressed .db from earlier versions) and incremental
+# manifests, all rotated together
+backup_name_pattern = re.compile(
+    rf"^{backup_prefix}(\d{{8}})\.(db|db\.gz|manifest\.json)$"
+)
+copy_chunk_size = 1024 * 1024
+chunk_folder = "chunks"
+incremental_chunk_size = 256 * 1024
+transfer_workers = 4
+
+
+# Copies the live database into snapshot_path with the online backup API. The copy
+# runs in a single step, so it reads one consistent version of the database; in WAL
+# mode the app keeps writing meanwhile.
+def snapshot_database(db_path, snapshot_path):
+    if not Path(db_path).is_file():
+        raise FileNotFoundError(db_path)
+    source = sqlite3.connect(db_path)
+    try:
+        target = sqlite3.connect(snapshot_path)
+        try:
+            source.backup(target)
+            result = target.execute("PRAGMA quick_check").fetchone()[0]
+            if result != "ok":
+                raise sqlite3.DatabaseError(f"Snapshot failed quick_check: {result}")
+        finally:
+            target.close()
+    finally:
+        source.close()
+
+
+def compress_file(source_path, target_path):
+    with open(source_path, "rb") as src:
+        with gzip.open(target_path, "wb", compresslevel=6) as dst:
+            shutil.copyfileobj(src, dst, copy_chunk_size)
+
+
+class LocalDestination:
+    def __init__(self, directory):
+        self.directory = Path(directory)
+
+    def __str__(self):
+        return str(self.directory)
+
+    def upload(self, local_path, name):
+        target = self.directory / name
+        target.parent.mkdir(parents=True, exist_ok=True)
+        partial = target.with_name(f".{target.name}.partial")
+        shutil.copyfile(local_path, partial)
+        os.replace(partial, target)
+        return str(target)
+
+    def download(self, name, local_path):
+        shutil.copyfile(self.directory / name, local_path)
+
+    def put(self, name, data):
+        target = self.directory / name
+        target.parent.mkdir(parents=True, exist_ok=True)
+        partial = target.with_name(f".{target.name}.partial")
+        partial.write_bytes(data)
+        os.replace(partial, target)
+
+    def get(self, name):
+        return (self.directory / name).read_bytes()
+
+    def list_names(self, folder=""):
+        directory = self.directory / folder
+        if not directory.exists():
+            return []
+        return [
+            p.name
+            for p in directory.iterdir()
+            if p.is_file() and not p.name.endswith(".partial")
+        ]
+
+    def delete(self, name):
+        (self.directory / name).unlink(missing_ok=True)
+
+
+# Files up to chunk_size go up in one call; larger ones through an upload session,
+# one chunk at a time, which also lifts the 150 MB limit of files_upload.
+class DropboxDestination:
+    def __init__(self, dbx, folder, chunk_size=8 * 1024 * 1024):
+        self.dbx = dbx
+        self.folder = folder.rstrip("/")
+        self.chunk_size = chunk_size
+
+    def __str__(self):
+        return f"Dropbox:{self.folder}"
+
+    def upload(self, local_path, name):
+        from dropbox.files import CommitInfo, UploadSessionCursor, WriteMode
+
+        path = f"{self.folder}/{name}"
+        size = os.path.getsize(local_path)
+        with open(local_path, "rb") as f:
+            if size <= self.chunk_size:
+                self.dbx.files_upload(f.read(), path, mode=WriteMode("overwrite"))
+                return path
+
+            session = self.dbx.files_upload_session_start(f.read(self.chunk_size))
+            cursor = UploadSessionCursor(session_id=session.session_id, offset=f.tell())
+            commit = CommitInfo(path=path, mode=WriteMode("overwrite"))
+            while True:
+                chunk = f.read(self.chunk_size)
+                if f.tell() >= size:
+                    self.dbx.files_upload_session_finish(chunk, cursor, commit)
+                    return path
+                self.dbx.files_upload_session_append_v2(chunk, cursor)
+                cursor.offset = f.tell()
+
+    def download(self, name, local_path):
+        self.dbx.files_download_to_file(str(local_path), f"{self.folder}/{name}")
+
+    def put(self, name, data):
+        from dropbox.files import WriteMode
+
+        self.dbx.files_upload(
+            data, f"{self.folder}/{name}", mode=WriteMode("overwrite")
+        )
+
+    def get(self, name):
+        _, response = self.dbx.files_download(f"{self.folder}/{name}")
+        return response.content
+
+    def list_names(self, folder=""):
+        from dropbox.exceptions import ApiError
+
+        path = f"{self.folder}/{folder}".rstrip("/")
+        try:
+            result = self.dbx.files_list_folder(path)
+        except ApiError as err:
+            # A folder that was never written to is an empty listing
+            if err.error.is_path() and err.error.get_path().is_not_found():
+                return []
+            raise
+        names = [entry.name for entry in result.entries]
+        while result.has_more:
+            result = self.dbx.files_list_folder_continue(result.cursor)
+            names.extend(entry.name for entry in result.entries)
+        return names
+
+    def delete(self, name):
+        self.dbx.files_delete_v2(f"{self.folder}/{name}")
+
+
+# Incremental backups split the snapshot into fixed runs of database pages and
+# store each distinct run once under chunks/, named by its SHA-256 and gzipped. A
+# manifest per backup lists the chunk hashes in file order. The backup API copies
+# pages verbatim, so pages the app did not touch hash the same as the day before
+# and only changed chunks are uploaded.
+def _chunk_size(page_size, chunk_size):
+    return max(page_size, chunk_size // page_size * page_size)
+
+
+def _transfer(function, items, workers=transfer_workers):
+    # Runs function over items on a few threads, keeping at most two items per
+    # worker in flight so chunks are not all read into memory at once
+    results = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = []
+        for item in items:
+            pending.append(executor.submit(function, *item))
+            if len(pending) >= workers * 2:
+                results.append(pending.pop(0).result())
+        results.extend(future.result() for future in pending)
+    return results
+
+
+def store_incremental(destination, snapshot_path, manifest_name, chunk_size):
+    conn = sqlite3.connect(snapshot_path)
+    try:
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    finally:
+        conn.close()
+    chunk_size = _chunk_size(page_size, chunk_size)
+    stored = set(destination.list_names(chunk_folder))
+
+    digest = hashlib.sha256()
+    hashes = []
+    uploaded = []
+
+    def put_chunk(name, data):
+        destination.put(f"{chunk_folder}/{name}", gzip.compress(data, 6))
+        return len(data)
+
+    def new_chunks():
+        with open(snapshot_path, "rb") as f:
+            while chunk := f.read(chunk_size):
+                digest.update(chunk)
+                name = hashlib.sha256(chunk).hexdigest()
+                hashes.append(name)
+                if name not in stored:
+                    stored.add(name)
+                    uploaded.append(name)
+                    yield name, chunk
+
+    sent = sum(_transfer(put_chunk, new_chunks()))
+    manifest = {
+        "version": 1,
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "size": os.path.getsize(snapshot_path),
+        "page_size": page_size,
+        "chunk_size": chunk_size,
+        "sha256": digest.hexdigest(),
+        "chunks": hashes,
+    }
+    # Written last, so a manifest never names a chunk that is not stored yet
+    destination.put(manifest_name, json.dumps(manifest).encode())
+    logging.info(
+        f"Stored {len(uploaded)} new of {len(hashes)} chunks ({sent:,} of "
+        f"{manifest['size']:,} bytes before compression)"
+    )
+    return manifest
+
+
+def _dated_backups(destination):
+    dated = {}
+    for name in destination.list_names():
+        match = backup_name_pattern.match(name)
+        if match:
+            dated.setdefault(match.group(1), []).append(name)
+    return dated
+
+
+# Deletes stored chunks that no remaining manifest lists
+def _collect_chunks(destination, manifest_names):
+    referenced = set()
+    for name in manifest_names:
+        referenced.update(json.loads(destination.get(name))["chunks"])
+    unused = set(destination.list_names(chunk_folder)) - referenced
+    for name in unused:
+        destination.delete(f"{chunk_folder}/{name}")
+    if unused:
+        logging.info(f"Deleted {len(unused)} chunks no backup refers to")
+    return len(unused)
+
+
+# Keeps the newest keep_daily backups plus the newest backup of each of the last
+# keep_monthly months, and deletes the other backups in the destination, along
+# with chunks only they used. Files that are not backups are left alone. Returns
+# the names deleted.
+def rotate_backups(destination, keep_daily=7, keep_monthly=12):
+    dated = _dated_backups(destination)
+    days = sorted(dated, reverse=True)
+
+    keep = set(days[:keep_daily])
+    months = {}
+    for day in days:
+        months.setdefault(day[:6], day)
+    keep.update(sorted(months.values(), reverse=True)[:keep_monthly])
+
+    deleted = []
+    for day in days:
+        if day in keep:
+            continue
+        for name in dated[day]:
+            destination.delete(name)
+            deleted.append(name)
+    if deleted:
+        logging.info(f"Rotated out {len(deleted)} old backups from {destination}")
+    if any(name.endswith(".manifest.json") for name in deleted):
+        _collect_chunks(
+            destination,
+            [
+                name
+                for day in keep
+                for name in dated[day]
+                if name.endswith(".manifest.json")
+            ],
+        )
+    return deleted
+
+
+# Snapshots the database and stores it, then rotates old backups. A full backup
+# is compressed and uploaded whole; an incremental one uploads only the chunks
+# no earlier backup stored. Returns the backup date, or None if the backup failed.
+def run_backup(
+    db_path,
+    destination,
+    keep_daily=7,
+    keep_monthly=12,
+    incremental=False,
+    chunk_size=incremental_chunk_size,
+):
+    logging.info(f"Starting database backup to {destination}...")
+    today_date = date.today()
+    backup_name = f"{backup_prefix}{today_date.strftime('%Y%m%d')}"
+    with tempfile.TemporaryDirectory(prefix="trade_diary_backup_") as work_dir:
+        snapshot_path = Path(work_dir) / "snapshot.db"
+        try:
+            started = datetime.now()
+            snapshot_database(db_path, snapshot_path)
+            if incremental:
+                location = f"{destination}/{backup_name}.manifest.json"
+                store_incremental(
+                    destination,
+                    snapshot_path,
+                    f"{backup_name}.manifest.json",
+                    chunk_size,
+                )
+            else:
+                compressed_path = Path(work_dir) / f"{backup_name}.db.gz"
+                compress_file(snapshot_path, compressed_path)
+                logging.info(
+                    f"Snapshot of {os.path.getsize(snapshot_path):,} bytes "
+                    f"compressed to {os.path.getsize(compressed_path):,} bytes"
+                )
+                snapshot_path.unlink()
+                location = destination.upload(compressed_path, compressed_path.name)
+            logging.info(
+                f"Database backup successful: {location} in "
+                f"{(datetime.now() - started).total_seconds():.1f}s"
+            )
+        except FileNotFoundError:
+            logging.error(f"ERROR: Database file not found at {db_path}; Backup Failed")
+            return None
+        except Exception as e:
+            logging.error(f"Error during backup: {e}; Backup Failed")
+            return None
+
+    try:
+        rotate_backups(destination, keep_daily, keep_monthly)
+    except Exception as e:
+        logging.error(f"Error rotating old backups: {e}")
+    return today_date
+
+
+# Backup days in the destination, newest first, with the kinds stored for each
+def list_backups(destination):
+    dated = _dated_backups(destination)
+    return [
+        (day, sorted(backup_name_pattern.match(n).group(2) for n in dated[day]))
+        for day in sorted(dated, reverse=True)
+    ]
+
+
+def _restore_manifest(destination, manifest_name, target_path):
+    manifest = json.loads(destination.get(manifest_name))
+    digest = hashlib.sha256()
+
+    def fetch(name):
+        chunk = gzip.decompress(destination.get(f"{chunk_folder}/{name}"))
+        if hashlib.sha256(chunk).hexdigest() != name:
+            raise ValueError(f"Chunk {name} is corrupt")
+        return chunk
+
+    with open(target_path, "wb") as f:
+        # Fetched a window at a time, in order, so memory stays bounded
+        window = transfer_workers * 2
+        with ThreadPoolExecutor(max_workers=transfer_workers) as executor:
+            for start in range(0, len(manifest["chunks"]), window):
+                names = manifest["chunks"][start : start + window]
+                for chunk in executor.map(fetch, names):
+                    digest.update(chunk)
+                    f.write(chunk)
+    if digest.hexdigest() != manifest["sha256"]:
+        raise ValueError(f"Restored file does not match {manifest_name}")
+
+
+# Rebuilds the backup of day (YYYYMMDD, or "latest") into target_path, from its
+# manifest when it has one or else from the full backup. The file is checked
+# before it replaces target_path. Returns the day restored.
+def restore_backup(destination, day, target_path):
+    dated = _dated_backups(destination)
+    if not dated:
+        raise FileNotFoundError(f"No backups found in {destination}")
+    day = max(dated) if day == "latest" else day
+    if day not in dated:
+        raise FileNotFoundError(f"No backup for {day} in {destination}")
+    names = dated[day]
+
+    target_path = Path(target_path)
+    partial = target_path.with_name(f".{target_path.name}.partial")
+    try:
+        manifest = f"{backup_prefix}{day}.manifest.json"
+        if manifest in names:
+            _restore_manifest(destination, manifest, partial)
+        elif f"{backup_prefix}{day}.db.gz" in names:
+            compressed = partial.with_suffix(".gz")
+            destination.download(f"{backup_prefix}{day}.db.gz", compressed)
+            with gzip.open(compressed, "rb") as src, open(partial, "wb") as dst:
+                shutil.copyfileobj(src, dst, copy_chunk_size)
+            compressed.unlink()
+        else:
+            destination.download(f"{backup_prefix}{day}.db", partial)
+
+        conn = sqlite3.connect(partial)
+        try:
+            result = conn.execute("PRAGMA quick_check").fetchone()[0]
+        finally:
+            conn.close()
+        if result != "ok":
+            raise sqlite3.DatabaseError(f"Restored file failed quick_check: {result}")
+        os.replace(partial, target_path)
+    finally:
+        partial.unlink(missing_ok=True)
+        partial.with_suffix(".gz").unlink(missing_ok=True)
+    logging.info(f"Restored backup of {day} to {target_path}")
+    return day
+
+
+def connect_dropbox():
+    import dotenv
+    import dropbox
+    from dropbox.exceptions import AuthError
 
-def backup_database(db_path, dropbox_path):
-    logging.info("Starting database backup to Dropbox...")
     DROPBOX_REFRESH_TOKEN = dotenv.get_key(
         dotenv.find_dotenv(), "DROPBOX_REFRESH_TOKEN"
     )
     DROPBOX_APP_KEY = dotenv.get_key(dotenv.find_dotenv(), "DROPBOX_APP_KEY")
     DROPBOX_APP_SECRET = dotenv.get_key(dotenv.find_dotenv(), "DROPBOX_APP_SECRET")
 
-    if DROPBOX_REFRESH_TOKEN and DROPBOX_APP_KEY and DROPBOX_APP_SECRET:
-        logging.info("Dropbox API credentials are set.")
-        with dropbox.Dropbox(
-            oauth2_refresh_token=DROPBOX_REFRESH_TOKEN,
-            app_key=DROPBOX_APP_KEY,
-            app_secret=DROPBOX_APP_SECRET,
-        ) as dbx:
-            try:
-                dbx.users_get_current_account()
-                logging.info("Dropbox account linked successfully.")
-            except AuthError as err:
-                logging.error("ERROR: Invalid access token; Backup Failed")
-
-            try:
-                with open(db_path, "rb") as f:
-                    today_date = date.today()
-                    today_str = today_date.strftime("%Y%m%d")
-                    backup_file_name = f"trade_diary_backup_{today_str}.db"
-                    full_dropbox_path = f"{dropbox_path}/{backup_file_name}"
-                    dbx.files_upload(
-                        f.read(), full_dropbox_path, mode=WriteMode("overwrite")
-                    )
-                logging.info(f"Database backup successful: {full_dropbox_path}")
-                return today_date
-
-            except FileNotFoundError:
-                logging.error(
-                    f"ERROR: Database file not found at {db_path}; Backup Failed"
-                )
-                return None
+    if not (DROPBOX_REFRESH_TOKEN and DROPBOX_APP_KEY and DROPBOX_APP_SECRET):
+        logging.error("ERROR: Dropbox API credentials are not set")
+        return None
+    logging.info("Dropbox API credentials are set.")
+    dbx = dropbox.Dropbox(
+        oauth2_refresh_token=DROPBOX_REFRESH_TOKEN,
+        app_key=DROPBOX_APP_KEY,
+        app_secret=DROPBOX_APP_SECRET,
+    )
+    try:
+        dbx.users_get_current_account()
+        logging.info("Dropbox account linked successfully.")
+    except AuthError:
+        logging.error("ERROR: Invalid access token")
+        dbx.close()
+        return None
+    return dbx
 
-            except ApiError as err:
-                logging.error(f"API error during backup: {err}; Backup Failed")
-                return None
 
-            except Exception as e:
-                logging.error(f"Unexpected error during backup: {e}; Backup Failed")
-                return None
-    else:
-        logging.error("ERROR: Dropbox API credentials are not set; Backup Failed")
+def backup_database(db_path, dropbox_path, keep_daily=7, keep_monthly=12, **options):
+    dbx = connect_dropbox()
+    if dbx is None:
+        logging.error("Backup Failed")
         return None
+    with dbx:
+        return run_backup(
+            db_path,
+            DropboxDestination(dbx, dropbox_path),
+            keep_daily,
+            keep_monthly,
+            **options,
+        )
 
 
-if __name__ == "__main__":
+def main():
     parser = argparse.ArgumentParser(
-        description="Backup the trading journal database to Dropbox."
-    )
-    parser.add_argument(
-        "--db-path", type=str, required=True, help="Path to the local database file."
+        description="Backup the trading journal database to Dropbox or a directory."
     )
-    parser.add_argument(
+    parser.add_argument("--db-path", type=str, help="Path to the local database file.")
+    destination = parser.add_mutually_exclusive_group(required=True)
+    destination.add_argument(
         "--dropbox-path",
         type=str,
-        required=True,
         help="Path in Dropbox to store the backup.",
     )
+    destination.add_argument(
+        "--local-dir",
+        type=str,
+        help="Local directory to store the backup, e.g. a mounted drive.",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Upload only the database pages that changed since earlier backups.",
+    )
+    parser.add_argument(
+        "--chunk-kib",
+        type=int,
+        default=incremental_chunk_size // 1024,
+        help="Size of the page runs hashed by incremental backups, in KiB.",
+    )
+    parser.add_argument(
+        "--keep-daily",
+        type=int,
+        default=7,
+        help="Number of most recent daily backups to keep.",
+    )
+    parser.add_argument(
+        "--keep-monthly",
+        type=int,
+        default=12,
+        help="Number of months to keep the newest backup of.",
+    )
+    parser.add_argument(
+        "--list", action="store_true", help="List the stored backups and exit."
+    )
+    parser.add_argument(
+        "--restore",
+        metavar="YYYYMMDD",
+        help="Restore the backup of this day, or 'latest', to --output.",
+    )
+    parser.add_argument("--output", help="File to restore the backup into.")
     args = parser.parse_args()
-    db_path = args.db_path
-    dropbox_path = args.dropbox_path
-    print(f"Backing up database from {db_path} to Dropbox folder {dropbox_path}")
-    backup_database(db_path, dropbox_path)
+    if args.restore and not args.output:
+        parser.error("--restore needs --output")
+    if args.restore and args.output and Path(args.output).exists():
+        parser.error(f"{args.output} already exists; restore to a new file")
+    if not (args.restore or args.list or args.db_path):
+        parser.error("--db-path is required to take a backup")
+    if args.keep_daily < 1:
+        parser.error("--keep-daily must be at least 1")
+
+    dbx = None
+    if args.local_dir:
+        destination = LocalDestination(args.local_dir)
+    else:
+        dbx = connect_dropbox()
+        if dbx is None:
+            return 1
+        destination = DropboxDestination(dbx, args.dropbox_path)
+
+    try:
+        if args.list:
+            for day, kinds in list_backups(destination):
+                print(f"{day}  {', '.join(kinds)}")
+            return 0
+        if args.restore:
+            try:
+                restore_backup(destination, args.restore, args.output)
+            except Exception as e:
+                logging.error(f"Restore failed: {e}")
+                return 1
+            return 0
+
+        print(f"Backing up database from {args.db_path} to {destination}")
+        backed_up = run_backup(
+            args.db_path,
+            destination,
+            args.keep_daily,
+            args.keep_monthly,
+            incremental=args.incremental,
+            chunk_size=args.chunk_kib * 1024,
+        )
+        return 0 if backed_up else 1
+    finally:
+        if dbx is not None:
+            dbx.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,103 @@
+## Shared helpers for the benchmark scripts in this directory.
+## Benchmarks run against a throwaway database and never touch the configured one.
+## Importing the package only registers the configured database, which is opened on
+## first use; use_database opens a throwaway one first.
+
+import logging
+import os
+import random
+import tempfile
+import time
+from datetime import date, timedelta
+
+from sqlalchemy import insert
+
+import src.trade_diary.db_interface as db_interface
+from src.trade_diary.db_interface import Entry, Exits, Trade, _rebuild_trade_summary
+from src.trade_diary.utility_functions import extract_financial_year
+
+
+# The package configures DEBUG logging on import; keep benchmark output readable
+logging.getLogger().setLevel(logging.WARNING)
+
+SYMBOLS = [f"SYM{i:04d}" for i in range(500)]
+SETUPS = ["BREAKOUT", "PULLBACK", "REVERSAL", "TREND", "EPISODIC PIVOT"]
+
+
+def temp_db_path(name="bench.db"):
+    return os.path.join(tempfile.mkdtemp(prefix="trade_diary_bench_"), name)
+
+
+def use_database(db_path, **init_kwargs):
+    if db_interface._engine is not None:
+        db_interface._engine.dispose()
+    db_interface._engine = None
+    db_interface._SessionMaker = None
+    return db_interface.init_db(f"sqlite:///{db_path}", **init_kwargs)
+
+
+def populate(engine, n_trades, seed=42, start=date(2019, 4, 1)):
+    rng = random.Random(seed)
+    trades, entries, exits = [], [], []
+    for trade_id in range(1, n_trades + 1):
+        entry_date = start + timedelta(days=rng.randrange(0, 6 * 365))
+        price = round(rng.uniform(50, 3000), 2)
+        n_entries = rng.choice([1, 1, 1, 2, 3])
+        closed = rng.random() < 0.9
+        trades.append(
+            {
+                "trade_id": trade_id,
+                "symbol": rng.choice(SYMBOLS),
+                "initial_entry_date": entry_date,
+                "setup": rng.choice(SETUPS),
+                "trade_closed": "Y" if closed else "N",
+                "financial_year": extract_financial_year(entry_date),
+            }
+        )
+        total_qty = 0
+        for i in range(n_entries):
+            qty = rng.randrange(1, 200)
+            total_qty += qty
+            entries.append(
+                {
+                    "trade_id": trade_id,
+                    "entry_date": entry_date + timedelta(days=i),
+                    "entry_price": price * (1 + 0.01 * i),
+                    "quantity": qty,
+                    "remaining_quantity": 0 if closed else qty,
+                    "risk_percentage": 0.5,
+                    "entry_type": "Market",
+                    "stop_loss": price * 0.95,
+                    "exit_amount": price * qty * 1.02 if closed else 0,
+                    "charges": 20 if closed else 0,
+                }
+            )
+        if closed:
+            exits.append(
+                {
+                    "trade_id": trade_id,
+                    "exit_date": entry_date + timedelta(days=rng.randrange(1, 60)),
+                    "exit_price": price * rng.uniform(0.9, 1.2),
+                    "quantity": total_qty,
+                    "exit_type": "Market",
+                    "exit_reason": "",
+                }
+            )
+
+    with engine.begin() as conn:
+        conn.execute(insert(Trade), trades)
+        conn.execute(insert(Entry), entries)
+        if exits:
+            conn.execute(insert(Exits), exits)
+        _rebuild_trade_summary(conn)
+    return trades
+
+
+def timed(fn, repeat=5):
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
@@ -0,0 +1,150 @@
+## Compares throughput of a mixed read/write callback workload across SQLite
+## connection profiles. Each worker thread behaves like a Dash callback: most
+## calls read a block of the trades grid, the rest add a trade and exit it.
+##
+##   python -m benchmarks.connection_profiles --trades 20000 --threads 8 --seconds 10
+
+import argparse
+import random
+import threading
+import time
+from collections import Counter
+from datetime import date
+
+import pandas as pd
+from sqlalchemy import event
+from sqlalchemy.exc import OperationalError, SQLAlchemyError
+
+import src.trade_diary.db_interface as db_interface
+
+from benchmarks.common import populate, temp_db_path, use_database
+
+
+profiles = {
+    "sqlite defaults": {},
+    "wal": {"journal_mode": "WAL", "busy_timeout": 5000},
+    "wal + normal sync + cache": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -65536,
+        "mmap_size": 268435456,
+        "temp_store": "MEMORY",
+        "busy_timeout": 5000,
+        "foreign_keys": True,
+        "pool_class": "QueuePool",
+        "pool_size": 5,
+    },
+    "wal + normal sync + null pool": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": 5000,
+        "pool_class": "NullPool",
+    },
+}
+
+
+# The same block read as the trades grid callback, without its error handling, so a
+# failed read raises instead of looking like an empty page
+def read_block(financial_year, start_row, block_rows=100):
+    stmt, columns, _, _ = db_interface._trades_grid_query("all", financial_year, None)
+    stmt = stmt.order_by(*db_interface._trades_grid_order_by(columns, None))
+    stmt = stmt.offset(start_row).limit(block_rows)
+    return pd.read_sql(stmt, db_interface.get_engine())
+
+
+def worker(financial_year, year_trades, write_ratio, stop_at, seed, stats, lock):
+    rng = random.Random(seed)
+    reads = writes = 0
+    while time.perf_counter() < stop_at:
+        try:
+            if rng.random() < write_ratio:
+                trade_id = db_interface.insert_trade(
+                    symbol="BENCH",
+                    entry_price=100.0,
+                    quantity=10,
+                    entry_date=date(2024, 5, 1),
+                    risk_percentage=0.5,
+                    stop_loss=95.0,
+                    setup="BENCH",
+                )
+                if trade_id is not None:
+                    db_interface.insert_exit(
+                        trade_id, 105.0, 10, date(2024, 5, 3), "Market"
+                    )
+                writes += 1
+            else:
+                read_block(financial_year, rng.randrange(0, max(year_trades - 100, 1)))
+                reads += 1
+        except SQLAlchemyError:
+            # Counted by the handle_error listener in run_profile
+            pass
+    with lock:
+        stats["reads"] += reads
+        stats["writes"] += writes
+
+
+def run_profile(name, profile, args):
+    db_path = temp_db_path()
+    engine = use_database(db_path, profile=profile)
+    trades = populate(engine, args.trades)
+    financial_year, year_trades = Counter(
+        t["financial_year"] for t in trades
+    ).most_common(1)[0]
+
+    # The write functions log and swallow their errors, so database errors are
+    # counted where SQLAlchemy raises them
+    stats = {"reads": 0, "writes": 0, "errors": 0, "locked": 0}
+    lock = threading.Lock()
+
+    @event.listens_for(engine, "handle_error")
+    def count_error(context):
+        with lock:
+            stats["errors"] += 1
+            if isinstance(context.sqlalchemy_exception, OperationalError) and (
+                "locked" in str(context.original_exception)
+            ):
+                stats["locked"] += 1
+
+    stop_at = time.perf_counter() + args.seconds
+    threads = [
+        threading.Thread(
+            target=worker,
+            args=(
+                financial_year,
+                year_trades,
+                args.write_ratio,
+                stop_at,
+                i,
+                stats,
+                lock,
+            ),
+        )
+        for i in range(args.threads)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    total = stats["reads"] + stats["writes"]
+    print(
+        f"{name:32s} {total / args.seconds:8.1f} ops/s  "
+        f"reads={stats['reads']:6d} writes={stats['writes']:5d} "
+        f"errors={stats['errors']} (locked={stats['locked']})"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark SQLite connection profiles.")
+    parser.add_argument("--trades", type=int, default=20000)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--write-ratio", type=float, default=0.2)
+    args = parser.parse_args()
+
+    for name, profile in profiles.items():
+        run_profile(name, profile, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+## Times insert_exit against trades with 1, 10 and 100 pyramid entries and
+## counts the SQL statements each exit issues: six, whether or not the exit closes
+## the trade and however many lots it consumes.
+##
+##   python -m benchmarks.insert_exit --trades 200
+
+import argparse
+import statistics
+import time
+from datetime import date, timedelta
+
+import pandas as pd
+from sqlalchemy import event
+
+import src.trade_diary.db_interface as db_interface
+
+from benchmarks.common import temp_db_path, use_database
+
+
+def create_pyramids(n_trades, n_entries):
+    start = date(2024, 4, 1)
+    trades = pd.DataFrame(
+        {
+            "trade_key": range(n_trades),
+            "symbol": [f"PYR{i}" for i in range(n_trades)],
+            "setup": "PYRAMID",
+        }
+    )
+    entries = pd.DataFrame(
+        [
+            {
+                "trade_key": t,
+                "entry_date": start + timedelta(days=e),
+                "entry_price": 100.0 + e,
+                "quantity": 10,
+                "risk_percentage": 0.25,
+                "stop_loss": 95.0 + e,
+                "entry_type": "Pyramid" if e else "Market",
+            }
+            for t in range(n_trades)
+            for e in range(n_entries)
+        ]
+    )
+    return db_interface.bulk_import(trades, entries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark insert_exit.")
+    parser.add_argument("--trades", type=int, default=200)
+    args = parser.parse_args()
+
+    engine = use_database(temp_db_path())
+    statements = []
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    for n_entries in (1, 10, 100):
+        trade_ids = create_pyramids(args.trades, n_entries)
+        exit_date = date(2024, 4, 1) + timedelta(days=n_entries + 1)
+        exit_quantity = max(5, 10 * n_entries // 2)
+
+        # Exit half the position, so the newest half of the lots is consumed, and
+        # then the rest, which closes the trade
+        for label, quantity in (
+            ("partial", exit_quantity),
+            ("closing", 10 * n_entries - exit_quantity),
+        ):
+            timings = []
+            statements.clear()
+            for trade_id in trade_ids:
+                start = time.perf_counter()
+                db_interface.insert_exit(trade_id, 110.0, quantity, exit_date, "Market")
+                timings.append(time.perf_counter() - start)
+
+            median = statistics.median(timings) * 1000
+            p95 = sorted(timings)[int(len(timings) * 0.95)] * 1000
+            print(
+                f"{n_entries:3d} entries, {label} exit: median {median:6.2f} ms, "
+                f"p95 {p95:6.2f} ms, "
+                f"{len(statements) / len(trade_ids):.1f} statements per exit"
+            )
+
+
+if __name__ == "__main__":
+    main()
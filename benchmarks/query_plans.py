@@ -0,0 +1,90 @@
+## Shows SQLite query plans and timings for the main read queries with and
+## without the indexes added by migration 1.
+##
+##   python -m benchmarks.query_plans --trades 50000
+
+import argparse
+
+from sqlalchemy import event
+
+import src.trade_diary.db_interface as db_interface
+from src.trade_diary.db_interface import Entry, Exits, Trade
+
+from benchmarks.common import populate, temp_db_path, timed, use_database
+
+
+def capture_statements(engine, fn):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, many):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        fn()
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+    return statements
+
+
+def print_plan(engine, statement, parameters):
+    with engine.connect() as conn:
+        rows = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters)
+        for row in rows:
+            print(f"    {row[-1]}")
+
+
+def workloads(financial_year, trade_id):
+    return {
+        "trades grid (first block)": lambda: db_interface.get_all_trades_and_entries(
+            "all", financial_year, start_row=0, end_row=100
+        ),
+        "trades grid count (open)": lambda: db_interface.get_trades_count(
+            "open", financial_year
+        ),
+        "get_all_entries (fy)": lambda: db_interface.get_all_entries(financial_year),
+        "get_all_exits (fy)": lambda: db_interface.get_all_exits(financial_year),
+        "get_all_trades (all)": lambda: db_interface.get_all_trades("all"),
+        "entries for one trade": lambda: db_interface.get_entries(trade_id),
+    }
+
+
+def run(engine, financial_year, trade_id, label):
+    print(f"\n===== {label} =====")
+    for name, fn in workloads(financial_year, trade_id).items():
+        statements = capture_statements(engine, fn)
+        elapsed, _ = timed(fn)
+        print(f"\n{name}: {elapsed * 1000:.1f} ms")
+        for statement, parameters in statements:
+            print_plan(engine, statement, parameters)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare query plans before/after indexes.")
+    parser.add_argument("--trades", type=int, default=50000)
+    args = parser.parse_args()
+
+    db_path = temp_db_path()
+    engine = use_database(db_path)
+    trades = populate(engine, args.trades)
+    financial_year = trades[-1]["financial_year"]
+    trade_id = trades[len(trades) // 2]["trade_id"]
+
+    indexes = [i for model in (Trade, Entry, Exits) for i in model.__table__.indexes]
+    with engine.begin() as conn:
+        for index in indexes:
+            index.drop(conn, checkfirst=True)
+        conn.exec_driver_sql("ANALYZE")
+    run(engine, financial_year, trade_id, "Without indexes")
+
+    with engine.begin() as conn:
+        for index in indexes:
+            index.create(conn, checkfirst=True)
+        conn.exec_driver_sql("ANALYZE")
+    run(engine, financial_year, trade_id, "With indexes")
+    print(f"\nBenchmark database: {db_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+## Times the Statistics page summaries: group_summaries against the per-group loop
+## with Python lambdas that it replaced, for every financial year and for all years.
+## tests/test_stats_groupings.py checks that both give the same numbers.
+##
+##   python -m benchmarks.stats_groupings --trades 20000
+
+import argparse
+
+import src.trade_diary.db_interface as db_interface
+
+from benchmarks.common import populate, temp_db_path, timed, use_database
+from tests.pandas_reference import reference_summaries
+
+
+def time_summaries(stats, financial_year):
+    trades = stats.add_grouping_columns(db_interface.get_trade_stats(financial_year))
+    reference_time, _ = timed(
+        lambda: reference_summaries(
+            trades.copy(), stats.groupers, stats.summary_columns
+        )
+    )
+    grouped_time, _ = timed(lambda: stats.group_summaries(trades.copy()))
+    print(
+        f"{financial_year:10s} {len(trades):7d} trades: "
+        f"per-group loop {reference_time * 1000:7.1f} ms, "
+        f"group_summaries {grouped_time * 1000:6.1f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check stats groupings.")
+    parser.add_argument("--trades", type=int, default=20000)
+    args = parser.parse_args()
+
+    engine = use_database(temp_db_path())
+    populate(engine, args.trades)
+
+    # Imported once the throwaway database is in place: building the app imports
+    # every page, and the Trades page reads the financial years when it loads
+    import src.trade_diary.app  # noqa: F401
+    from src.trade_diary.pages import stats
+
+    for financial_year in db_interface.get_all_financial_years() + ["all"]:
+        time_summaries(stats, financial_year)
+
+
+if __name__ == "__main__":
+    main()
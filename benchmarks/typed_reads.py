@@ -0,0 +1,70 @@
+## Compares the typed column-wise readers with a plain pd.read_sql of the full ORM
+## rows followed by the date parsing the stats page used to do itself.
+##
+##   python -m benchmarks.typed_reads --trades 100000
+
+import argparse
+
+import pandas as pd
+from sqlalchemy import select
+
+import src.trade_diary.db_interface as db_interface
+from src.trade_diary.db_interface import Entry, Exits, Trade
+
+from benchmarks.common import populate, temp_db_path, timed, use_database
+
+
+def read_sql_baseline(model, date_column):
+    stmt = select(model)
+    if model is not Trade:
+        stmt = stmt.join(Trade)
+    stmt = stmt.where(Trade.trade_closed == "Y")
+    df = pd.read_sql(stmt, db_interface.get_engine())
+    df[date_column] = pd.to_datetime(df[date_column], format="%Y-%m-%d")
+    return df
+
+
+def workloads():
+    return {
+        "entries": (
+            lambda: read_sql_baseline(Entry, "entry_date"),
+            db_interface.get_all_entries,
+        ),
+        "exits": (
+            lambda: read_sql_baseline(Exits, "exit_date"),
+            db_interface.get_all_exits,
+        ),
+        "trades": (
+            lambda: read_sql_baseline(Trade, "initial_entry_date"),
+            db_interface.get_all_trades,
+        ),
+    }
+
+
+def megabytes(df):
+    return df.memory_usage(deep=True).sum() / 2**20
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--trades", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    db_path = temp_db_path()
+    print(f"Populating {args.trades} trades in {db_path}")
+    engine = use_database(db_path)
+    populate(engine, args.trades)
+
+    print(f"{'table':<8} {'reader':<14} {'rows':>8} {'ms':>9} {'MiB':>8}")
+    for name, readers in workloads().items():
+        for label, reader in zip(["read_sql", "typed"], readers):
+            seconds, df = timed(reader, args.repeat)
+            print(
+                f"{name:<8} {label:<14} {len(df):>8} {seconds * 1000:>9.1f} "
+                f"{megabytes(df):>8.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
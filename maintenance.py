@@ -0,0 +1,93 @@
+## Maintenance commands for the configured trading journal database.
+##
+##   python maintenance.py rebuild-summary
+##   python maintenance.py recompute-charges
+##   python maintenance.py fail-interrupted-imports
+##   python maintenance.py ingest-prices prices.csv [--symbol INFY]
+##   python maintenance.py export trades --format xlsx [--financial-year 2024-2025]
+
+import argparse
+import sys
+
+from src.trade_diary.db_interface import (
+    export_tables,
+    fail_interrupted_import_jobs,
+    recompute_charges,
+    rebuild_trade_summary,
+)
+from src.trade_diary.export import available_formats, export_file_name, export_table
+from src.trade_diary.price_store import get_price_store
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Maintenance commands for the trading journal database."
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser(
+        "rebuild-summary",
+        help="Recompute the trade_summary table from entries and exits.",
+    )
+    subparsers.add_parser(
+        "recompute-charges",
+        help="Recompute entry charges for every exit from the current charge schedule.",
+    )
+    subparsers.add_parser(
+        "fail-interrupted-imports",
+        help="Mark imports left queued or running by stopped servers as failed. "
+        "Run it while no server is running.",
+    )
+    ingest = subparsers.add_parser(
+        "ingest-prices",
+        help="Load daily OHLCV rows from a CSV file into the local price store.",
+    )
+    ingest.add_argument("csv_path")
+    ingest.add_argument(
+        "--symbol", help="Symbol for every row, when the file has no symbol column."
+    )
+    export = subparsers.add_parser(
+        "export",
+        help="Export trades, entries, exits or per-trade stats to a file.",
+    )
+    export.add_argument("table", choices=export_tables)
+    export.add_argument("--format", choices=available_formats(), default="csv")
+    export.add_argument(
+        "--financial-year", default="all", help="e.g. 2024-2025; defaults to all years."
+    )
+    export.add_argument(
+        "-o",
+        "--output",
+        help="Output file, or - for stdout. Defaults to a name in the current folder.",
+    )
+    args = parser.parse_args()
+
+    if args.command == "rebuild-summary":
+        return 0 if rebuild_trade_summary() else 1
+    if args.command == "recompute-charges":
+        return 0 if recompute_charges() else 1
+    if args.command == "fail-interrupted-imports":
+        failed = fail_interrupted_import_jobs()
+        print(f"Marked {failed} interrupted import jobs as failed")
+        return 0
+    if args.command == "ingest-prices":
+        added = get_price_store().ingest_csv(args.csv_path, symbol=args.symbol)
+        print(f"Added {added} price rows")
+        return 0
+    if args.command == "export":
+        output = args.output or export_file_name(
+            args.table, args.format, args.financial_year
+        )
+        chunks = export_table(args.table, args.format, args.financial_year)
+        if output == "-":
+            for chunk in chunks:
+                sys.stdout.buffer.write(chunk)
+            return 0
+        with open(output, "wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
+        print(f"Exported {args.table} to {output}", file=sys.stderr)
+        return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
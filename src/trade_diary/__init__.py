@@ -3,7 +3,7 @@ import logging
 import src.trade_diary.config as config
 
 
-from .db_interface import init_db
+from .db_interface import set_default_database
 
 try:
     config.LOGS_DIR.mkdir(parents=True, exist_ok=True)
@@ -36,4 +36,4 @@ logging.debug("Starting Trade Diary Application")
 db = str(config.DB_PATH) + "/" + config.DB_NAME
 db_url = f"sqlite:///{db}"
 
-init_db(db_url)
+set_default_database(db_url, config.DB_PROFILE)
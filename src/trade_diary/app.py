@@ -1,6 +1,15 @@
 import dash
 from dash import Dash, dcc, html, Input, Output, callback
 import dash_bootstrap_components as dbc
+from flask import Response, abort, request, stream_with_context
+
+from src.trade_diary.db_interface import export_tables
+from src.trade_diary.export import (
+    available_formats,
+    export_file_name,
+    export_formats,
+    export_table,
+)
 
 app = Dash(__name__, external_stylesheets=[dbc.themes.FLATLY], use_pages=True)
 
@@ -33,5 +42,23 @@ nav = dbc.Nav(
 app.layout = html.Div([nav, dash.page_container])
 
 
+# Streams an export as it is written, e.g. /export/trades.csv?financial_year=2024-2025
+@app.server.route("/export/<table>.<file_format>")
+def export_download(table, file_format):
+    if table not in export_tables or file_format not in export_formats:
+        abort(404)
+    if file_format not in available_formats():
+        abort(501, f"{file_format} export needs pyarrow to be installed")
+    financial_year = request.args.get("financial_year", "all")
+    return Response(
+        stream_with_context(export_table(table, file_format, financial_year)),
+        mimetype=export_formats[file_format][1],
+        headers={
+            "Content-Disposition": "attachment; filename="
+            f'"{export_file_name(table, file_format, financial_year)}"'
+        },
+    )
+
+
 if __name__ == "__main__":
     app.run("0.0.0.0", debug=True)
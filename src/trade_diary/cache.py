@@ -0,0 +1,125 @@
+import logging
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from pathlib import Path
+
+import src.trade_diary.config as config
+
+from .db_interface import get_write_generation
+
+
+_missing = object()
+
+
+class LRUCache:
+    def __init__(self, max_entries=32):
+        self.max_entries = max_entries
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=_missing):
+        with self._lock:
+            if key not in self._items:
+                return default
+            self._items.move_to_end(key)
+            return self._items[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+# Shares results between server processes through a small SQLite file. Values are
+# pickled; least recently used rows beyond max_entries are deleted on every set.
+class SQLiteCache:
+    def __init__(self, path, max_entries=32):
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS results "
+                "(key TEXT PRIMARY KEY, value BLOB NOT NULL, last_used REAL NOT NULL)"
+            )
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=5)
+
+    def get(self, key, default=_missing):
+        key = repr(key)
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT value FROM results WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return default
+            conn.execute(
+                "UPDATE results SET last_used = ? WHERE key = ?", (time.time(), key)
+            )
+        return pickle.loads(row[0])
+
+    def set(self, key, value):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO results (key, value, last_used) VALUES (?, ?, ?)",
+                (repr(key), pickle.dumps(value), time.time()),
+            )
+            conn.execute(
+                "DELETE FROM results WHERE key NOT IN "
+                "(SELECT key FROM results ORDER BY last_used DESC LIMIT ?)",
+                (self.max_entries,),
+            )
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM results")
+
+
+def create_cache(backend, max_entries, path=None):
+    if backend == "memory":
+        return LRUCache(max_entries)
+    if backend == "sqlite":
+        return SQLiteCache(path, max_entries)
+    raise ValueError(f"Unknown cache backend: {backend}")
+
+
+_cache = None
+
+
+def get_cache():
+    global _cache
+    if _cache is None:
+        _cache = create_cache(
+            config.CACHE_BACKEND, config.CACHE_MAX_ENTRIES, config.CACHE_PATH
+        )
+        logging.info(f"Result cache created: {config.CACHE_BACKEND}")
+    return _cache
+
+
+# Memoizes fn on its arguments and the current write generation. A write bumps the
+# generation, so stale results are never returned and simply age out of the LRU.
+def cached_by_generation(fn):
+    @wraps(fn)
+    def wrapper(*args):
+        key = (fn.__module__, fn.__qualname__, args, get_write_generation())
+        cache = get_cache()
+        result = cache.get(key)
+        if result is _missing:
+            logging.debug(f"Cache miss for {key}")
+            result = fn(*args)
+            cache.set(key, result)
+        return result
+
+    return wrapper
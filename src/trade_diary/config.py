@@ -13,6 +13,23 @@ try:
         LOG_FILE = LOGS_DIR / config["log"]["file_name"]
         DB_PATH = app_root / Path(config["database"]["path"])
         DB_NAME = config["database"]["db_name"]
+        DB_PROFILE = {
+            k: v
+            for k, v in config["database"].items()
+            if k not in ("path", "db_name")
+        }
+        CACHE_BACKEND = config["cache"]["backend"]
+        CACHE_MAX_ENTRIES = config["cache"]["max_entries"]
+        CACHE_PATH = app_root / Path(config["cache"]["path"])
+        PRICES_ENABLED = config["prices"]["enabled"]
+        PRICES_PROVIDER = config["prices"]["provider"]
+        PRICES_SYMBOL_SUFFIX = config["prices"]["symbol_suffix"]
+        PRICES_CSV_PATH = app_root / Path(config["prices"]["csv_path"])
+        PRICES_TTL_SECONDS = config["prices"]["ttl_seconds"]
+        PRICES_REFRESH_SECONDS = config["prices"]["refresh_seconds"]
+        PRICE_STORE_PATH = app_root / Path(config["price_store"]["path"])
+        IMPORT_CHUNK_ROWS = config["import"]["chunk_rows"]
+        IMPORT_TRADE_BATCH = config["import"]["trade_batch"]
 
 except FileNotFoundError:
     raise FileNotFoundError("Configuration file 'config.toml' not found.")
@@ -1,17 +1,36 @@
+import os
 import re
+import threading
 from sqlalchemy import (
     create_engine,
     Column,
     Integer,
     String,
     Date,
-    Numeric,
+    Float,
     ForeignKey,
     Boolean,
+    DateTime,
+    Index,
+    MetaData,
+    Table,
     select,
     CHAR,
+    case,
+    cast,
+    delete,
+    insert,
+    literal,
+    update,
+    bindparam,
+    literal_column,
+    or_,
+    type_coerce,
 )
+from sqlalchemy.types import TypeDecorator
+from sqlalchemy import event
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.pool import NullPool, QueuePool, SingletonThreadPool, StaticPool
 from sqlalchemy.orm import sessionmaker, relationship
 from datetime import datetime, date
 import numpy as np
@@ -21,12 +40,60 @@ import logging
 from sqlalchemy import func
 
 
-from .utility_functions import get_entry_adjustment_details, extract_financial_year
+from .utility_functions import (
+    allocate_exits,
+    allocation_charges,
+    extract_financial_year,
+    get_entry_adjustment_details,
+)
+from .grid_filters import compile_filter_model
 
 
 Base = declarative_base()
 
 
+# Stores decimals as integers scaled by 10**digits. Reading the column divides in
+# SQL, so the driver hands back plain floats instead of Decimal objects. Arithmetic
+# on the raw column (e.g. SUM(price * quantity)) stays in scaled units; wrap it with
+# fixed_point_value to read it back.
+class FixedPoint(TypeDecorator):
+    impl = Integer
+    cache_ok = True
+
+    def __init__(self, digits):
+        super().__init__()
+        self.digits = digits
+        self.scale = 10**digits
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return int(round(float(value) * self.scale))
+
+    def column_expression(self, col):
+        return type_coerce(col, Float) / literal_column(f"{self.scale}.0", Float)
+
+
+def fixed_point_value(expr, digits=4):
+    return FixedPoint(digits).column_expression(expr)
+
+
+# Rounds the way pandas' Series.round does: scale, round half to even, unscale.
+# SQLite's ROUND(x, n) rounds the decimal text of x and sends ties away from zero,
+# which would shift R multiples like 0.5 * 0.37 by a cent.
+def round_decimals(expr, digits=2):
+    scaled = expr * 10**digits
+    nearest = func.round(scaled)
+    rounded = case(
+        (
+            (func.abs(nearest - scaled) == 0.5) & (nearest % 2 != 0),
+            2 * scaled - nearest,
+        ),
+        else_=nearest,
+    )
+    return rounded / literal_column(f"{10**digits}.0", Float)
+
+
 class Trade(Base):
     __tablename__ = "trades"
 
@@ -39,44 +106,227 @@ class Trade(Base):
         "Entry", back_populates="trades", cascade="all, delete-orphan"
     )
     exits = relationship("Exits", back_populates="trades", cascade="all, delete-orphan")
+    summary = relationship(
+        "TradeSummary", back_populates="trades", cascade="all, delete-orphan"
+    )
+    excursion = relationship(
+        "TradeExcursion", back_populates="trades", cascade="all, delete-orphan"
+    )
     financial_year = Column(String, nullable=False)
 
+    __table_args__ = (
+        Index(
+            "ix_trades_fy_closed_entry_date",
+            "financial_year",
+            "trade_closed",
+            "initial_entry_date",
+        ),
+        Index("ix_trades_closed_fy", "trade_closed", "financial_year"),
+    )
+
 
 class Entry(Base):
     __tablename__ = "entries"
     entry_id = Column(Integer, primary_key=True, autoincrement=True)
     trade_id = Column(Integer, ForeignKey("trades.trade_id"), nullable=False)
     entry_date = Column(Date, nullable=False)
-    entry_price = Column(Numeric(10, 4), nullable=False)
+    entry_price = Column(FixedPoint(4), nullable=False)
     quantity = Column(Integer, nullable=False)
     remaining_quantity = Column(Integer, nullable=False)
-    risk_percentage = Column(Numeric(5, 2), nullable=False)
+    risk_percentage = Column(FixedPoint(2), nullable=False)
     entry_type = Column(String, nullable=True)
-    stop_loss = Column(Numeric(10, 4), nullable=False)
-    exit_amount = Column(Numeric(10, 4), nullable=False, default=0)
-    charges = Column(Numeric(10, 2), nullable=False, default=0)
+    stop_loss = Column(FixedPoint(4), nullable=False)
+    exit_amount = Column(FixedPoint(4), nullable=False, default=0)
+    charges = Column(FixedPoint(4), nullable=False, default=0)
     trades = relationship("Trade", back_populates="entries")
 
+    # Covers the per-trade aggregation and the open lot lookup in insert_exit
+    __table_args__ = (
+        Index(
+            "ix_entries_trade_open_lots",
+            "trade_id",
+            "remaining_quantity",
+            "entry_price",
+            "quantity",
+            "charges",
+            "risk_percentage",
+        ),
+    )
+
 
 class Exits(Base):
     __tablename__ = "exits"
     exit_id = Column(Integer, primary_key=True, autoincrement=True)
     trade_id = Column(Integer, ForeignKey("trades.trade_id"), nullable=False)
     exit_date = Column(Date, nullable=False)
-    exit_price = Column(Numeric(10, 4), nullable=False)
+    exit_price = Column(FixedPoint(4), nullable=False)
     quantity = Column(Integer, nullable=False)
     exit_type = Column(String, nullable=True)
     exit_reason = Column(String, nullable=True)
     trades = relationship("Trade", back_populates="exits")
 
+    __table_args__ = (
+        Index(
+            "ix_exits_trade_date",
+            "trade_id",
+            "exit_date",
+            "exit_price",
+            "quantity",
+        ),
+    )
+
+
+# Per-trade aggregates of entries and exits, kept up to date by every write so the
+# trades grid does not have to aggregate. rebuild_trade_summary repairs drift.
+class TradeSummary(Base):
+    __tablename__ = "trade_summary"
+    trade_id = Column(Integer, ForeignKey("trades.trade_id"), primary_key=True)
+    total_buy_amount = Column(FixedPoint(4), nullable=False, default=0)
+    total_quantity = Column(Integer, nullable=False, default=0)
+    total_remaining_quantity = Column(Integer, nullable=False, default=0)
+    total_charges = Column(FixedPoint(4), nullable=False, default=0)
+    total_risk_percentage = Column(FixedPoint(2), nullable=False, default=0)
+    num_entries = Column(Integer, nullable=False, default=0)
+    num_exits = Column(Integer, nullable=False, default=0)
+    total_exit_quantity = Column(Integer, nullable=False, default=0)
+    total_sell_amount = Column(FixedPoint(4), nullable=False, default=0)
+    last_exit_date = Column(Date, nullable=True)
+    trades = relationship("Trade", back_populates="summary")
+
+
+# Single row bumped in the same transaction as every write. Cached reads are keyed
+# on it, so any write from any process invalidates them.
+class WriteGeneration(Base):
+    __tablename__ = "write_generation"
+    id = Column(Integer, primary_key=True)
+    generation = Column(Integer, nullable=False, default=0)
+
+
+# Maximum adverse and favourable excursion of a closed trade from daily prices,
+# cached with the entry price, risk and dates they were computed from.
+class TradeExcursion(Base):
+    __tablename__ = "trade_excursions"
+    trade_id = Column(Integer, ForeignKey("trades.trade_id"), primary_key=True)
+    initial_entry_date = Column(Date, nullable=False)
+    exit_date = Column(Date, nullable=False)
+    avg_entry_price = Column(Float, nullable=False)
+    risk_per_share = Column(Float, nullable=False)
+    price_days = Column(Integer, nullable=False)
+    mae = Column(Float, nullable=False)
+    mfe = Column(Float, nullable=False)
+    mae_R = Column(Float, nullable=True)
+    mfe_R = Column(Float, nullable=True)
+    trades = relationship("Trade", back_populates="excursion")
+
+
+# Daily equity curve per financial year ("all" for the whole journal), cached from
+# the closed trades. equity_state holds the running totals needed to extend it.
+class EquityPoint(Base):
+    __tablename__ = "equity_curve"
+    financial_year = Column(String, primary_key=True)
+    date = Column(Date, primary_key=True)
+    net_pl = Column(Float, nullable=False)
+    net_R = Column(Float, nullable=False)
+    cum_net_pl = Column(Float, nullable=False)
+    cum_net_R = Column(Float, nullable=False)
+    peak = Column(Float, nullable=False)
+    drawdown = Column(Float, nullable=False)
+    drawdown_days = Column(Integer, nullable=False)
+
+
+class EquityState(Base):
+    __tablename__ = "equity_state"
+    financial_year = Column(String, primary_key=True)
+    generation = Column(Integer, nullable=False)
+    last_date = Column(Date, nullable=False)
+    trade_count = Column(Integer, nullable=False)
+    # Exact sell - buy - charges of the trades the curve covers, from trade_summary.
+    # An edit, delete or backdated exit before last_date changes it or trade_count.
+    net_amount = Column(FixedPoint(4), nullable=False, default=0)
+    net_pl_total = Column(Float, nullable=False)
+    cum_net_R = Column(Float, nullable=False)
+    peak = Column(Float, nullable=False)
+    peak_date = Column(Date, nullable=False)
+
+
+# History of tradebook imports run by the background job runner. Live progress is
+# kept in memory while a job runs; the row records its final counts and outcome,
+# and the pid of the server process that ran it.
+class ImportJob(Base):
+    __tablename__ = "import_jobs"
+    job_id = Column(Integer, primary_key=True, autoincrement=True)
+    file_name = Column(String, nullable=False)
+    status = Column(String, nullable=False, default="queued")
+    rows = Column(Integer, nullable=False, default=0)
+    trades = Column(Integer, nullable=False, default=0)
+    exits = Column(Integer, nullable=False, default=0)
+    skipped = Column(Integer, nullable=False, default=0)
+    message = Column(String, nullable=False, default="")
+    created_on = Column(DateTime, nullable=False)
+    started_on = Column(DateTime, nullable=True)
+    finished_on = Column(DateTime, nullable=True)
+    owner_pid = Column(Integer, nullable=True)
+
+
+# One row per imported file. imported_rows holds the content hash of every row it
+# added, numbered by occurrence so a row repeated n times in a file matches n
+# earlier copies; re-imports skip rows already recorded here. Tradebook rows are
+# hashed on their entry and keep the hash of their exit in exit_hash (NULL for
+# fills), so a row imported open and again once closed is caught instead of
+# becoming a new trade.
+class ImportBatch(Base):
+    __tablename__ = "import_batches"
+    batch_id = Column(Integer, primary_key=True, autoincrement=True)
+    file_name = Column(String, nullable=False)
+    mode = Column(String, nullable=False)
+    rows = Column(Integer, nullable=False, default=0)
+    new_rows = Column(Integer, nullable=False, default=0)
+    skipped_rows = Column(Integer, nullable=False, default=0)
+    imported_on = Column(DateTime, nullable=False)
+
+
+class ImportedRow(Base):
+    __tablename__ = "imported_rows"
+    row_hash = Column(Integer, primary_key=True, autoincrement=False)
+    occurrence = Column(Integer, primary_key=True, autoincrement=False)
+    batch_id = Column(Integer, ForeignKey("import_batches.batch_id"), nullable=False)
+    exit_hash = Column(Integer, nullable=True)
+
+    # Without a rowid the primary key is the table itself, so each row is stored
+    # once and the re-import anti-join reads it directly
+    __table_args__ = (
+        Index("ix_imported_rows_batch", "batch_id"),
+        {"sqlite_with_rowid": False},
+    )
+
+
+class SchemaVersion(Base):
+    __tablename__ = "schema_version"
+    version = Column(Integer, primary_key=True)
+    description = Column(String, nullable=False)
+    applied_on = Column(DateTime, nullable=False)
+
 
 _engine = None
 _SessionMaker = None
+_default_database = None
+_init_lock = threading.Lock()
+
+
+# The package registers the configured database on import and it is opened and
+# migrated on first use, so importing the package alone never touches it.
+def set_default_database(db_path, profile=None):
+    global _default_database
+    _default_database = (db_path, profile)
 
 
 def get_engine():
     logging.debug("Get Engine")
     global _engine
+    if _engine is None and _default_database is not None:
+        with _init_lock:
+            if _engine is None:
+                init_db(*_default_database)
     return _engine
 
 
@@ -89,19 +339,121 @@ def get_session():
     return _SessionMaker()
 
 
-def init_db(db_path):
+sqlite_pragmas = [
+    "journal_mode",
+    "synchronous",
+    "cache_size",
+    "mmap_size",
+    "temp_store",
+    "busy_timeout",
+    "foreign_keys",
+]
+
+pool_classes = {
+    "QueuePool": QueuePool,
+    "NullPool": NullPool,
+    "SingletonThreadPool": SingletonThreadPool,
+    "StaticPool": StaticPool,
+}
+
+
+def _pragma_value(name, value):
+    if isinstance(value, bool):
+        return "ON" if value else "OFF"
+    if isinstance(value, int):
+        return str(value)
+    if isinstance(value, str) and re.fullmatch(r"[A-Za-z_]+", value):
+        return value.upper()
+    raise ValueError(f"Invalid value for PRAGMA {name}: {value!r}")
+
+
+# SUM with Kahan compensation, the way a pandas groupby sums floats. The per-trade
+# stats sum in it so their totals, and the cent each one rounds to, are the ones
+# the pandas stats path produced; SQLite's own SUM adds naively before 3.43.
+class CompensatedSum:
+    def __init__(self):
+        self.total = 0.0
+        self.compensation = 0.0
+
+    def step(self, value):
+        if value is None:
+            return
+        y = value - self.compensation
+        t = self.total + y
+        self.compensation = t - self.total - y
+        self.total = t
+
+    def finalize(self):
+        return self.total
+
+
+def create_db_engine(db_path, profile=None):
+    profile = profile or {}
+    engine_kwargs = {}
+    pool_class = profile.get("pool_class")
+    if pool_class:
+        if pool_class not in pool_classes:
+            raise ValueError(f"Unknown pool class: {pool_class}")
+        engine_kwargs["poolclass"] = pool_classes[pool_class]
+        if pool_class == "QueuePool" and "pool_size" in profile:
+            engine_kwargs["pool_size"] = profile["pool_size"]
+
+    engine = create_engine(db_path, echo=False, **engine_kwargs)
+
+    @event.listens_for(engine, "connect")
+    def register_functions(dbapi_connection, connection_record):
+        dbapi_connection.create_aggregate("compensated_sum", 1, CompensatedSum)
+
+    pragmas = [
+        (name, _pragma_value(name, profile[name]))
+        for name in sqlite_pragmas
+        if name in profile
+    ]
+    if pragmas:
+
+        @event.listens_for(engine, "connect")
+        def set_sqlite_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            for name, value in pragmas:
+                cursor.execute(f"PRAGMA {name} = {value}")
+            cursor.close()
+
+    logging.info(f"Connection profile: {pragmas}, pool: {pool_class or 'default'}")
+    return engine
+
+
+def init_db(db_path, profile=None):
     logging.info(f"Database Initialized")
     if db_path is None:
         logging.error("Database path is None")
         raise ValueError("Database path is None")
     global _engine
-    if _engine is None:
-        _engine = create_engine(db_path, echo=False)
+    engine = _engine
+    if engine is None:
+        engine = create_db_engine(db_path, profile)
         logging.info(f"Database Engine created with path: {db_path}")
-    Base.metadata.create_all(_engine)
+    Base.metadata.create_all(engine)
+
+    from .migrations import run_migrations
+
+    # Published only once migrated, so other threads never see a half-built schema
+    run_migrations(engine)
+    _engine = engine
     return _engine
 
 
+def _bump_write_generation(conn):
+    conn.execute(
+        update(WriteGeneration).values(generation=WriteGeneration.generation + 1)
+    )
+
+
+def get_write_generation():
+    engine = get_engine()
+    with engine.connect() as conn:
+        return conn.execute(select(WriteGeneration.generation)).scalar() or 0
+
+
 def insert_trade(
     symbol,
     entry_price,
@@ -139,6 +491,21 @@ def insert_trade(
         )
 
         session.add(entry)
+        session.add(
+            TradeSummary(
+                trade_id=new_trade.trade_id,
+                total_buy_amount=entry_price * quantity,
+                total_quantity=quantity,
+                total_remaining_quantity=quantity,
+                total_charges=0,
+                total_risk_percentage=risk_percentage,
+                num_entries=1,
+                num_exits=0,
+                total_exit_quantity=0,
+                total_sell_amount=0,
+            )
+        )
+        _bump_write_generation(session)
         session.commit()
         logging.info(f"Trade inserted successfully with trade_id: {new_trade.trade_id}")
         return new_trade.trade_id
@@ -160,6 +527,7 @@ def delete_trade(trade_id):
             logging.error(f"Trade with trade_id {trade_id} not found")
             return False
         session.delete(trade)
+        _bump_write_generation(session)
         session.commit()
         logging.info(f"Trade {trade_id} Deleted succesfully")
         return True
@@ -197,6 +565,21 @@ def insert_entry(
             charges=0,
         )
         session.add(entry)
+        session.execute(
+            update(TradeSummary)
+            .where(TradeSummary.trade_id == trade_id)
+            .values(
+                total_buy_amount=TradeSummary.total_buy_amount
+                + entry_price * quantity,
+                total_quantity=TradeSummary.total_quantity + quantity,
+                total_remaining_quantity=TradeSummary.total_remaining_quantity
+                + quantity,
+                total_risk_percentage=TradeSummary.total_risk_percentage
+                + risk_percentage,
+                num_entries=TradeSummary.num_entries + 1,
+            )
+        )
+        _bump_write_generation(session)
         session.commit()
         logging.info(f"Entry inserted successfully for trade_id: {trade_id}")
         return entry.trade_id
@@ -208,67 +591,117 @@ def insert_entry(
         session.close()
 
 
+open_lot_columns = [
+    "entry_id",
+    "entry_date",
+    "quantity",
+    "remaining_quantity",
+    "entry_price",
+    "exit_amount",
+    "charges",
+]
+
+
 def insert_exit(trade_id, exit_price, quantity, exit_date, exit_type):
     logging.debug(
         f"Exit Position - {trade_id}, {quantity}, {exit_price}, {exit_date}, {exit_type}"
     )
-    engine = get_engine()
     session = get_session()
 
     try:
-        entries_df = pd.read_sql(
-            select(Entry)
+        # SQLite has no SELECT ... FOR UPDATE; updating the trade row first takes
+        # the write lock, so no other writer can change the lots read below. The
+        # same statement closes the trade when this exit covers every open share.
+        open_shares = (
+            select(func.coalesce(func.sum(Entry.remaining_quantity), 0))
             .where(Entry.trade_id == trade_id)
-            .where(Entry.remaining_quantity > 0),
-            engine,
+            .scalar_subquery()
+        )
+        locked = session.execute(
+            update(Trade)
+            .where(Trade.trade_id == trade_id)
+            .values(
+                trade_closed=case(
+                    (open_shares <= quantity, "Y"), else_=Trade.trade_closed
+                )
+            )
+        )
+        if locked.rowcount == 0:
+            logging.error(f"Trade with trade_id {trade_id} not found")
+            session.rollback()
+            return False
+
+        open_lots = session.execute(
+            select(*[getattr(Entry, c) for c in open_lot_columns])
+            .where(Entry.trade_id == trade_id)
+            .where(Entry.remaining_quantity > 0)
+            .order_by(Entry.entry_id)
+        ).all()
+        entries_df = pd.DataFrame.from_records(
+            open_lots, columns=open_lot_columns, coerce_float=True
         )
 
         entry_adjustment_details = get_entry_adjustment_details(
             entries_df, exit_date, quantity, exit_price
         )
 
-        exit_record = Exits(
-            trade_id=trade_id,
-            exit_date=exit_date,
-            quantity=quantity,
-            exit_price=exit_price,
-            exit_type=exit_type,
-            exit_reason="",
-        )
-        session.add(exit_record)
-
-        for entry in entry_adjustment_details:
-            (
-                entry_id,
-                remaining_quantity,
-                exit_amount,
-                old_charges,
-                exit_price,
-                exit_quantity,
-                total_charges,
-            ) = entry
-            entry_record = session.query(Entry).filter_by(entry_id=entry_id).first()
-            entry_record.remaining_quantity = remaining_quantity - exit_quantity
-            entry_record.exit_amount = exit_amount + (exit_price * exit_quantity)
-            entry_record.charges = old_charges + total_charges
-
-        session.flush()
-
-        total_remaining_quantity = (
-            session.query(func.sum(Entry.remaining_quantity))
-            .filter_by(trade_id=trade_id)
-            .scalar()
+        session.add(
+            Exits(
+                trade_id=trade_id,
+                exit_date=exit_date,
+                quantity=quantity,
+                exit_price=exit_price,
+                exit_type=exit_type,
+                exit_reason="",
+            )
         )
 
-        if total_remaining_quantity == 0:
-            trade = session.query(Trade).filter_by(trade_id=trade_id).first()
-            if trade:
-                trade.trade_closed = "Y"
-
-                logging.info(f"Trade {trade_id} marked as closed.")
+        entry_updates = []
+        exited_quantity, exit_charges = 0, 0
+        for (
+            entry_id,
+            remaining_quantity,
+            exit_amount,
+            old_charges,
+            _,
+            exit_quantity,
+            total_charges,
+        ) in entry_adjustment_details:
+            entry_updates.append(
+                {
+                    "entry_id": int(entry_id),
+                    "remaining_quantity": int(remaining_quantity - exit_quantity),
+                    "exit_amount": exit_amount + (exit_price * exit_quantity),
+                    "charges": old_charges + total_charges,
+                }
+            )
+            exited_quantity += exit_quantity
+            exit_charges += total_charges
+
+        if entry_updates:
+            session.execute(update(Entry), entry_updates)
+
+        exit_day = literal(exit_date, Date)
+        session.execute(
+            update(TradeSummary)
+            .where(TradeSummary.trade_id == trade_id)
+            .values(
+                total_remaining_quantity=TradeSummary.total_remaining_quantity
+                - exited_quantity,
+                total_charges=TradeSummary.total_charges + exit_charges,
+                num_exits=TradeSummary.num_exits + 1,
+                total_exit_quantity=TradeSummary.total_exit_quantity + quantity,
+                total_sell_amount=TradeSummary.total_sell_amount
+                + exit_price * quantity,
+                last_exit_date=func.max(
+                    func.coalesce(TradeSummary.last_exit_date, exit_day), exit_day
+                ),
+            )
+        )
 
-        logging.info(f"Exit position recorded for trade_id: {trade_id}")
+        _bump_write_generation(session)
         session.commit()
+        logging.info(f"Exit position recorded for trade_id: {trade_id}")
         return True
     except Exception as e:
         session.rollback()
@@ -278,92 +711,989 @@ def insert_exit(trade_id, exit_price, quantity, exit_date, exit_type):
         session.close()
 
 
-def get_all_trades_and_entries(
-    show_trades="all", financial_year=None, filter_conditions=None
-):
+bulk_trade_columns = ["trade_key", "symbol", "setup"]
+bulk_entry_columns = [
+    "trade_key",
+    "entry_date",
+    "entry_price",
+    "quantity",
+    "risk_percentage",
+    "stop_loss",
+]
+bulk_exit_columns = ["trade_key", "exit_date", "exit_price", "quantity"]
+
+
+def _check_columns(df, required, name):
+    missing = set(required).difference(df.columns)
+    if missing:
+        raise ValueError(f"{name} is missing columns: {', '.join(sorted(missing))}")
+
+
+def _as_date(series):
+    return pd.to_datetime(series).dt.date
+
+
+# Inserts frame's rows through the driver's executemany. Values are converted a
+# column at a time to what the column types bind row by row: FixedPoint scaled and
+# rounded half to even, dates as ISO text and missing values as NULL.
+def _insert_frame(conn, model, frame):
+    table = getattr(model, "__table__", model)
+    if frame.empty:
+        return
+    values = []
+    for name in frame.columns:
+        column_type = table.c[name].type
+        series = frame[name]
+        if isinstance(column_type, FixedPoint):
+            scaled = pd.to_numeric(series).to_numpy(dtype=float) * column_type.scale
+            scaled = np.round(scaled)
+            values.append([None if v != v else int(v) for v in scaled.tolist()])
+            continue
+        if isinstance(column_type, Date):
+            series = pd.to_datetime(series).dt.strftime("%Y-%m-%d")
+        missing = series.isna().to_numpy()
+        column = series.tolist()
+        if missing.any():
+            column = [None if m else v for v, m in zip(column, missing)]
+        values.append(column)
+
+    columns = ", ".join(frame.columns)
+    placeholders = ", ".join("?" for _ in frame.columns)
+    conn.exec_driver_sql(
+        f"INSERT INTO {table.name} ({columns}) VALUES ({placeholders})",
+        list(zip(*values)),
+    )
+
+
+# Writes trades with their entries and exits on conn, inside the caller's
+# transaction, which must already hold the write lock (callers bump the write
+# generation first). trades_df, entries_df and exits_df are linked by a caller-chosen
+# trade_key. Exits are allocated against entries in memory, so no row is read back.
+# Returns the new trade ids in trades_df order.
+def _bulk_import(conn, trades_df, entries_df, exits_df=None):
+    _check_columns(trades_df, bulk_trade_columns, "trades")
+    _check_columns(entries_df, bulk_entry_columns, "entries")
+    if exits_df is None:
+        exits_df = pd.DataFrame(columns=bulk_exit_columns)
+    _check_columns(exits_df, bulk_exit_columns, "exits")
+
+    trades = trades_df.reset_index(drop=True)
+    entries = entries_df.reset_index(drop=True).copy()
+    exits = exits_df.reset_index(drop=True).copy()
+    entries["entry_date"] = _as_date(entries["entry_date"])
+    exits["exit_date"] = _as_date(exits["exit_date"])
+    entries["remaining_quantity"] = entries["quantity"]
+
+    unknown = set(entries["trade_key"]).union(exits["trade_key"]).difference(
+        trades["trade_key"]
+    )
+    if unknown:
+        raise ValueError(f"Entries or exits for unknown trades: {unknown}")
+
+    allocations, remaining, _ = allocate_exits(entries, exits)
+    entries["remaining_quantity"] = remaining
+
+    allocations = allocations.join(
+        entries[["entry_date", "entry_price"]], on="entry_idx"
+    ).join(exits[["exit_date", "exit_price"]], on="exit_idx")
+    allocations["charges"] = allocation_charges(allocations)
+    allocations["exit_amount"] = allocations["quantity"] * allocations["exit_price"]
+    # Rounded to the stored precision so trade_summary totals match a rebuild
+    per_entry = (
+        allocations.groupby("entry_idx")[["exit_amount", "charges"]].sum().round(4)
+    )
+    entries["exit_amount"] = per_entry["exit_amount"].reindex(
+        entries.index, fill_value=0
+    )
+    entries["charges"] = per_entry["charges"].reindex(entries.index, fill_value=0)
+
+    # Grouped on datetime64: min/max over date objects falls back to a Python loop
+    entry_days = pd.to_datetime(entries["entry_date"])
+    first_entry = entry_days.groupby(entries["trade_key"]).min().dt.date
+    open_qty = entries.groupby("trade_key")["remaining_quantity"].sum()
+    exit_count = exits.groupby("trade_key").size()
+    if "initial_entry_date" in trades.columns:
+        trades["initial_entry_date"] = _as_date(trades["initial_entry_date"])
+    else:
+        trades["initial_entry_date"] = trades["trade_key"].map(first_entry)
+    trades["trade_closed"] = np.where(
+        (trades["trade_key"].map(open_qty).fillna(0) == 0)
+        & (trades["trade_key"].map(exit_count).fillna(0) > 0),
+        "Y",
+        "N",
+    )
+
+    # The caller holds the write lock, so ids can be taken from the current maximum
+    # instead of reading each one back with RETURNING
+    last_id = conn.execute(select(func.max(Trade.trade_id))).scalar() or 0
+    trade_ids = list(range(last_id + 1, last_id + 1 + len(trades)))
+    _insert_frame(
+        conn,
+        Trade,
+        pd.DataFrame(
+            {
+                "trade_id": trade_ids,
+                "symbol": trades["symbol"].str.upper(),
+                "initial_entry_date": trades["initial_entry_date"],
+                "setup": trades["setup"].str.upper(),
+                "trade_closed": trades["trade_closed"],
+                "financial_year": trades["initial_entry_date"].map(
+                    extract_financial_year
+                ),
+            }
+        ),
+    )
+    trade_id_map = dict(zip(trades["trade_key"], trade_ids))
+    entries["trade_id"] = entries["trade_key"].map(trade_id_map)
+    exits["trade_id"] = exits["trade_key"].map(trade_id_map)
+
+    entry_rows = entries.reindex(
+        columns=[
+            "trade_id",
+            "entry_date",
+            "entry_price",
+            "quantity",
+            "remaining_quantity",
+            "risk_percentage",
+            "entry_type",
+            "stop_loss",
+            "exit_amount",
+            "charges",
+        ]
+    )
+    _insert_frame(conn, Entry, entry_rows)
+
+    if not exits.empty:
+        exit_rows = exits.reindex(
+            columns=[
+                "trade_id",
+                "exit_date",
+                "exit_price",
+                "quantity",
+                "exit_type",
+                "exit_reason",
+            ]
+        )
+        exit_rows["exit_reason"] = exit_rows["exit_reason"].fillna("")
+        _insert_frame(conn, Exits, exit_rows)
+
+    entries["buy_amount"] = entries["entry_price"] * entries["quantity"]
+    exits["sell_amount"] = exits["exit_price"] * exits["quantity"]
+    exits["last_exit_date"] = pd.to_datetime(exits["exit_date"])
+    entry_totals = entries.groupby("trade_id").agg(
+        total_buy_amount=("buy_amount", "sum"),
+        total_quantity=("quantity", "sum"),
+        total_remaining_quantity=("remaining_quantity", "sum"),
+        total_charges=("charges", "sum"),
+        total_risk_percentage=("risk_percentage", "sum"),
+        num_entries=("quantity", "count"),
+    )
+    exit_totals = exits.groupby("trade_id").agg(
+        num_exits=("quantity", "count"),
+        total_exit_quantity=("quantity", "sum"),
+        total_sell_amount=("sell_amount", "sum"),
+        last_exit_date=("last_exit_date", "max"),
+    )
+    exit_totals["last_exit_date"] = exit_totals["last_exit_date"].dt.date
+    summary = (
+        entry_totals.reindex(trade_ids)
+        .join(exit_totals)
+        .infer_objects()
+        .fillna(
+            {
+                "total_buy_amount": 0,
+                "total_quantity": 0,
+                "total_remaining_quantity": 0,
+                "total_charges": 0,
+                "total_risk_percentage": 0,
+                "num_entries": 0,
+                "num_exits": 0,
+                "total_exit_quantity": 0,
+                "total_sell_amount": 0,
+            }
+        )
+        .astype(
+            {
+                "total_quantity": int,
+                "total_remaining_quantity": int,
+                "num_entries": int,
+                "num_exits": int,
+                "total_exit_quantity": int,
+            }
+        )
+        .rename_axis("trade_id")
+        .reset_index()
+    )
+    _insert_frame(conn, TradeSummary, summary)
+    return trade_ids
+
+
+# Inserts trades with their entries and exits in a single transaction.
+# Returns the new trade ids in trades_df order, or None if nothing was written.
+def bulk_import(trades_df, entries_df, exits_df=None):
     logging.debug(
-        f"Get All Trades and Entries - Show Only Open: {show_trades}, Financial Year: {financial_year}"
+        f"Bulk Import - {len(trades_df)} trades, {len(entries_df)} entries, "
+        f"{0 if exits_df is None else len(exits_df)} exits"
     )
-    if financial_year is None:
-        financial_year = extract_financial_year(date.today())
     engine = get_engine()
     try:
-        exits_subq = (
-            select(
-                Exits.trade_id,
-                func.sum(Exits.quantity).label("total_exit_quantity"),
-                func.count(Exits.exit_id).label("num_exits"),
-                func.sum(Exits.exit_price * Exits.quantity).label("total_sell_amount"),
-                func.max(Exits.exit_date).label("last_exit_date"),
+        with engine.begin() as conn:
+            _bump_write_generation(conn)
+            trade_ids = _bulk_import(conn, trades_df, entries_df, exits_df)
+
+        logging.info(f"Bulk imported {len(trade_ids)} trades")
+        return trade_ids
+    except Exception as e:
+        logging.error(f"Error in bulk import: {e}")
+        return None
+
+
+# Temporary tables for streamed tradebook imports. They live on the importing
+# connection only, so staging never takes the database write lock.
+import_metadata = MetaData()
+
+import_staging = Table(
+    "import_staging",
+    import_metadata,
+    Column("row_no", Integer, primary_key=True),
+    Column("symbol", String, nullable=False),
+    Column("setup", String, nullable=False),
+    Column("entry_date", Date, nullable=False),
+    Column("entry_price", Float, nullable=False),
+    Column("quantity", Integer, nullable=False),
+    Column("risk_percentage", Float, nullable=False),
+    Column("stop_loss", Float, nullable=False),
+    Column("entry_type", String),
+    Column("exit_date", Date),
+    Column("exit_price", Float),
+    Column("row_hash", Integer, nullable=False),
+    Column("occurrence", Integer),
+    Column("exit_hash", Integer, nullable=False),
+    Index("ix_import_staging_trade", "symbol", "entry_date"),
+    prefixes=["TEMPORARY"],
+)
+
+# One row per (symbol, entry_date) group, numbered in the order trades are created.
+# first_row and first_type_row point at the staged rows that supply setup and
+# entry_type, matching "first" in a pandas groupby.
+import_trade_keys = Table(
+    "import_trade_keys",
+    import_metadata,
+    Column("trade_key", Integer, primary_key=True),
+    Column("symbol", String, nullable=False),
+    Column("entry_date", Date, nullable=False),
+    Column("first_row", Integer, nullable=False),
+    Column("first_type_row", Integer),
+    prefixes=["TEMPORARY"],
+)
+
+staging_columns = [c.name for c in import_staging.columns if c.name != "occurrence"]
+
+# Content hashes of rows read outside the staging table, checked by new_import_rows
+import_row_hashes = Table(
+    "import_row_hashes",
+    import_metadata,
+    Column("row_no", Integer, primary_key=True),
+    Column("row_hash", Integer, nullable=False),
+    Column("occurrence", Integer, nullable=False),
+    prefixes=["TEMPORARY"],
+)
+
+
+def _record_import_batch(conn, file_name, mode, rows, new_rows):
+    return conn.execute(
+        insert(ImportBatch)
+        .values(
+            file_name=file_name,
+            mode=mode,
+            rows=rows,
+            new_rows=new_rows,
+            skipped_rows=rows - new_rows,
+            imported_on=datetime.now(),
+        )
+        .returning(ImportBatch.batch_id)
+    ).scalar()
+
+
+def _imported_before(table):
+    return select(ImportedRow.row_hash).where(
+        (ImportedRow.row_hash == table.c.row_hash)
+        & (ImportedRow.occurrence == table.c.occurrence)
+    )
+
+
+# Numbers repeated rows in file order and drops the staged rows an earlier import
+# already added, with anti-joins against the imported_rows primary key. A row whose
+# entry was imported before with a different exit (usually open then, closed now)
+# fails the import: the trade it created has to be exited on the Trades page. The
+# remaining rows are recorded under a new import batch. Returns the number skipped.
+def _skip_imported_rows(conn, file_name, staged_rows):
+    staged = import_staging
+    numbered = select(
+        staged.c.row_no,
+        (
+            func.row_number().over(
+                partition_by=staged.c.row_hash, order_by=staged.c.row_no
             )
-            .group_by(Exits.trade_id)
-            .subquery()
+            - 1
+        ).label("occurrence"),
+    ).subquery()
+    conn.execute(
+        update(staged)
+        .values(occurrence=numbered.c.occurrence)
+        .where(staged.c.row_no == numbered.c.row_no)
+    )
+
+    changed = conn.execute(
+        select(staged.c.row_no, staged.c.symbol, staged.c.entry_date)
+        .where(
+            _imported_before(staged)
+            .where(ImportedRow.exit_hash.is_not(None))
+            .where(ImportedRow.exit_hash != staged.c.exit_hash)
+            .exists()
+        )
+        .order_by(staged.c.row_no)
+    ).all()
+    if changed:
+        details = ", ".join(
+            f"row {row_no}: {symbol} entered {entry_date}"
+            for row_no, symbol, entry_date in changed[:5]
         )
+        raise ValueError(
+            f"{len(changed)} row(s) were imported before with a different exit "
+            f"({details}{', ...' if len(changed) > 5 else ''}). "
+            "Record those exits on the Trades page instead."
+        )
+
+    skipped = conn.execute(
+        delete(staged).where(_imported_before(staged).exists())
+    ).rowcount
 
-        entries_subq = (
+    batch_id = _record_import_batch(
+        conn, file_name, "trades", staged_rows, staged_rows - skipped
+    )
+    conn.execute(
+        insert(ImportedRow).from_select(
+            ["row_hash", "occurrence", "batch_id", "exit_hash"],
             select(
-                Entry.trade_id,
-                func.sum(Entry.quantity).label("total_entry_quantity"),
-                func.sum(Entry.remaining_quantity).label("total_remaining_quantity"),
-                func.sum(Entry.charges).label("total_charges"),
-                func.sum(Entry.risk_percentage).label("total_risk_percentage"),
-                func.count(Entry.entry_id).label("num_entries"),
-                func.sum(Entry.entry_price * Entry.quantity).label("total_buy_amount"),
+                staged.c.row_hash,
+                staged.c.occurrence,
+                literal(batch_id),
+                staged.c.exit_hash,
+            ).order_by(staged.c.row_hash, staged.c.occurrence),
+        )
+    )
+    return skipped
+
+
+# Returns the row numbers of the rows no earlier import has added. row_hashes has
+# row_no, row_hash and occurrence columns.
+def new_import_rows(row_hashes):
+    engine = get_engine()
+    with engine.connect() as conn:
+        try:
+            import_row_hashes.create(conn)
+            _insert_frame(conn, import_row_hashes, row_hashes)
+            return pd.Index(
+                conn.execute(
+                    select(import_row_hashes.c.row_no).where(
+                        ~_imported_before(import_row_hashes).exists()
+                    )
+                ).scalars(),
+                name="row_no",
             )
-            .group_by(Entry.trade_id)
-            .subquery()
+        finally:
+            import_row_hashes.drop(conn)
+            conn.commit()
+
+
+def _import_batches(conn, batch_size):
+    staged = import_staging.alias("staged")
+    first = import_staging.alias("first")
+    typed = import_staging.alias("typed")
+    keys = import_trade_keys
+    on_key = (staged.c.symbol == keys.c.symbol) & (
+        staged.c.entry_date == keys.c.entry_date
+    )
+    trades_query = (
+        select(
+            keys.c.trade_key,
+            keys.c.symbol,
+            keys.c.entry_date,
+            first.c.setup,
+            typed.c.entry_type,
+            func.max(staged.c.entry_price).label("entry_price"),
+            func.sum(staged.c.quantity).label("quantity"),
+            (func.max(staged.c.risk_percentage) * 100).label("risk_percentage"),
+            func.max(staged.c.stop_loss).label("stop_loss"),
+        )
+        .join(staged, on_key)
+        .join(first, first.c.row_no == keys.c.first_row)
+        .outerjoin(typed, typed.c.row_no == keys.c.first_type_row)
+        .where(keys.c.trade_key.between(bindparam("lo"), bindparam("hi")))
+        .group_by(keys.c.trade_key)
+        .order_by(keys.c.trade_key)
+    )
+    exit_groups = (
+        select(
+            keys.c.trade_key,
+            staged.c.exit_date,
+            func.sum(staged.c.quantity).label("quantity"),
+            func.min(staged.c.row_no)
+            .filter(staged.c.exit_price.is_not(None))
+            .label("price_row"),
+        )
+        .join(staged, on_key)
+        .where(keys.c.trade_key.between(bindparam("lo"), bindparam("hi")))
+        .where(staged.c.exit_date.is_not(None))
+        .group_by(keys.c.trade_key, staged.c.exit_date)
+        .subquery()
+    )
+    priced = import_staging.alias("priced")
+    exits_query = (
+        select(
+            exit_groups.c.trade_key,
+            exit_groups.c.exit_date,
+            priced.c.exit_price,
+            exit_groups.c.quantity,
         )
+        .outerjoin(priced, priced.c.row_no == exit_groups.c.price_row)
+        .order_by(exit_groups.c.trade_key, exit_groups.c.exit_date)
+    )
 
-        stmt = (
-            select(
-                Trade,
-                func.coalesce(entries_subq.c.total_buy_amount, 0).label(
-                    "total_buy_amount"
-                ),
-                func.coalesce(entries_subq.c.total_entry_quantity, 0).label(
-                    "total_quantity"
-                ),
-                func.coalesce(entries_subq.c.total_remaining_quantity, 0).label(
-                    "total_open_position"
-                ),
-                entries_subq.c.num_entries,
-                entries_subq.c.total_risk_percentage,
-                func.coalesce(entries_subq.c.total_charges, 0).label("total_charges"),
-                func.coalesce(exits_subq.c.num_exits, 0).label("num_exits"),
-                func.coalesce(exits_subq.c.total_sell_amount, 0).label(
-                    "total_sell_amount"
-                ),
-                func.coalesce(exits_subq.c.last_exit_date, None).label(
-                    "last_exit_date"
-                ),
+    last_key = conn.execute(select(func.max(keys.c.trade_key))).scalar() or 0
+    for lo in range(1, last_key + 1, batch_size):
+        bounds = {"lo": lo, "hi": lo + batch_size - 1}
+        trades = pd.DataFrame.from_records(
+            conn.execute(trades_query, bounds).all(),
+            columns=[c.name for c in trades_query.selected_columns],
+            coerce_float=True,
+        )
+        exits = pd.DataFrame.from_records(
+            conn.execute(exits_query, bounds).all(),
+            columns=bulk_exit_columns,
+            coerce_float=True,
+        )
+        yield trades, exits
+
+
+# Streams staged tradebook rows into the journal. chunks yields frames with the
+# staging_columns; each one is written to a temporary table and dropped from
+# memory. The rows are then grouped into trades and exits in SQL and inserted
+# batch_size trades at a time, all in one transaction. Rows an earlier import
+# already added are skipped, and the rest are recorded as an import batch of
+# file_name. progress, if given, is called with the counts after every chunk and
+# batch; an exception raised from it aborts the import. Returns the number of
+# trades and exits inserted and of rows skipped; raises on error with nothing
+# written.
+def import_staged_rows(chunks, batch_size=5000, progress=None, file_name=""):
+    engine = get_engine()
+    with engine.connect() as conn:
+        try:
+            import_metadata.create_all(conn)
+            staged_rows = 0
+            for chunk in chunks:
+                rows = chunk.reindex(columns=staging_columns)
+                rows = rows.astype(object).where(rows.notna(), None)
+                conn.execute(insert(import_staging), rows.to_dict("records"))
+                staged_rows += len(rows)
+                if progress:
+                    progress(stage="staging", rows=staged_rows)
+            conn.commit()
+            logging.debug(f"Staged {staged_rows} tradebook rows")
+
+            _bump_write_generation(conn)
+            skipped = _skip_imported_rows(conn, file_name, staged_rows)
+            if skipped:
+                logging.info(f"Skipped {skipped} rows imported before")
+            staged = import_staging
+            conn.execute(
+                insert(import_trade_keys).from_select(
+                    ["symbol", "entry_date", "first_row", "first_type_row"],
+                    select(
+                        staged.c.symbol,
+                        staged.c.entry_date,
+                        func.min(staged.c.row_no),
+                        func.min(staged.c.row_no).filter(
+                            staged.c.entry_type.is_not(None)
+                        ),
+                    )
+                    .group_by(staged.c.symbol, staged.c.entry_date)
+                    .order_by(staged.c.symbol, staged.c.entry_date),
+                )
+            )
+
+            if progress:
+                total_trades = conn.execute(
+                    select(func.count()).select_from(import_trade_keys)
+                ).scalar()
+                progress(stage="finalizing", total_trades=total_trades)
+
+            trade_count, exit_count = 0, 0
+            for trades, exits in _import_batches(conn, batch_size):
+                entries = trades[bulk_entry_columns + ["entry_type"]]
+                _bulk_import(conn, trades[bulk_trade_columns], entries, exits)
+                trade_count += len(trades)
+                exit_count += len(exits)
+                if progress:
+                    progress(trades=trade_count, exits=exit_count)
+            conn.commit()
+
+            logging.info(
+                f"Imported {trade_count} trades and {exit_count} exits "
+                f"from {staged_rows} rows"
+            )
+            return {
+                "rows": staged_rows,
+                "trades": trade_count,
+                "exits": exit_count,
+                "skipped": skipped,
+            }
+        except Exception as e:
+            conn.rollback()
+            logging.error(f"Error importing tradebook: {e}")
+            raise
+        finally:
+            import_metadata.drop_all(conn)
+            conn.commit()
+
+
+# bulk_import for frames too large to write in one pass. trades_df, entries_df and
+# exits_df must be ordered by trade_key; they are written batch_size trades at a
+# time in one transaction, calling progress as import_staged_rows does.
+# import_batch, if given, records the file in the same transaction: a dict with
+# file_name, mode, rows and row_hashes, the row_hash and occurrence of its new rows.
+# Returns the number of trades and exits inserted; raises on error with nothing
+# written.
+def bulk_import_batched(
+    trades_df, entries_df, exits_df, batch_size=5000, progress=None, import_batch=None
+):
+    engine = get_engine()
+    trade_keys = trades_df["trade_key"].to_numpy()
+    entry_keys = entries_df["trade_key"].to_numpy()
+    exit_keys = exits_df["trade_key"].to_numpy()
+    with engine.connect() as conn:
+        try:
+            _bump_write_generation(conn)
+            if import_batch is not None:
+                row_hashes = import_batch["row_hashes"]
+                batch_id = _record_import_batch(
+                    conn,
+                    import_batch["file_name"],
+                    import_batch["mode"],
+                    import_batch["rows"],
+                    len(row_hashes),
+                )
+                _insert_frame(
+                    conn,
+                    ImportedRow,
+                    row_hashes[["row_hash", "occurrence"]]
+                    .sort_values(["row_hash", "occurrence"])
+                    .assign(batch_id=batch_id),
+                )
+            if progress:
+                progress(stage="finalizing", total_trades=len(trades_df))
+            trade_count, exit_count = 0, 0
+            for start in range(0, len(trades_df), batch_size):
+                batch_keys = trade_keys[start : start + batch_size]
+                first_key, last_key = batch_keys[0], batch_keys[-1]
+                entry_slice = slice(
+                    np.searchsorted(entry_keys, first_key, "left"),
+                    np.searchsorted(entry_keys, last_key, "right"),
+                )
+                exit_slice = slice(
+                    np.searchsorted(exit_keys, first_key, "left"),
+                    np.searchsorted(exit_keys, last_key, "right"),
+                )
+                exits = exits_df.iloc[exit_slice]
+                _bulk_import(
+                    conn,
+                    trades_df.iloc[start : start + batch_size],
+                    entries_df.iloc[entry_slice],
+                    exits,
+                )
+                trade_count += len(batch_keys)
+                exit_count += len(exits)
+                if progress:
+                    progress(trades=trade_count, exits=exit_count)
+            conn.commit()
+
+            logging.info(f"Bulk imported {trade_count} trades and {exit_count} exits")
+            return {"trades": trade_count, "exits": exit_count}
+        except Exception as e:
+            conn.rollback()
+            logging.error(f"Error in batched bulk import: {e}")
+            raise
+
+
+def create_import_job(file_name):
+    engine = get_engine()
+    with engine.begin() as conn:
+        return conn.execute(
+            insert(ImportJob)
+            .values(
+                file_name=file_name,
+                status="queued",
+                created_on=datetime.now(),
+                owner_pid=os.getpid(),
+            )
+            .returning(ImportJob.job_id)
+        ).scalar()
+
+
+def update_import_job(job_id, **values):
+    engine = get_engine()
+    with engine.begin() as conn:
+        conn.execute(
+            update(ImportJob).where(ImportJob.job_id == job_id).values(**values)
+        )
+
+
+def get_import_job(job_id):
+    engine = get_engine()
+    with engine.connect() as conn:
+        row = conn.execute(
+            select(*ImportJob.__table__.columns).where(ImportJob.job_id == job_id)
+        ).first()
+    return row._asdict() if row else None
+
+
+def get_import_jobs(limit=10):
+    engine = get_engine()
+    with engine.connect() as conn:
+        return pd.read_sql(
+            select(ImportJob).order_by(ImportJob.job_id.desc()).limit(limit), conn
+        )
+
+
+# Jobs run in the process that queued them, so a job still queued or running under
+# this process's pid when its runner starts was cut off by an earlier process with
+# the same pid, as were jobs queued before owner_pid was recorded; their import
+# transactions were never committed. Jobs of other servers sharing the database are
+# left alone. Without owner_pid every unfinished job is failed, which is only safe
+# while no server is running.
+def fail_interrupted_import_jobs(owner_pid=None):
+    unfinished = [ImportJob.status.in_(["queued", "running"])]
+    if owner_pid is not None:
+        unfinished.append(
+            or_(ImportJob.owner_pid == owner_pid, ImportJob.owner_pid.is_(None))
+        )
+    engine = get_engine()
+    with engine.begin() as conn:
+        return conn.execute(
+            update(ImportJob)
+            .where(*unfinished)
+            .values(
+                status="failed",
+                message="Interrupted before finishing, no trades were imported.",
+                finished_on=datetime.now(),
             )
-            .outerjoin(entries_subq, Trade.trade_id == entries_subq.c.trade_id)
-            .outerjoin(exits_subq, Trade.trade_id == exits_subq.c.trade_id)
-            .where(Trade.financial_year == financial_year)
-            .group_by(Trade.trade_id)
-            .order_by(Trade.initial_entry_date.desc())
-        )
-
-        if show_trades == "open":
-            stmt = stmt.where(Trade.trade_closed == "N")
-        elif show_trades == "closed":
-            stmt = stmt.where(Trade.trade_closed == "Y")
-
-        if filter_conditions:
-            for filter_col, condition in filter_conditions.items():
-                if filter_col == "initial_entry_date":
-                    if condition[0] == "inRange":
-                        stmt = stmt.where(
-                            getattr(Trade, filter_col).between(
-                                condition[1], condition[2]
-                            )
-                        )
-                    elif condition[0] == "equals":
-                        stmt = stmt.where(getattr(Trade, filter_col) == condition[1])
-                    elif condition[0] == "lessThan":
-                        stmt = stmt.where(getattr(Trade, filter_col) < condition[1])
-                    elif condition[0] == "greaterThan":
-                        stmt = stmt.where(getattr(Trade, filter_col) > condition[1])
+        ).rowcount
+
+
+# Replays every exit against the entries of its trade and rewrites entries.charges
+# from the current charge schedule in one transaction. insert_exit accepts exits
+# larger than the position open on their date, which the replay cannot allocate;
+# such trades are logged and keep their stored charges.
+def recompute_charges():
+    logging.debug("Recompute Charges for all entries")
+    engine = get_engine()
+    try:
+        with engine.begin() as conn:
+            entries = pd.DataFrame.from_records(
+                conn.execute(
+                    select(
+                        Entry.entry_id,
+                        Entry.trade_id,
+                        Entry.entry_date,
+                        Entry.entry_price,
+                        Entry.quantity,
+                    ).order_by(Entry.entry_id)
+                ).all(),
+                columns=[
+                    "entry_id",
+                    "trade_id",
+                    "entry_date",
+                    "entry_price",
+                    "quantity",
+                ],
+                coerce_float=True,
+            )
+            exits = pd.DataFrame.from_records(
+                conn.execute(
+                    select(
+                        Exits.exit_id,
+                        Exits.trade_id,
+                        Exits.exit_date,
+                        Exits.exit_price,
+                        Exits.quantity,
+                    ).order_by(Exits.exit_id)
+                ).all(),
+                columns=["exit_id", "trade_id", "exit_date", "exit_price", "quantity"],
+                coerce_float=True,
+            )
+            if entries.empty:
+                logging.info("No entries to recompute charges for")
+                return True
+
+            entries["remaining_quantity"] = entries["quantity"]
+            allocations, _, skipped = allocate_exits(
+                entries, exits, key="trade_id", skip_invalid=True
+            )
+            allocations = allocations.join(
+                entries[["entry_date", "entry_price"]], on="entry_idx"
+            ).join(exits[["exit_date", "exit_price"]], on="exit_idx")
+            allocations["charges"] = allocation_charges(allocations)
+            per_entry = allocations.groupby("entry_idx")["charges"].sum()
+            entries["charges"] = per_entry.reindex(entries.index, fill_value=0)
+            if skipped:
+                logging.warning(
+                    f"Charges not recomputed for {len(skipped)} trades whose exits "
+                    f"exceed their open position: {skipped}"
+                )
+                entries = entries[~entries["trade_id"].isin(skipped)]
+
+            conn.execute(
+                update(Entry)
+                .where(Entry.entry_id == bindparam("b_entry_id"))
+                .values(charges=bindparam("b_charges")),
+                [
+                    {"b_entry_id": int(entry_id), "b_charges": float(charge)}
+                    for entry_id, charge in zip(entries["entry_id"], entries["charges"])
+                ],
+            )
+            _rebuild_trade_summary(conn)
+            _bump_write_generation(conn)
+
+        logging.info(f"Charges recomputed for {len(entries)} entries")
+        return True
+    except Exception as e:
+        logging.error(f"Error recomputing charges: {e}")
+        return False
+
+
+def _rebuild_trade_summary(conn, trade_ids=None):
+    entries_subq = (
+        select(
+            Entry.trade_id,
+            func.sum(Entry.entry_price * Entry.quantity).label("total_buy_amount"),
+            func.sum(Entry.quantity).label("total_quantity"),
+            func.sum(Entry.remaining_quantity).label("total_remaining_quantity"),
+            func.sum(Entry.charges).label("total_charges"),
+            func.sum(Entry.risk_percentage).label("total_risk_percentage"),
+            func.count(Entry.entry_id).label("num_entries"),
+        )
+        .group_by(Entry.trade_id)
+        .subquery()
+    )
+    exits_subq = (
+        select(
+            Exits.trade_id,
+            func.count(Exits.exit_id).label("num_exits"),
+            func.sum(Exits.quantity).label("total_exit_quantity"),
+            func.sum(Exits.exit_price * Exits.quantity).label("total_sell_amount"),
+            func.max(Exits.exit_date).label("last_exit_date"),
+        )
+        .group_by(Exits.trade_id)
+        .subquery()
+    )
+    summary_select = (
+        select(
+            Trade.trade_id,
+            func.coalesce(entries_subq.c.total_buy_amount, 0),
+            func.coalesce(entries_subq.c.total_quantity, 0),
+            func.coalesce(entries_subq.c.total_remaining_quantity, 0),
+            func.coalesce(entries_subq.c.total_charges, 0),
+            func.coalesce(entries_subq.c.total_risk_percentage, 0),
+            func.coalesce(entries_subq.c.num_entries, 0),
+            func.coalesce(exits_subq.c.num_exits, 0),
+            func.coalesce(exits_subq.c.total_exit_quantity, 0),
+            func.coalesce(exits_subq.c.total_sell_amount, 0),
+            exits_subq.c.last_exit_date,
+        )
+        .outerjoin(entries_subq, Trade.trade_id == entries_subq.c.trade_id)
+        .outerjoin(exits_subq, Trade.trade_id == exits_subq.c.trade_id)
+    )
+
+    delete_stmt = delete(TradeSummary)
+    if trade_ids is not None:
+        summary_select = summary_select.where(Trade.trade_id.in_(trade_ids))
+        delete_stmt = delete_stmt.where(TradeSummary.trade_id.in_(trade_ids))
+
+    conn.execute(delete_stmt)
+    conn.execute(
+        insert(TradeSummary).from_select(
+            [
+                "trade_id",
+                "total_buy_amount",
+                "total_quantity",
+                "total_remaining_quantity",
+                "total_charges",
+                "total_risk_percentage",
+                "num_entries",
+                "num_exits",
+                "total_exit_quantity",
+                "total_sell_amount",
+                "last_exit_date",
+            ],
+            summary_select,
+        )
+    )
+
+
+def rebuild_trade_summary(trade_ids=None):
+    logging.debug(f"Rebuild Trade Summary for: {trade_ids or 'all trades'}")
+    engine = get_engine()
+    try:
+        with engine.begin() as conn:
+            _rebuild_trade_summary(conn, trade_ids)
+        logging.info("Trade summary rebuilt successfully")
+        return True
+    except Exception as e:
+        logging.error(f"Error rebuilding trade summary: {e}")
+        return False
+
+
+def _trades_grid_columns():
+    total_open_position = TradeSummary.total_remaining_quantity
+    today = func.julianday(date.today().isoformat())
+
+    return {
+        "trade_id": Trade.trade_id,
+        "symbol": Trade.symbol,
+        "initial_entry_date": Trade.initial_entry_date,
+        "setup": Trade.setup,
+        "trade_closed": Trade.trade_closed,
+        "financial_year": Trade.financial_year,
+        "total_buy_amount": TradeSummary.total_buy_amount,
+        "total_quantity": TradeSummary.total_quantity,
+        "total_open_position": total_open_position,
+        "num_entries": TradeSummary.num_entries,
+        "total_risk_percentage": TradeSummary.total_risk_percentage,
+        "total_charges": TradeSummary.total_charges,
+        "num_exits": TradeSummary.num_exits,
+        "total_sell_amount": TradeSummary.total_sell_amount,
+        "last_exit_date": TradeSummary.last_exit_date,
+        "avg_entry_price": func.round(
+            fixed_point_value(TradeSummary.total_buy_amount)
+            / func.nullif(TradeSummary.total_quantity, 0),
+            2,
+        ),
+        "days_held": cast(
+            case(
+                (
+                    total_open_position > 0,
+                    today - func.julianday(Trade.initial_entry_date),
+                ),
+                else_=func.julianday(TradeSummary.last_exit_date)
+                - func.julianday(Trade.initial_entry_date),
+            ),
+            Integer,
+        ),
+        "status": case((total_open_position > 0, "Open"), else_="Closed"),
+    }
+
+
+trade_columns = {
+    "trade_id",
+    "symbol",
+    "initial_entry_date",
+    "setup",
+    "trade_closed",
+    "financial_year",
+}
+
+
+def _trades_grid_query(show_trades, financial_year, filter_model):
+    columns = _trades_grid_columns()
+
+    stmt = select(*[expr.label(name) for name, expr in columns.items()]).join(
+        TradeSummary, Trade.trade_id == TradeSummary.trade_id
+    )
+
+    # Predicates on trades alone, so the row count can skip the summary join
+    trade_conditions = [Trade.financial_year == financial_year]
+    if show_trades == "open":
+        trade_conditions.append(Trade.trade_closed == "N")
+    elif show_trades == "closed":
+        trade_conditions.append(Trade.trade_closed == "Y")
+
+    # Aggregated and derived columns come from trade_summary
+    grid_conditions = []
+    for col_id, predicate in compile_filter_model(filter_model, columns).items():
+        if col_id in trade_columns:
+            trade_conditions.append(predicate)
+        else:
+            grid_conditions.append(predicate)
+
+    stmt = stmt.where(*trade_conditions, *grid_conditions)
+    return stmt, columns, trade_conditions, grid_conditions
+
+
+def _trades_grid_order_by(columns, sort_model):
+    order_by = []
+    for sort in sort_model or []:
+        col = columns.get(sort.get("colId"))
+        if col is None:
+            logging.warning(f"Ignoring sort on unknown column: {sort.get('colId')}")
+            continue
+        order_by.append(col.desc() if sort.get("sort") == "desc" else col.asc())
+
+    if not order_by:
+        order_by.append(Trade.initial_entry_date.desc())
+    # trade_id keeps the order stable across row blocks
+    order_by.append(Trade.trade_id.desc())
+    return order_by
+
+
+# Weighted entry price of the lots still open in each trade. After a partial exit,
+# which takes the newest lots first, it differs from the average of all entries.
+def get_open_entry_prices(trade_ids):
+    if not trade_ids:
+        return {}
+    engine = get_engine()
+    stmt = (
+        select(
+            Entry.trade_id,
+            func.round(
+                fixed_point_value(
+                    func.sum(Entry.entry_price * Entry.remaining_quantity)
+                )
+                / func.sum(Entry.remaining_quantity),
+                2,
+            ),
+        )
+        .where(Entry.trade_id.in_(trade_ids), Entry.remaining_quantity > 0)
+        .group_by(Entry.trade_id)
+    )
+    with engine.connect() as conn:
+        return dict(conn.execute(stmt).all())
+
+
+def get_all_trades_and_entries(
+    show_trades="all",
+    financial_year=None,
+    filter_model=None,
+    start_row=None,
+    end_row=None,
+    sort_model=None,
+):
+    logging.debug(
+        f"Get All Trades and Entries - Show Only Open: {show_trades}, Financial Year: {financial_year}, Rows: {start_row}-{end_row}"
+    )
+    if financial_year is None:
+        financial_year = extract_financial_year(date.today())
+    engine = get_engine()
+    try:
+        stmt, columns, _, _ = _trades_grid_query(
+            show_trades, financial_year, filter_model
+        )
+        stmt = stmt.order_by(*_trades_grid_order_by(columns, sort_model))
+
+        if start_row is not None:
+            stmt = stmt.offset(start_row)
+            if end_row is not None:
+                stmt = stmt.limit(end_row - start_row)
 
         trades = pd.read_sql(stmt, engine)
 
@@ -371,6 +1701,11 @@ def get_all_trades_and_entries(
             logging.info("No trades found for the given criteria.")
             return None
 
+        open_trades = trades.loc[trades["total_open_position"] > 0, "trade_id"]
+        trades["open_entry_price"] = trades["trade_id"].map(
+            get_open_entry_prices(open_trades.tolist())
+        )
+
         logging.info(f"Fetched {len(trades)} trades from the database.")
         return trades
     except Exception as e:
@@ -378,6 +1713,33 @@ def get_all_trades_and_entries(
         return None
 
 
+def get_trades_count(show_trades="all", financial_year=None, filter_model=None):
+    logging.debug(
+        f"Get Trades Count - Show Only Open: {show_trades}, Financial Year: {financial_year}"
+    )
+    if financial_year is None:
+        financial_year = extract_financial_year(date.today())
+    session = get_session()
+    try:
+        _, _, trade_conditions, grid_conditions = _trades_grid_query(
+            show_trades, financial_year, filter_model
+        )
+        if grid_conditions:
+            count_stmt = (
+                select(func.count(Trade.trade_id))
+                .join(TradeSummary, Trade.trade_id == TradeSummary.trade_id)
+                .where(*trade_conditions, *grid_conditions)
+            )
+        else:
+            count_stmt = select(func.count(Trade.trade_id)).where(*trade_conditions)
+        return session.execute(count_stmt).scalar()
+    except Exception as e:
+        logging.error(f"Error counting trades: {e}")
+        return 0
+    finally:
+        session.close()
+
+
 def get_entries(trade_id):
     logging.debug(f"Get All Entries for Trade ID: {trade_id}")
     session = get_session()
@@ -425,23 +1787,114 @@ def get_all_financial_years():
         session.close()
 
 
+# Explicit dtypes for the typed readers. Dates are fetched as ISO strings and parsed
+# in one vectorized pass; repeated labels become categoricals.
+column_dtypes = {
+    "trade_id": "int64",
+    "entry_id": "int64",
+    "exit_id": "int64",
+    "symbol": "category",
+    "setup": "category",
+    "financial_year": "category",
+    "trade_closed": "category",
+    "entry_type": "category",
+    "exit_type": "category",
+    "exit_reason": "category",
+    "initial_entry_date": "datetime64[ns]",
+    "last_exit_date": "datetime64[ns]",
+    "entry_date": "datetime64[ns]",
+    "exit_date": "datetime64[ns]",
+    "quantity": "int32",
+    "remaining_quantity": "int32",
+    "entry_price": "float64",
+    "stop_loss": "float64",
+    "exit_price": "float64",
+    "exit_amount": "float64",
+    "charges": "float64",
+    "risk_percentage": "float64",
+    "entry_amount": "float64",
+    "risked_amount": "float64",
+    "gross_pl": "float64",
+    "net_pl": "float64",
+    "net_pl_percentage": "float64",
+    "gross_R": "float64",
+    "net_R": "float64",
+    "cumulative_net_pl": "float64",
+    "cumulative_net_R": "float64",
+    "win": "int8",
+    "holding_days": "int32",
+    "date": "datetime64[ns]",
+    "cum_net_pl": "float64",
+    "cum_net_R": "float64",
+    "peak": "float64",
+    "drawdown": "float64",
+    "drawdown_days": "int32",
+    "avg_entry_price": "float64",
+    "risk_per_share": "float64",
+    "price_days": "int32",
+    "mae": "float64",
+    "mfe": "float64",
+    "mae_R": "float64",
+    "mfe_R": "float64",
+}
+
+
+def _typed_columns(model, columns):
+    table_columns = model.__table__.columns
+    columns = columns or [c.name for c in table_columns]
+    selected = []
+    for name in columns:
+        col = getattr(model, name)
+        if isinstance(table_columns[name].type, Date):
+            col = type_coerce(col, String)
+        selected.append(col.label(name))
+    return selected
+
+
+def _typed_series(values, dtype):
+    if dtype.startswith("datetime64"):
+        return pd.to_datetime(pd.Series(values, dtype=object), format="%Y-%m-%d")
+    if dtype == "category":
+        return pd.Series(pd.Categorical(values))
+    return pd.Series(np.array(values, dtype=dtype))
+
+
+def read_typed_frame(stmt):
+    engine = get_engine()
+    with engine.connect() as conn:
+        result = conn.execute(stmt)
+        names = list(result.keys())
+        rows = result.fetchall()
+
+    if not rows:
+        return pd.DataFrame(
+            {
+                name: pd.Series(dtype=column_dtypes.get(name, "object"))
+                for name in names
+            }
+        )
+
+    return pd.DataFrame(
+        {
+            name: _typed_series(values, column_dtypes.get(name, "object"))
+            for name, values in zip(names, zip(*rows))
+        }
+    )
+
+
 def get_all_entries(financial_year="all"):
     logging.debug(
         f"get_all_entries: Get All Entries for Financial Year: {financial_year}"
     )
-    engine = get_engine()
     try:
-        if financial_year == "all" or financial_year is None:
-            stmt = select(Entry).join(Trade).where(Trade.trade_closed == "Y")
-        else:
-            stmt = (
-                select(Entry)
-                .join(Trade)
-                .where(Trade.financial_year == financial_year)
-                .where(Trade.trade_closed == "Y")
-            )
-        entries = pd.read_sql(stmt, engine)
-        return entries
+        stmt = (
+            select(*_typed_columns(Entry, None))
+            .join(Trade)
+            .where(Trade.trade_closed == "Y")
+        )
+        if financial_year != "all" and financial_year is not None:
+            stmt = stmt.where(Trade.financial_year == financial_year)
+        return read_typed_frame(stmt)
     except Exception as e:
         logging.error(f"Error fetching entries: {e}")
         return None
@@ -449,16 +1902,15 @@ def get_all_entries(financial_year="all"):
 
 def get_all_exits(financial_year="all"):
     logging.debug(f"get_all_exits: Get All Exits for Financial Year: {financial_year}")
-    engine = get_engine()
     try:
-        if financial_year == "all" or financial_year is None:
-            stmt = select(Exits).join(Trade).where(Trade.trade_closed == "Y")
-        else:
-            stmt = (
-                select(Exits).join(Trade).where(Trade.financial_year == financial_year)
-            )
-        exits = pd.read_sql(stmt, engine)
-        return exits
+        stmt = (
+            select(*_typed_columns(Exits, None))
+            .join(Trade)
+            .where(Trade.trade_closed == "Y")
+        )
+        if financial_year != "all" and financial_year is not None:
+            stmt = stmt.where(Trade.financial_year == financial_year)
+        return read_typed_frame(stmt)
     except Exception as e:
         logging.error(f"Error fetching exits: {e}")
         return None
@@ -468,23 +1920,363 @@ def get_all_trades(financial_year="all"):
     logging.debug(
         f"get_all_trades: Get All Trades for Financial Year: {financial_year}"
     )
+    try:
+        stmt = select(*_typed_columns(Trade, None)).where(Trade.trade_closed == "Y")
+        if financial_year != "all" and financial_year is not None:
+            stmt = stmt.where(Trade.financial_year == financial_year)
+        return read_typed_frame(stmt)
+    except Exception as e:
+        logging.error(f"Error fetching trades: {e}")
+        return None
+
+
+# One row per closed trade with P&L, R multiples and holding period. Each CTE rounds
+# at the same step the stats page always has, so the group summaries are unchanged.
+# closed_after keeps only trades whose last exit is after that date.
+def _trade_stats_query(financial_year, closed_after=None):
+    closed = [Trade.trade_closed == "Y"]
+    if financial_year != "all" and financial_year is not None:
+        closed.append(Trade.financial_year == financial_year)
+    if closed_after is not None:
+        closed.append(
+            Trade.trade_id.in_(
+                select(TradeSummary.trade_id).where(
+                    TradeSummary.last_exit_date > closed_after
+                )
+            )
+        )
+
+    # Entry amounts are summed as the floats the pandas path multiplied and added,
+    # not as exact fixed-point integers, so each trade rounds to the same cent
+    compensated_sum = func.compensated_sum
+    entry_price = fixed_point_value(Entry.entry_price)
+    stop_loss = fixed_point_value(Entry.stop_loss)
+    trade_totals = (
+        select(
+            Trade.trade_id,
+            Trade.symbol,
+            Trade.initial_entry_date,
+            Trade.setup,
+            Trade.financial_year,
+            func.sum(Entry.quantity).label("quantity"),
+            compensated_sum(entry_price * Entry.quantity).label("entry_amount"),
+            compensated_sum(Entry.quantity * (entry_price - stop_loss)).label(
+                "risked_amount"
+            ),
+            compensated_sum(fixed_point_value(Entry.exit_amount)).label("exit_amount"),
+            compensated_sum(fixed_point_value(Entry.charges)).label("charges"),
+            compensated_sum(fixed_point_value(Entry.risk_percentage, 2)).label(
+                "risk_percentage"
+            ),
+        )
+        .join(Entry, Entry.trade_id == Trade.trade_id)
+        .where(*closed)
+        .group_by(Trade.trade_id)
+        .cte("trade_totals")
+    )
+
+    exit_totals = (
+        select(
+            Exits.trade_id,
+            func.max(Exits.exit_date).label("exit_date"),
+        )
+        .join(Trade, Trade.trade_id == Exits.trade_id)
+        .where(*closed)
+        .group_by(Exits.trade_id)
+        .cte("exit_totals")
+    )
+
+    gross = (
+        select(
+            trade_totals.c.trade_id,
+            trade_totals.c.symbol,
+            trade_totals.c.initial_entry_date,
+            trade_totals.c.setup,
+            trade_totals.c.financial_year,
+            trade_totals.c.quantity,
+            trade_totals.c.entry_amount,
+            trade_totals.c.risked_amount,
+            trade_totals.c.charges,
+            trade_totals.c.risk_percentage,
+            round_decimals(
+                trade_totals.c.exit_amount - trade_totals.c.entry_amount
+            ).label("gross_pl"),
+            exit_totals.c.exit_date,
+        )
+        .join(exit_totals, exit_totals.c.trade_id == trade_totals.c.trade_id)
+        .cte("trade_gross").prefix_with("MATERIALIZED")
+    )
+
+    net = select(
+        gross,
+        round_decimals(gross.c.gross_pl - gross.c.charges).label("net_pl"),
+    ).cte("trade_net").prefix_with("MATERIALIZED")
+
+    multiples = select(
+        net,
+        round_decimals(net.c.net_pl / net.c.entry_amount * 100).label(
+            "net_pl_percentage"
+        ),
+        round_decimals(net.c.net_pl / net.c.risked_amount).label("gross_R"),
+    ).cte("trade_multiples").prefix_with("MATERIALIZED")
+
+    trade = select(
+        multiples,
+        round_decimals(multiples.c.risk_percentage * multiples.c.gross_R).label(
+            "net_R"
+        ),
+    ).cte("trade_stats")
+
+    exit_order = (trade.c.exit_date, trade.c.trade_id)
+    return select(
+        trade.c.trade_id,
+        trade.c.symbol,
+        type_coerce(trade.c.initial_entry_date, String).label("initial_entry_date"),
+        trade.c.setup,
+        trade.c.financial_year,
+        type_coerce(trade.c.exit_date, String).label("exit_date"),
+        trade.c.quantity,
+        trade.c.entry_amount,
+        trade.c.risked_amount,
+        trade.c.risk_percentage,
+        trade.c.charges,
+        trade.c.gross_pl,
+        trade.c.net_pl,
+        trade.c.net_pl_percentage,
+        trade.c.gross_R,
+        trade.c.net_R,
+        case((trade.c.net_pl > 0, 1), else_=0).label("win"),
+        cast(
+            func.julianday(trade.c.exit_date)
+            - func.julianday(trade.c.initial_entry_date),
+            Integer,
+        ).label("holding_days"),
+        func.sum(trade.c.net_pl).over(order_by=exit_order).label("cumulative_net_pl"),
+        func.sum(trade.c.net_R).over(order_by=exit_order).label("cumulative_net_R"),
+    ).order_by(trade.c.initial_entry_date, trade.c.trade_id)
+
+
+def get_trade_stats(financial_year="all", closed_after=None):
+    logging.debug(
+        f"get_trade_stats: Get Trade Stats for Financial Year: {financial_year}"
+    )
+    try:
+        return read_typed_frame(_trade_stats_query(financial_year, closed_after))
+    except Exception as e:
+        logging.error(f"Error fetching trade stats: {e}")
+        return None
+
+
+# Count and exact net amount (sell - buy - charges) of the closed trades of a
+# financial year, up to a last exit date if given. Reads trade_summary only.
+def get_closed_trade_totals(financial_year="all", closed_until=None):
+    closed = [Trade.trade_closed == "Y"]
+    if financial_year != "all" and financial_year is not None:
+        closed.append(Trade.financial_year == financial_year)
+    if closed_until is not None:
+        closed.append(TradeSummary.last_exit_date <= closed_until)
+    net_amount = func.sum(
+        type_coerce(TradeSummary.total_sell_amount, Integer)
+        - type_coerce(TradeSummary.total_buy_amount, Integer)
+        - type_coerce(TradeSummary.total_charges, Integer)
+    )
+    stmt = (
+        select(
+            func.count().label("trade_count"),
+            fixed_point_value(func.coalesce(net_amount, 0)).label("net_amount"),
+        )
+        .select_from(Trade)
+        .join(TradeSummary, TradeSummary.trade_id == Trade.trade_id)
+        .where(*closed)
+    )
     engine = get_engine()
     try:
-        if financial_year == "all" or financial_year is None:
-            stmt = select(Trade).where(Trade.trade_closed == "Y")
-        else:
-            stmt = (
-                select(Trade)
-                .where(Trade.financial_year == financial_year)
-                .where(Trade.trade_closed == "Y")
+        with engine.connect() as conn:
+            return conn.execute(stmt).one()._asdict()
+    except Exception as e:
+        logging.error(f"Error fetching closed trade totals: {e}")
+        return None
+
+
+def _export_statement(table, financial_year):
+    in_year = []
+    if financial_year != "all" and financial_year is not None:
+        in_year.append(Trade.financial_year == financial_year)
+
+    if table == "trades":
+        summary = [c for c in TradeSummary.__table__.columns if c.name != "trade_id"]
+        return (
+            select(
+                *_typed_columns(Trade, None),
+                *_typed_columns(TradeSummary, [c.name for c in summary]),
             )
-        trades = pd.read_sql(stmt, engine)
-        return trades
+            .outerjoin(TradeSummary, TradeSummary.trade_id == Trade.trade_id)
+            .where(*in_year)
+            .order_by(Trade.trade_id)
+        )
+    if table == "entries":
+        return (
+            select(Trade.symbol, *_typed_columns(Entry, None))
+            .join(Trade, Trade.trade_id == Entry.trade_id)
+            .where(*in_year)
+            .order_by(Entry.trade_id, Entry.entry_id)
+        )
+    if table == "exits":
+        return (
+            select(Trade.symbol, *_typed_columns(Exits, None))
+            .join(Trade, Trade.trade_id == Exits.trade_id)
+            .where(*in_year)
+            .order_by(Exits.trade_id, Exits.exit_id)
+        )
+    if table == "stats":
+        return _trade_stats_query(financial_year)
+    raise ValueError(f"Unknown export table: {table}")
+
+
+def _export_dtype(column):
+    if column.name in column_dtypes:
+        return column_dtypes[column.name]
+    if isinstance(column.type, (Float, FixedPoint)):
+        return "float64"
+    if isinstance(column.type, Integer):
+        return "int64"
+    return "object"
+
+
+export_tables = ["trades", "entries", "exits", "stats"]
+
+
+# Streams an export table through a cursor that is read export_rows at a time, so
+# memory stays flat however long the history. Trades, entries and exits cover open
+# and closed trades; stats are computed for closed trades only. The first item
+# yielded is the list of (column name, dtype) pairs, with dtypes as in
+# column_dtypes; each following item is a list of row tuples. Dates are ISO text.
+def stream_export(table, financial_year="all", chunk_rows=5000):
+    stmt = _export_statement(table, financial_year)
+    engine = get_engine()
+    with engine.connect() as conn:
+        result = conn.execution_options(
+            stream_results=True, yield_per=chunk_rows
+        ).execute(stmt)
+        yield [(c.name, _export_dtype(c)) for c in stmt.selected_columns]
+        for rows in result.partitions():
+            yield rows
+
+
+def get_trade_excursions(financial_year="all"):
+    try:
+        stmt = (
+            select(*_typed_columns(TradeExcursion, None))
+            .join(Trade)
+            .where(Trade.trade_closed == "Y")
+        )
+        if financial_year != "all" and financial_year is not None:
+            stmt = stmt.where(Trade.financial_year == financial_year)
+        return read_typed_frame(stmt)
     except Exception as e:
-        logging.error(f"Error fetching trades: {e}")
+        logging.error(f"Error fetching trade excursions: {e}")
+        return None
+
+
+def save_trade_excursions(excursions):
+    engine = get_engine()
+    try:
+        rows = excursions.assign(
+            initial_entry_date=excursions["initial_entry_date"].dt.date,
+            exit_date=excursions["exit_date"].dt.date,
+        )
+        rows = rows.astype(object).where(rows.notna(), None).to_dict("records")
+        with engine.begin() as conn:
+            if rows:
+                conn.execute(
+                    delete(TradeExcursion).where(
+                        TradeExcursion.trade_id == bindparam("b_trade_id")
+                    ),
+                    [{"b_trade_id": row["trade_id"]} for row in rows],
+                )
+                conn.execute(insert(TradeExcursion), rows)
+        return True
+    except Exception as e:
+        logging.error(f"Error saving trade excursions: {e}")
+        return False
+
+
+def get_equity_state(financial_year):
+    engine = get_engine()
+    try:
+        with engine.connect() as conn:
+            state = conn.execute(
+                select(EquityState).where(EquityState.financial_year == financial_year)
+            ).first()
+        return state._asdict() if state else None
+    except Exception as e:
+        logging.error(f"Error fetching equity state: {e}")
+        return None
+
+
+def get_equity_points(financial_year):
+    logging.debug(f"get_equity_points: Get Equity Curve for: {financial_year}")
+    try:
+        columns = [c.name for c in EquityPoint.__table__.columns]
+        columns.remove("financial_year")
+        stmt = (
+            select(*_typed_columns(EquityPoint, columns))
+            .where(EquityPoint.financial_year == financial_year)
+            .order_by(EquityPoint.date)
+        )
+        return read_typed_frame(stmt)
+    except Exception as e:
+        logging.error(f"Error fetching equity curve: {e}")
         return None
 
 
+# Appends points (or replaces the whole series) and the new state in one transaction
+def save_equity_points(financial_year, points, state, replace=False):
+    engine = get_engine()
+    try:
+        rows = []
+        if points is not None:
+            rows = points.assign(
+                financial_year=financial_year, date=points["date"].dt.date
+            ).to_dict("records")
+        with engine.begin() as conn:
+            if replace:
+                conn.execute(
+                    delete(EquityPoint).where(
+                        EquityPoint.financial_year == financial_year
+                    )
+                )
+            conn.execute(
+                delete(EquityState).where(EquityState.financial_year == financial_year)
+            )
+            if rows:
+                conn.execute(insert(EquityPoint), rows)
+            conn.execute(
+                insert(EquityState).values(financial_year=financial_year, **state)
+            )
+        return True
+    except Exception as e:
+        logging.error(f"Error saving equity curve for {financial_year}: {e}")
+        return False
+
+
+# Drops the cached curve of a financial year that no longer has closed trades
+def delete_equity_curve(financial_year):
+    engine = get_engine()
+    try:
+        with engine.begin() as conn:
+            conn.execute(
+                delete(EquityPoint).where(EquityPoint.financial_year == financial_year)
+            )
+            conn.execute(
+                delete(EquityState).where(EquityState.financial_year == financial_year)
+            )
+        return True
+    except Exception as e:
+        logging.error(f"Error deleting equity curve for {financial_year}: {e}")
+        return False
+
+
 def insert_test_data():
     logging.debug(f"Insert Test Data")
     session = get_session()
@@ -0,0 +1,150 @@
+import logging
+import numpy as np
+import pandas as pd
+
+from .db_interface import (
+    delete_equity_curve,
+    get_closed_trade_totals,
+    get_equity_points,
+    get_equity_state,
+    get_trade_stats,
+    get_write_generation,
+    save_equity_points,
+)
+
+
+initial_state = {
+    "net_pl_total": 0.0,
+    "cum_net_R": 0.0,
+    "peak": 0.0,
+    "peak_date": None,
+}
+
+
+# Builds the daily series for trades closed after the state's last date. The state
+# carries the running totals and the running peak, so a series can be extended
+# without replaying earlier days.
+def equity_points(trades, state=None):
+    state = state or initial_state
+    daily = (
+        trades.groupby("exit_date", sort=True)[["net_pl", "net_R"]].sum().round(2)
+    )
+    dates = daily.index.to_numpy()
+
+    cum_net_pl = (state["net_pl_total"] + daily["net_pl"].cumsum()).round(2)
+    cum_net_R = (state["cum_net_R"] + daily["net_R"].cumsum()).round(2)
+    peak = np.maximum.accumulate(np.maximum(cum_net_pl.to_numpy(), state["peak"]))
+
+    # The peak date is the last day equity stood at its running peak; before the
+    # first new high it is carried over from the state (or the first day).
+    first_peak_date = pd.Timestamp(state["peak_date"] or dates[0])
+    peak_dates = (
+        pd.Series(np.where(cum_net_pl.to_numpy() >= peak, dates, None))
+        .astype("datetime64[ns]")
+        .ffill()
+        .fillna(first_peak_date)
+    )
+
+    return pd.DataFrame(
+        {
+            "date": dates,
+            "net_pl": daily["net_pl"].to_numpy(),
+            "net_R": daily["net_R"].to_numpy(),
+            "cum_net_pl": cum_net_pl.to_numpy(),
+            "cum_net_R": cum_net_R.to_numpy(),
+            "peak": peak,
+            "drawdown": (cum_net_pl.to_numpy() - peak).round(2),
+            "drawdown_days": (dates - peak_dates.to_numpy())
+            .astype("timedelta64[D]")
+            .astype("int32"),
+        }
+    )
+
+
+def next_state(points, state=None):
+    state = state or initial_state
+    last = points.iloc[-1]
+    at_peak = points["drawdown"] == 0
+    peak_date = (
+        points.loc[at_peak, "date"].iloc[-1]
+        if at_peak.any()
+        else pd.Timestamp(state["peak_date"] or points["date"].iloc[0])
+    )
+    return {
+        "last_date": last["date"].date(),
+        "net_pl_total": float(last["cum_net_pl"]),
+        "cum_net_R": float(last["cum_net_R"]),
+        "peak": float(last["peak"]),
+        "peak_date": peak_date.date(),
+    }
+
+
+# Maximum drawdown, its longest duration and how long the deepest drawdown took to
+# recover from its trough (None while equity is still below that peak).
+def drawdown_summary(points):
+    if points.empty:
+        return None
+    trough = points["drawdown"].idxmin()
+    trough_peak = points.at[trough, "peak"]
+    recovered = points.index > trough
+    recovered &= points["cum_net_pl"] >= trough_peak
+    recovery_days = None
+    if points.at[trough, "drawdown"] < 0 and recovered.any():
+        recovery_date = points.loc[recovered, "date"].iloc[0]
+        recovery_days = (recovery_date - points.at[trough, "date"]).days
+    return {
+        "max_drawdown": float(points["drawdown"].min()),
+        "max_drawdown_date": points.at[trough, "date"].date(),
+        "max_drawdown_days": int(points["drawdown_days"].max()),
+        "recovery_days": recovery_days,
+    }
+
+
+def _rebuild(financial_year, trades, totals, generation):
+    if trades.empty:
+        delete_equity_curve(financial_year)
+        return trades.iloc[0:0]
+    points = equity_points(trades)
+    state = {**next_state(points), **totals, "generation": generation}
+    save_equity_points(financial_year, points, state, replace=True)
+    return points
+
+
+# Returns the cached daily equity curve for a financial year ("all" for every
+# year). Only trades closed after the stored last date are read to extend it. The
+# count and exact net amount of the trades up to that date are checked against
+# trade_summary first; any other change to the closed trades rebuilds the curve.
+def get_equity_curve(financial_year):
+    generation = get_write_generation()
+    state = get_equity_state(financial_year)
+    if state is not None and state["generation"] == generation:
+        return get_equity_points(financial_year)
+
+    # Read before the trades, so a write landing in between fails the next check
+    totals = get_closed_trade_totals(financial_year)
+    if totals is None:
+        return None
+    if state is not None:
+        earlier = get_closed_trade_totals(financial_year, state["last_date"])
+        if earlier != {key: state[key] for key in totals}:
+            logging.debug(f"Closed trades changed, rebuilding equity: {financial_year}")
+            state = None
+    if state is None:
+        trades = get_trade_stats(financial_year)
+        if trades is None:
+            return None
+        logging.debug(f"Building equity curve for {financial_year}")
+        return _rebuild(financial_year, trades, totals, generation)
+
+    state.pop("financial_year")
+    new_trades = get_trade_stats(financial_year, closed_after=state["last_date"])
+    if new_trades is None:
+        return None
+    points = None
+    if not new_trades.empty:
+        points = equity_points(new_trades, state)
+        state = {**state, **next_state(points, state)}
+        logging.debug(f"Extending equity curve {financial_year} by {len(points)} days")
+    state = {**state, **totals, "generation": generation}
+    save_equity_points(financial_year, points, state)
+    return get_equity_points(financial_year)
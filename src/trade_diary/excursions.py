@@ -0,0 +1,149 @@
+import logging
+import numpy as np
+import pandas as pd
+
+from .db_interface import get_trade_excursions, get_trade_stats, save_trade_excursions
+from .price_store import get_price_store
+
+
+excursion_columns = [
+    "trade_id",
+    "initial_entry_date",
+    "exit_date",
+    "avg_entry_price",
+    "risk_per_share",
+    "price_days",
+    "mae",
+    "mfe",
+    "mae_R",
+    "mfe_R",
+]
+
+# Day numbers stay below this until the year 2243, so symbol * _day_span + day is
+# a sort key that keeps every symbol's days together and in order
+_day_span = 100000
+
+
+def _day_numbers(dates):
+    return dates.to_numpy().astype("datetime64[D]").astype("int64")
+
+
+def _segment_reduce(ufunc, values, starts, ends):
+    # reduceat over interleaved (start, end) pairs reduces each [start, end) slice
+    # independently; the padding element keeps every end a valid index
+    padded = np.append(values, values[-1] if len(values) else 0)
+    bounds = np.column_stack([starts, ends]).ravel()
+    return ufunc.reduceat(padded, bounds)[::2]
+
+
+# Maximum adverse (lowest low) and favourable (highest high) excursion of each long
+# trade between its first entry and last exit, in price and in R. All trades are
+# located in one concatenated price array and reduced in a single pass.
+def compute_excursions(trades, store):
+    trades = trades.reset_index(drop=True)
+    symbols = trades["symbol"].astype(str).str.upper()
+    symbol_codes, symbol_names = pd.factorize(symbols)
+
+    lows, highs, keys = [], [], []
+    for code, symbol in enumerate(symbol_names):
+        prices = store.read(symbol, columns=["low", "high"])
+        lows.append(prices["low"].to_numpy())
+        highs.append(prices["high"].to_numpy())
+        keys.append(code * _day_span + _day_numbers(prices.index))
+    keys = np.concatenate(keys) if keys else np.empty(0, dtype="int64")
+    lows = np.concatenate(lows) if lows else np.empty(0)
+    highs = np.concatenate(highs) if highs else np.empty(0)
+
+    first_keys = symbol_codes * _day_span + _day_numbers(trades["initial_entry_date"])
+    last_keys = symbol_codes * _day_span + _day_numbers(trades["exit_date"])
+    starts = np.searchsorted(keys, first_keys, "left")
+    ends = np.searchsorted(keys, last_keys, "right")
+    price_days = ends - starts
+    priced = price_days > 0
+
+    lowest = np.where(priced, _segment_reduce(np.minimum, lows, starts, ends), np.nan)
+    highest = np.where(priced, _segment_reduce(np.maximum, highs, starts, ends), np.nan)
+
+    avg_entry_price = trades["entry_amount"] / trades["quantity"]
+    risk_per_share = trades["risked_amount"] / trades["quantity"]
+    mae = lowest - avg_entry_price
+    mfe = highest - avg_entry_price
+    risk = risk_per_share.where(risk_per_share > 0)
+
+    return pd.DataFrame(
+        {
+            "trade_id": trades["trade_id"],
+            "initial_entry_date": trades["initial_entry_date"],
+            "exit_date": trades["exit_date"],
+            "avg_entry_price": avg_entry_price.round(4),
+            "risk_per_share": risk_per_share.round(4),
+            "price_days": price_days.astype("int32"),
+            "mae": mae.round(4),
+            "mfe": mfe.round(4),
+            "mae_R": (mae / risk).round(2),
+            "mfe_R": (mfe / risk).round(2),
+        }
+    )[priced]
+
+
+# Number of stored price days between each trade's first entry and last exit. Only
+# the date files are read, so this is cheap next to computing the excursions.
+def price_coverage(trades, store):
+    symbols = trades["symbol"].astype(str).str.upper().to_numpy()
+    first_days = _day_numbers(trades["initial_entry_date"])
+    last_days = _day_numbers(trades["exit_date"])
+    coverage = np.zeros(len(trades), dtype="int64")
+    for symbol, rows in pd.Series(symbols).groupby(symbols).indices.items():
+        days = store.days(symbol)
+        coverage[rows] = np.searchsorted(days, last_days[rows], "right") - (
+            np.searchsorted(days, first_days[rows], "left")
+        )
+    return coverage
+
+
+# Returns MAE/MFE for the closed trades of a financial year. Cached rows are reused
+# while the trade's dates, average entry, risk and price coverage are unchanged, so
+# ingesting missing days recomputes the trades they fall in. The rest are computed
+# from the price store and saved. Trades without prices are left out.
+def get_excursions(financial_year="all", store=None):
+    trades = get_trade_stats(financial_year)
+    if trades is None or trades.empty:
+        return None
+
+    store = store or get_price_store()
+    cached = get_trade_excursions(financial_year)
+    if cached is None:
+        cached = pd.DataFrame(columns=excursion_columns)
+    current = trades[
+        ["trade_id", "initial_entry_date", "exit_date", "entry_amount", "risked_amount"]
+    ].assign(
+        avg_entry_price=(trades["entry_amount"] / trades["quantity"]).round(4),
+        risk_per_share=(trades["risked_amount"] / trades["quantity"]).round(4),
+        price_days=price_coverage(trades, store),
+    )
+    key = ["trade_id", "initial_entry_date", "exit_date"]
+    compared = current.merge(
+        cached[key + ["avg_entry_price", "risk_per_share", "price_days"]],
+        on=key,
+        how="left",
+        suffixes=("", "_cached"),
+    )
+    fresh = (
+        np.isclose(compared["avg_entry_price"], compared["avg_entry_price_cached"])
+        & np.isclose(compared["risk_per_share"], compared["risk_per_share_cached"])
+        & (compared["price_days"] == compared["price_days_cached"])
+    )
+    stale = ~fresh & (compared["price_days"] > 0)
+    stale = trades[trades["trade_id"].isin(compared.loc[stale, "trade_id"])]
+
+    excursions = cached[cached["trade_id"].isin(compared.loc[fresh, "trade_id"])]
+    if not stale.empty:
+        computed = compute_excursions(stale, store)
+        logging.debug(f"Computed excursions for {len(computed)} of {len(stale)} trades")
+        if not computed.empty:
+            save_trade_excursions(computed)
+            excursions = pd.concat([excursions, computed], ignore_index=True)
+
+    return excursions.merge(
+        trades[["trade_id", "symbol", "setup", "financial_year"]], on="trade_id"
+    )
@@ -0,0 +1,148 @@
+import csv
+import importlib.util
+import io
+import os
+import tempfile
+from datetime import date
+
+from .db_interface import export_tables, stream_export
+
+
+# Each writer takes the stream from stream_export and yields the encoded file a
+# piece at a time, so a download can start before the last row is read.
+
+
+def write_csv(stream):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([name for name, _ in next(stream)])
+    for rows in stream:
+        writer.writerows(rows)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue().encode()
+
+
+# Collects what pyarrow writes so it can be handed on after every row group.
+# Parquet is written front to back, so nothing is ever seeked back to.
+class _Drain(io.RawIOBase):
+    def __init__(self):
+        self.parts = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def take(self):
+        data = b"".join(self.parts)
+        self.parts = []
+        return data
+
+
+def _arrow_type(pa, dtype):
+    if dtype.startswith("datetime64"):
+        return pa.date32()
+    if dtype.startswith("int"):
+        return pa.int64()
+    if dtype.startswith("float"):
+        return pa.float64()
+    return pa.string()
+
+
+# One row group per chunk read from the database
+def write_parquet(stream):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    columns = next(stream)
+    schema = pa.schema([(name, _arrow_type(pa, dtype)) for name, dtype in columns])
+    sink = _Drain()
+    with pq.ParquetWriter(sink, schema, compression="snappy") as writer:
+        for rows in stream:
+            arrays = [
+                pa.array(values, pa.string()).cast(field.type)
+                if field.type == pa.date32()
+                else pa.array(values, field.type)
+                for field, values in zip(schema, zip(*rows))
+            ]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+            yield sink.take()
+    yield sink.take()
+
+
+# openpyxl's write-only mode keeps memory flat, but the workbook is a zip that is
+# only complete once saved, so it is built in a temporary file and then streamed.
+def write_xlsx(stream, sheet_name="Export", block_size=1024 * 1024):
+    from openpyxl import Workbook
+
+    columns = next(stream)
+    dates = [
+        i for i, (_, dtype) in enumerate(columns) if dtype.startswith("datetime64")
+    ]
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(sheet_name)
+    sheet.append([name for name, _ in columns])
+    for rows in stream:
+        for row in rows:
+            row = list(row)
+            for i in dates:
+                if row[i] is not None:
+                    row[i] = date.fromisoformat(row[i])
+            sheet.append(row)
+
+    fd, path = tempfile.mkstemp(suffix=".xlsx")
+    os.close(fd)
+    try:
+        workbook.save(path)
+        with open(path, "rb") as f:
+            while block := f.read(block_size):
+                yield block
+    finally:
+        os.remove(path)
+
+
+export_formats = {
+    "csv": (write_csv, "text/csv"),
+    "parquet": (write_parquet, "application/vnd.apache.parquet"),
+    "xlsx": (
+        write_xlsx,
+        "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    ),
+}
+
+
+# Parquet needs pyarrow, which is optional
+def available_formats():
+    return [
+        name
+        for name in export_formats
+        if name != "parquet" or importlib.util.find_spec("pyarrow") is not None
+    ]
+
+
+def export_file_name(table, file_format, financial_year="all"):
+    year = "all" if financial_year in (None, "all") else financial_year
+    return f"trade_diary_{table}_{year}.{file_format}"
+
+
+# Yields the bytes of table exported in file_format. Raises ValueError for an
+# unknown table or a format that is not available, before anything is read.
+def export_table(table, file_format, financial_year="all", chunk_rows=5000):
+    if table not in export_tables:
+        raise ValueError(f"Unknown export table: {table}")
+    if file_format not in available_formats():
+        raise ValueError(f"Export format not available: {file_format}")
+    writer = export_formats[file_format][0]
+    stream = stream_export(table, financial_year, chunk_rows)
+    if file_format == "xlsx":
+        return writer(stream, sheet_name=table)
+    return writer(stream)
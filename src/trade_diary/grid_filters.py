@@ -0,0 +1,146 @@
+import logging
+from datetime import datetime
+
+from sqlalchemy import and_, func, or_
+
+
+GRID_DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def _parse_grid_date(value):
+    if not value:
+        return None
+    return datetime.strptime(value, GRID_DATE_FORMAT).date()
+
+
+def _blank(col, filter_type):
+    if filter_type == "text":
+        return or_(col.is_(None), col == "")
+    return col.is_(None)
+
+
+def _text_condition(col, condition):
+    op = condition.get("type")
+    value = condition.get("filter")
+    if op == "blank":
+        return _blank(col, "text")
+    if op == "notBlank":
+        return ~_blank(col, "text")
+    if value is None:
+        return None
+
+    value = str(value)
+    if op == "equals":
+        return func.lower(col) == value.lower()
+    if op == "notEqual":
+        return func.lower(col) != value.lower()
+    if op == "contains":
+        return col.icontains(value, autoescape=True)
+    if op == "notContains":
+        return ~col.icontains(value, autoescape=True)
+    if op == "startsWith":
+        return col.istartswith(value, autoescape=True)
+    if op == "endsWith":
+        return col.iendswith(value, autoescape=True)
+    return None
+
+
+def _range_condition(col, op, value, value_to):
+    if op == "equals":
+        return col == value
+    if op == "notEqual":
+        return col != value
+    if op == "lessThan":
+        return col < value
+    if op == "lessThanOrEqual":
+        return col <= value
+    if op == "greaterThan":
+        return col > value
+    if op == "greaterThanOrEqual":
+        return col >= value
+    if op == "inRange":
+        if value_to is None:
+            return col >= value
+        return col.between(value, value_to)
+    return None
+
+
+def _number_condition(col, condition):
+    op = condition.get("type")
+    if op == "blank":
+        return _blank(col, "number")
+    if op == "notBlank":
+        return ~_blank(col, "number")
+    value = condition.get("filter")
+    if value is None:
+        return None
+    return _range_condition(col, op, value, condition.get("filterTo"))
+
+
+def _date_condition(col, condition):
+    op = condition.get("type")
+    if op == "blank":
+        return _blank(col, "date")
+    if op == "notBlank":
+        return ~_blank(col, "date")
+    value = _parse_grid_date(condition.get("dateFrom"))
+    if value is None:
+        return None
+    return _range_condition(col, op, value, _parse_grid_date(condition.get("dateTo")))
+
+
+def _set_condition(col, condition):
+    values = condition.get("values")
+    if values is None:
+        return None
+    not_null = [v for v in values if v is not None]
+    predicate = col.in_(not_null)
+    if len(not_null) != len(values):
+        predicate = or_(predicate, col.is_(None))
+    return predicate
+
+
+condition_compilers = {
+    "text": _text_condition,
+    "number": _number_condition,
+    "date": _date_condition,
+    "set": _set_condition,
+}
+
+
+def _compile_column_filter(col, column_filter):
+    filter_type = column_filter.get("filterType")
+    compiler = condition_compilers.get(filter_type)
+    if compiler is None:
+        raise ValueError(f"Unsupported filter type: {filter_type}")
+
+    if "conditions" in column_filter:
+        predicates = [compiler(col, c) for c in column_filter["conditions"]]
+        predicates = [p for p in predicates if p is not None]
+        if not predicates:
+            return None
+        if column_filter.get("operator") == "OR":
+            return or_(*predicates)
+        return and_(*predicates)
+
+    return compiler(col, column_filter)
+
+
+# columns maps grid field names to the SQL expressions that produce them
+def compile_filter_model(filter_model, columns):
+    predicates = {}
+    for col_id, column_filter in (filter_model or {}).items():
+        col = columns.get(col_id)
+        if col is None:
+            logging.warning(f"Ignoring filter on unknown column: {col_id}")
+            continue
+        try:
+            predicate = _compile_column_filter(col, column_filter)
+        except ValueError as e:
+            logging.warning(f"Ignoring filter on {col_id}: {e}")
+            continue
+        if predicate is not None:
+            predicates[col_id] = predicate
+        else:
+            logging.warning(f"Ignoring incomplete filter on {col_id}: {column_filter}")
+    return predicates
@@ -0,0 +1,500 @@
+import base64
+import difflib
+import itertools
+import logging
+import os
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import src.trade_diary.config as config
+from .db_interface import bulk_import_batched, import_staged_rows, new_import_rows
+
+
+to_match_names = [
+    ("symbol", ["symbol", "stock", "name", "scrip"]),
+    ("setup", ["setup", "strategy"]),
+    ("entry_date", ["buy date", "purchase date", "entry date"]),
+    ("entry_price", ["entry price", "buy price"]),
+    ("entry_type", ["entry type", "buy type", "entry"]),
+    (
+        "quantity",
+        ["quantity", "qty", "no of shares", "entry quantity", "entry qty"],
+    ),
+    ("risk_percentage", ["risk percentage", "risk", "risk %"]),
+    ("stop_loss", ["stop loss", "sl"]),
+    ("exit_date", ["sell date", "exit date"]),
+    ("exit_price", ["exit price", "sell price"]),
+    # ('exit_quantity' , ['exit quantity','sell quantity']),
+]
+not_necessary_fields = ["entry_type"]
+required_fields = [
+    "symbol",
+    "setup",
+    "entry_date",
+    "entry_price",
+    "quantity",
+    "risk_percentage",
+    "stop_loss",
+]
+date_fields = ["entry_date", "exit_date"]
+supported_suffixes = (".csv", ".xlsx", ".xls")
+numeric_fields = [
+    "entry_price",
+    "quantity",
+    "risk_percentage",
+    "stop_loss",
+    "exit_price",
+]
+
+
+# Fields that identify a tradebook row for re-imports: its entry. Setup, stop loss
+# and risk are notes on a trade rather than part of it, so correcting them does not
+# make a row new. The exit is hashed apart, so a row that was open when first
+# imported is recognised once it closes.
+tradebook_hash_fields = ["symbol", "entry_date", "entry_price", "quantity"]
+tradebook_exit_fields = ["exit_date", "exit_price"]
+fill_hash_fields = ["symbol", "timestamp", "sign", "quantity", "price"]
+
+
+# Raw broker fills: one row per executed buy or sell
+fill_match_names = [
+    ("symbol", ["symbol", "stock", "scrip", "tradingsymbol"]),
+    (
+        "timestamp",
+        [
+            "order_execution_time",
+            "execution time",
+            "trade time",
+            "timestamp",
+            "trade_date",
+            "trade date",
+            "date",
+        ],
+    ),
+    ("side", ["trade_type", "trade type", "side", "buy/sell", "transaction type"]),
+    ("quantity", ["quantity", "qty", "filled quantity"]),
+    ("price", ["price", "trade price", "average price", "rate"]),
+    ("setup", ["setup", "strategy"]),
+    ("stop_loss", ["stop loss", "sl"]),
+    ("risk_percentage", ["risk percentage", "risk", "risk %"]),
+]
+optional_fill_fields = ["setup"]
+fill_sides = {"buy": 1, "b": 1, "sell": -1, "s": -1}
+# Fills carry no setup unless the file adds one
+default_fill_setup = "Untagged"
+
+
+def get_mappings(df_columns, names=None, optional=None):
+    cols = df_columns
+    names = names or to_match_names
+    optional = not_necessary_fields if optional is None else optional
+    fields_to_col_mapping = []
+    for key, possible_names in names:
+        for possible_name in possible_names:
+            match = difflib.get_close_matches(possible_name, cols, n=1, cutoff=0.9)
+            if match:
+                fields_to_col_mapping.append((key, match[0]))
+                break
+
+    matched = [x[0] for x in fields_to_col_mapping]
+    not_matched_fields = [x[0] for x in names if x[0] not in matched]
+    not_matched_fields = set(not_matched_fields).difference(set(optional))
+    return fields_to_col_mapping, not_matched_fields
+
+
+# Decodes a dcc.Upload payload into a temporary file a slice at a time, so the
+# decoded file is never held in memory next to its base64 text. The caller
+# removes the file.
+def save_upload(contents, file_name, slice_chars=4 * 1024 * 1024):
+    start = contents.index(",") + 1
+    fd, path = tempfile.mkstemp(suffix=Path(file_name).suffix.lower())
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for i in range(start, len(contents), slice_chars):
+                f.write(base64.b64decode(contents[i : i + slice_chars]))
+    except Exception:
+        os.remove(path)
+        raise
+    return Path(path)
+
+
+def _xlsx_chunks(path, chunk_rows):
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = ["" if c is None else str(c) for c in header]
+        batch = []
+        for row in rows:
+            if all(value is None for value in row):
+                continue
+            batch.append(row[: len(columns)])
+            if len(batch) == chunk_rows:
+                yield pd.DataFrame(batch, columns=columns)
+                batch = []
+        if batch:
+            yield pd.DataFrame(batch, columns=columns)
+    finally:
+        workbook.close()
+
+
+# Yields the rows of a tradebook chunk_rows at a time. CSV is read by pandas in
+# chunks and XLSX through openpyxl's read-only row stream; legacy .xls has no
+# streaming reader and is loaded whole.
+def read_chunks(path, chunk_rows):
+    suffix = Path(path).suffix.lower()
+    if suffix == ".csv":
+        with pd.read_csv(path, chunksize=chunk_rows, dtype=str) as reader:
+            yield from reader
+    elif suffix == ".xlsx":
+        yield from _xlsx_chunks(path, chunk_rows)
+    elif suffix == ".xls":
+        frame = pd.read_excel(path)
+        for i in range(0, len(frame), chunk_rows):
+            yield frame.iloc[i : i + chunk_rows]
+    else:
+        raise ValueError("File type not supported")
+
+
+def _hash_values(series):
+    if pd.api.types.is_numeric_dtype(series):
+        scaled = (series.to_numpy(dtype=float) * 10000).round()
+        return np.where(np.isnan(scaled), np.iinfo("int64").min, scaled).astype("int64")
+    if pd.api.types.is_datetime64_any_dtype(series) or series.name in date_fields:
+        return pd.to_datetime(series).to_numpy("datetime64[ns]").view("int64")
+    text = series.astype(object).where(series.notna(), "").astype(str)
+    return text.str.strip().str.upper().to_numpy()
+
+
+# Stable 64-bit content hash of each row from the parsed values of fields, so the
+# same row hashes alike whatever its column names, order or date format. Prices
+# are compared at the stored four decimals.
+def row_hashes(frame, fields, mode):
+    values = pd.DataFrame(
+        {
+            field: _hash_values(frame[field]) if field in frame.columns else ""
+            for field in fields
+        },
+        index=frame.index,
+    ).assign(mode=mode)
+    return pd.util.hash_pandas_object(values, index=False).to_numpy().view("int64")
+
+
+def _rows(row_no, mask, limit=5):
+    rows = row_no[mask].tolist()
+    shown = ", ".join(str(r) for r in rows[:limit])
+    return f"(rows {shown}{', ...' if len(rows) > limit else ''})"
+
+
+# Maps, validates and converts one chunk to the staging layout. row_no numbers the
+# rows as they appear in the file, with the header on row 1.
+def normalize_chunk(chunk, mapping, date_format, first_row):
+    chunk = chunk.rename(columns=lambda x: str(x).lower())
+    frame = chunk.rename(columns={col: field for field, col in mapping})[
+        [field for field, _ in mapping]
+    ].reset_index(drop=True)
+    row_no = pd.Series(range(first_row, first_row + len(frame)))
+
+    errors = []
+    for col in required_fields:
+        missing = frame[col].isna()
+        if missing.any():
+            errors.append(f"Column {col} contains NaN values {_rows(row_no, missing)}")
+
+    for col in date_fields:
+        parsed = pd.to_datetime(frame[col], format=date_format, errors="coerce")
+        invalid = parsed.isna() & frame[col].notna()
+        if invalid.any():
+            errors.append(
+                f"Error converting date columns {col} {_rows(row_no, invalid)}"
+            )
+        frame[col] = parsed.dt.date.astype(object).where(parsed.notna(), None)
+
+    for col in numeric_fields:
+        parsed = pd.to_numeric(frame[col], errors="coerce")
+        invalid = parsed.isna() & frame[col].notna()
+        if col == "quantity":
+            invalid |= parsed.notna() & (parsed % 1 != 0)
+        if invalid.any():
+            errors.append(
+                f"Error converting price columns {col} {_rows(row_no, invalid)}"
+            )
+        frame[col] = parsed
+
+    if errors:
+        raise ValueError("\n".join(errors))
+    frame["quantity"] = frame["quantity"].astype("int64")
+    return frame.assign(
+        row_no=row_no,
+        row_hash=row_hashes(frame, tradebook_hash_fields, "trades"),
+        exit_hash=row_hashes(frame, tradebook_exit_fields, "exit"),
+    )
+
+
+# Imports a broker tradebook without loading it whole: chunks are validated and
+# staged one at a time, then grouped into trades in SQL. Rows with the same symbol
+# and entry date form one trade; rows already imported from any file are skipped.
+# progress is passed on to import_staged_rows. Raises ValueError with a message
+# for the user when the file cannot be imported; nothing is written in that case.
+def import_tradebook(
+    path,
+    date_format,
+    chunk_rows=None,
+    batch_size=None,
+    progress=None,
+    file_name=None,
+):
+    chunks = read_chunks(path, chunk_rows or config.IMPORT_CHUNK_ROWS)
+    first = next(chunks, None)
+    if first is None:
+        raise ValueError("File has no rows")
+
+    fields_to_col_mapping, not_matched_fields = get_mappings(
+        [str(c).lower() for c in first.columns]
+    )
+    if not_matched_fields:
+        raise ValueError(f"Unmatched fields: {', '.join(not_matched_fields)}")
+    logging.info(f"Fields to Column Mapping: {fields_to_col_mapping}")
+
+    def normalized():
+        row_no = 2
+        for chunk in itertools.chain([first], chunks):
+            yield normalize_chunk(chunk, fields_to_col_mapping, date_format, row_no)
+            row_no += len(chunk)
+
+    return import_staged_rows(
+        normalized(),
+        batch_size or config.IMPORT_TRADE_BATCH,
+        progress,
+        file_name or Path(path).name,
+    )
+
+
+def _parse_timestamps(values, date_format):
+    parsed = pd.Series(pd.NaT, index=values.index, dtype="datetime64[ns]")
+    for fmt in (f"{date_format}T%H:%M:%S", f"{date_format} %H:%M:%S", date_format):
+        missing = parsed.isna()
+        if not missing.any():
+            break
+        parsed[missing] = pd.to_datetime(values[missing], format=fmt, errors="coerce")
+    return parsed
+
+
+def normalize_fills(frame, mapping, date_format):
+    frame = frame.rename(columns=lambda x: str(x).lower())
+    fills = frame.rename(columns={col: field for field, col in mapping})[
+        [field for field, _ in mapping]
+    ].reset_index(drop=True)
+    row_no = pd.Series(range(2, len(fills) + 2))
+
+    errors = []
+    for col in ("symbol", "timestamp", "side", "quantity", "price"):
+        missing = fills[col].isna()
+        if missing.any():
+            errors.append(f"Column {col} contains NaN values {_rows(row_no, missing)}")
+
+    timestamps = _parse_timestamps(fills["timestamp"].astype(str), date_format)
+    invalid = timestamps.isna() & fills["timestamp"].notna()
+    if invalid.any():
+        errors.append(f"Error converting timestamps {_rows(row_no, invalid)}")
+    fills["timestamp"] = timestamps
+
+    sign = fills["side"].astype(str).str.strip().str.lower().map(fill_sides)
+    invalid = sign.isna() & fills["side"].notna()
+    if invalid.any():
+        errors.append(f"Side must be buy or sell {_rows(row_no, invalid)}")
+    fills["sign"] = sign
+
+    # R multiples need a stop loss and risk on every buy; sells may leave them blank
+    for col in ("stop_loss", "risk_percentage"):
+        missing = fills[col].isna() & (sign == 1)
+        if missing.any():
+            errors.append(f"Column {col} is empty for buys {_rows(row_no, missing)}")
+
+    for col in ("quantity", "price", "stop_loss", "risk_percentage"):
+        parsed = pd.to_numeric(fills[col], errors="coerce")
+        invalid = parsed.isna() & fills[col].notna()
+        if col == "quantity":
+            invalid |= parsed.notna() & ((parsed % 1 != 0) | (parsed <= 0))
+        if invalid.any():
+            errors.append(f"Error converting {col} {_rows(row_no, invalid)}")
+        fills[col] = parsed
+
+    if errors:
+        raise ValueError("\n".join(errors))
+    return fills.assign(
+        row_no=row_no,
+        symbol=fills["symbol"].astype(str).str.strip(),
+        quantity=fills["quantity"].astype("int64"),
+    )
+
+
+# Numbers the trades in fills with a running position per symbol: a buy from a
+# flat position opens a trade, later buys pyramid into it and sells exit it until
+# the position is flat again. Returns the fills in time order per symbol with
+# signed quantity, opens and trade_key columns.
+def assign_trade_keys(fills):
+    fills = fills.sort_values(["symbol", "timestamp"], kind="stable")
+    fills = fills.reset_index(drop=True)
+    signed = fills["quantity"].to_numpy() * fills["sign"].to_numpy().astype("int64")
+    position = pd.Series(signed).groupby(fills["symbol"].to_numpy()).cumsum()
+    position = position.to_numpy()
+
+    short = position < 0
+    if short.any():
+        # Only the first fill that overdraws each symbol is worth reporting
+        first_short = fills[short].drop_duplicates("symbol")
+        details = ", ".join(
+            f"{symbol} on {ts:%Y-%m-%d} (row {row})"
+            for symbol, ts, row in zip(
+                first_short["symbol"],
+                first_short["timestamp"],
+                first_short["row_no"],
+            )
+        )
+        raise ValueError(f"Sells exceed the open position: {details}")
+
+    opens = (signed > 0) & (position == signed)
+    return fills.assign(signed=signed, opens=opens, trade_key=np.cumsum(opens) - 1)
+
+
+# Groups keyed fills into one entry or exit per trade and day at the
+# volume-weighted price. Returns trades, entries and exits in the layout
+# bulk_import expects, ordered by trade_key.
+def _group_trades(fills):
+    signed = fills["signed"].to_numpy()
+    fills = fills.assign(
+        day=fills["timestamp"].dt.normalize(),
+        amount=fills["quantity"] * fills["price"],
+    )
+
+    buys = fills[signed > 0]
+    trades = buys[buys["opens"]].reindex(
+        columns=["trade_key", "symbol", "setup"]
+    )
+    trades["setup"] = trades["setup"].fillna(default_fill_setup)
+
+    entry_columns = ["trade_key", "day", "quantity", "amount"]
+    entries = buys.reindex(
+        columns=entry_columns + ["stop_loss", "risk_percentage"]
+    ).groupby(["trade_key", "day"], sort=True, as_index=False).agg(
+        quantity=("quantity", "sum"),
+        amount=("amount", "sum"),
+        stop_loss=("stop_loss", "first"),
+        risk_percentage=("risk_percentage", "max"),
+    )
+    entries = pd.DataFrame(
+        {
+            "trade_key": entries["trade_key"],
+            "entry_date": entries["day"],
+            "entry_price": (entries["amount"] / entries["quantity"]).round(4),
+            "quantity": entries["quantity"],
+            "risk_percentage": entries["risk_percentage"] * 100,
+            "stop_loss": entries["stop_loss"],
+        }
+    )
+
+    exits = (
+        fills[signed < 0]
+        .groupby(["trade_key", "day"], sort=True, as_index=False)
+        .agg(quantity=("quantity", "sum"), amount=("amount", "sum"))
+    )
+    exits = pd.DataFrame(
+        {
+            "trade_key": exits["trade_key"],
+            "exit_date": exits["day"],
+            "exit_price": (exits["amount"] / exits["quantity"]).round(4),
+            "quantity": exits["quantity"],
+        }
+    )
+    return trades.reset_index(drop=True), entries, exits
+
+
+def reconstruct_trades(fills):
+    return _group_trades(assign_trade_keys(fills))
+
+
+def read_frame(path):
+    chunks = list(read_chunks(path, config.IMPORT_CHUNK_ROWS))
+    if not chunks:
+        raise ValueError("File has no rows")
+    return pd.concat(chunks, ignore_index=True)
+
+
+# Imports a flat list of broker fills (symbol, timestamp, side, quantity, price).
+# The running position needs every fill of a symbol in time order, so the file is
+# read whole; at five narrow columns that stays small next to a paired tradebook.
+# Trades whose fills were all imported before are skipped. A trade that adds new
+# fills to one imported earlier cannot be extended here and fails the import.
+def import_fills(path, date_format, batch_size=None, progress=None, file_name=None):
+    frame = read_frame(path)
+    fields_to_col_mapping, not_matched_fields = get_mappings(
+        [str(c).lower() for c in frame.columns],
+        fill_match_names,
+        optional_fill_fields,
+    )
+    if not_matched_fields:
+        raise ValueError(f"Unmatched fields: {', '.join(not_matched_fields)}")
+    logging.info(f"Fields to Column Mapping: {fields_to_col_mapping}")
+
+    fills = normalize_fills(frame, fields_to_col_mapping, date_format)
+    del frame
+    if progress:
+        progress(stage="staging", rows=len(fills))
+
+    fills["row_hash"] = row_hashes(fills, fill_hash_fields, "fills")
+    fills["occurrence"] = fills.groupby("row_hash").cumcount()
+    row_hashes_df = fills[["row_no", "row_hash", "occurrence"]]
+    fills["new"] = fills["row_no"].isin(new_import_rows(row_hashes_df))
+
+    fills = assign_trade_keys(fills)
+    new_fills = fills.groupby("trade_key")["new"].agg(["all", "any"])
+    extended = new_fills.index[new_fills["any"] & ~new_fills["all"]]
+    if len(extended):
+        opened = fills[fills["opens"] & fills["trade_key"].isin(extended)]
+        details = ", ".join(
+            f"{symbol} opened {ts:%Y-%m-%d}"
+            for symbol, ts in zip(opened["symbol"][:5], opened["timestamp"][:5])
+        )
+        raise ValueError(
+            f"New fills continue {len(extended)} trade(s) imported before "
+            f"({details}{', ...' if len(extended) > 5 else ''}). "
+            "Add them to those trades on the Trades page instead."
+        )
+
+    fills = fills[fills["new"]]
+    trades, entries, exits = _group_trades(fills)
+    skipped = int((~new_fills["any"]).sum())
+    logging.info(
+        f"Reconstructed {len(trades)} trades, {len(entries)} entries and "
+        f"{len(exits)} exits from {len(fills)} new fills, skipped {skipped} trades "
+        "imported before"
+    )
+    result = bulk_import_batched(
+        trades,
+        entries,
+        exits,
+        batch_size or config.IMPORT_TRADE_BATCH,
+        progress,
+        import_batch={
+            "file_name": file_name or Path(path).name,
+            "mode": "fills",
+            "rows": len(row_hashes_df),
+            "row_hashes": fills[["row_hash", "occurrence"]],
+        },
+    )
+    return {
+        "rows": len(row_hashes_df),
+        "skipped": len(row_hashes_df) - len(fills),
+        **result,
+    }
+
+
+import_modes = {"trades": import_tradebook, "fills": import_fills}
@@ -0,0 +1,145 @@
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from .db_interface import (
+    create_import_job,
+    fail_interrupted_import_jobs,
+    get_import_job,
+    update_import_job,
+)
+from .importer import import_modes
+
+
+class ImportCancelled(Exception):
+    pass
+
+
+# Runs tradebook imports on a worker thread so the upload callback returns at once.
+# SQLite has a single writer, so one worker runs the jobs in submission order.
+# Progress lives in memory while a job runs (the import transaction holds the
+# write lock until it commits) and the final outcome is recorded in import_jobs.
+class ImportJobRunner:
+    def __init__(self, max_workers=1):
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="import-job"
+        )
+        self._lock = threading.Lock()
+        self._progress = {}
+        self._cancel = {}
+
+    def submit(self, path, file_name, date_format, mode="trades"):
+        job_id = create_import_job(file_name)
+        with self._lock:
+            self._progress[job_id] = {
+                "stage": "queued",
+                "rows": 0,
+                "trades": 0,
+                "exits": 0,
+                "skipped": 0,
+                "total_trades": None,
+            }
+            self._cancel[job_id] = threading.Event()
+        self._executor.submit(
+            self._run, job_id, path, file_name, date_format, import_modes[mode]
+        )
+        logging.info(f"Queued {mode} import job {job_id} for {file_name}")
+        return job_id
+
+    def cancel(self, job_id):
+        with self._lock:
+            event = self._cancel.get(job_id)
+        if event is None:
+            return False
+        event.set()
+        logging.info(f"Cancellation requested for import job {job_id}")
+        return True
+
+    def _report(self, job_id, cancel, **counts):
+        with self._lock:
+            self._progress[job_id].update(counts)
+        if cancel.is_set():
+            raise ImportCancelled(f"Import job {job_id} cancelled")
+
+    def _run(self, job_id, path, file_name, date_format, import_file):
+        cancel = self._cancel[job_id]
+        result = None
+        try:
+            if cancel.is_set():
+                raise ImportCancelled(f"Import job {job_id} cancelled")
+            update_import_job(job_id, status="running", started_on=datetime.now())
+            result = import_file(
+                path,
+                date_format,
+                progress=lambda **counts: self._report(job_id, cancel, **counts),
+                file_name=file_name,
+            )
+            status = "completed"
+            message = f"File uploaded successfully! {result['trades']} trades inserted."
+            if result["skipped"]:
+                message += f" {result['skipped']} rows imported before were skipped."
+            if result["exits"] == 0:
+                logging.warning("No Closed trade found.")
+        except ImportCancelled:
+            status = "cancelled"
+            message = "Import cancelled, no trades were imported."
+        except ValueError as e:
+            status = "failed"
+            message = str(e)
+        except Exception as e:
+            logging.error(f"Error in import job {job_id}: {e}")
+            status = "failed"
+            message = (
+                "Error inserting trades, no trades were imported. "
+                "Check the logs for details."
+            )
+        finally:
+            path.unlink(missing_ok=True)
+
+        with self._lock:
+            progress = self._progress[job_id]
+        counts = result or {
+            "rows": progress["rows"],
+            "trades": 0,
+            "exits": 0,
+            "skipped": 0,
+        }
+        try:
+            update_import_job(
+                job_id,
+                status=status,
+                message=message,
+                finished_on=datetime.now(),
+                **counts,
+            )
+        finally:
+            with self._lock:
+                self._progress.pop(job_id)
+                self._cancel.pop(job_id)
+        logging.info(f"Import job {job_id} {status}: {message}")
+
+    # The job's row, with live progress while it is queued or running here
+    def status(self, job_id):
+        job = get_import_job(job_id)
+        if job is None:
+            return None
+        with self._lock:
+            progress = self._progress.get(job_id)
+            if progress is not None:
+                job = {**job, **progress}
+        return job
+
+
+_runner = None
+_runner_lock = threading.Lock()
+
+
+def get_import_runner():
+    global _runner
+    with _runner_lock:
+        if _runner is None:
+            fail_interrupted_import_jobs(os.getpid())
+            _runner = ImportJobRunner()
+    return _runner
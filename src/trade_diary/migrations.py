@@ -0,0 +1,193 @@
+import logging
+from datetime import datetime
+
+from sqlalchemy import delete, func, insert, inspect, select
+
+from .db_interface import (
+    Entry,
+    EquityPoint,
+    EquityState,
+    Exits,
+    ImportBatch,
+    ImportedRow,
+    ImportJob,
+    SchemaVersion,
+    Trade,
+    TradeExcursion,
+    TradeSummary,
+    WriteGeneration,
+    _rebuild_trade_summary,
+)
+
+
+# Migrations are applied in order, each in its own transaction, and recorded in
+# schema_version. Fresh databases get the current schema from create_all and then
+# run every migration, so each one must be safe on a database that already has it.
+
+
+def create_indexes(conn, table):
+    for index in table.indexes:
+        index.create(conn, checkfirst=True)
+
+
+def add_query_indexes(conn):
+    for model in (Trade, Entry, Exits):
+        create_indexes(conn, model.__table__)
+
+
+def add_trade_summary(conn):
+    TradeSummary.__table__.create(conn, checkfirst=True)
+    _rebuild_trade_summary(conn)
+
+
+fixed_point_columns = {
+    "entries": {
+        "entry_price": 4,
+        "risk_percentage": 2,
+        "stop_loss": 4,
+        "exit_amount": 4,
+        "charges": 4,
+    },
+    "exits": {"exit_price": 4},
+}
+
+
+# SQLite cannot change a column's declared type, so the table is copied into one
+# created from the current model. select_columns maps each column to the SQL that
+# fills it from the old table.
+def rebuild_table(conn, table, select_columns):
+    old_name = f"{table.name}_old"
+    for index in table.indexes:
+        conn.exec_driver_sql(f"DROP INDEX IF EXISTS {index.name}")
+    conn.exec_driver_sql(f"ALTER TABLE {table.name} RENAME TO {old_name}")
+    table.create(conn)
+    conn.exec_driver_sql(
+        f"INSERT INTO {table.name} ({', '.join(select_columns)}) "
+        f"SELECT {', '.join(select_columns.values())} FROM {old_name}"
+    )
+    conn.exec_driver_sql(f"DROP TABLE {old_name}")
+
+
+# Scales the stored values to integers and gives the columns the model's INTEGER
+# type. The declared type marks a converted table, so running this again, e.g.
+# after schema_version was lost, does not scale the values a second time.
+def convert_to_fixed_point(conn):
+    for model in (Entry, Exits):
+        table = model.__table__
+        digits = fixed_point_columns[table.name]
+        declared = {
+            c["name"]: str(c["type"]) for c in inspect(conn).get_columns(table.name)
+        }
+        if all(declared[col] == "INTEGER" for col in digits):
+            continue
+        rebuild_table(
+            conn,
+            table,
+            {
+                col: (
+                    f"CAST(ROUND({col} * {10 ** digits[col]}) AS INTEGER)"
+                    if col in digits
+                    else col
+                )
+                for col in declared
+            },
+        )
+    _rebuild_trade_summary(conn)
+
+
+def add_write_generation(conn):
+    WriteGeneration.__table__.create(conn, checkfirst=True)
+    conn.execute(
+        insert(WriteGeneration)
+        .prefix_with("OR IGNORE")
+        .values(id=1, generation=0)
+    )
+
+
+def add_equity_curve(conn):
+    EquityPoint.__table__.create(conn, checkfirst=True)
+    EquityState.__table__.create(conn, checkfirst=True)
+
+
+def add_trade_excursions(conn):
+    TradeExcursion.__table__.create(conn, checkfirst=True)
+
+
+def add_import_jobs(conn):
+    ImportJob.__table__.create(conn, checkfirst=True)
+
+
+def add_import_batches(conn):
+    ImportBatch.__table__.create(conn, checkfirst=True)
+    ImportedRow.__table__.create(conn, checkfirst=True)
+    create_indexes(conn, ImportedRow.__table__)
+    columns = [c["name"] for c in inspect(conn).get_columns("import_jobs")]
+    if "skipped" not in columns:
+        conn.exec_driver_sql(
+            "ALTER TABLE import_jobs ADD COLUMN skipped INTEGER NOT NULL DEFAULT 0"
+        )
+
+
+# The equity cache is checked against trade_summary. Existing states have no net
+# amount to check, so they are dropped and each curve is rebuilt on first use.
+def add_equity_net_amount(conn):
+    columns = [c["name"] for c in inspect(conn).get_columns("equity_state")]
+    if "net_amount" not in columns:
+        conn.exec_driver_sql(
+            "ALTER TABLE equity_state ADD COLUMN net_amount INTEGER NOT NULL DEFAULT 0"
+        )
+        conn.execute(delete(EquityState))
+
+
+def add_import_job_owner(conn):
+    columns = [c["name"] for c in inspect(conn).get_columns("import_jobs")]
+    if "owner_pid" not in columns:
+        conn.exec_driver_sql("ALTER TABLE import_jobs ADD COLUMN owner_pid INTEGER")
+
+
+migrations = [
+    (1, "Add indexes for trade grid, stats and exit queries", add_query_indexes),
+    (2, "Add trade_summary table", add_trade_summary),
+    (3, "Store prices and amounts as fixed-point integers", convert_to_fixed_point),
+    (4, "Add write_generation counter for cache invalidation", add_write_generation),
+    (5, "Add equity_curve and equity_state tables", add_equity_curve),
+    (6, "Add trade_excursions table", add_trade_excursions),
+    (7, "Add import_jobs table", add_import_jobs),
+    (8, "Add import_batches and imported_rows for re-import dedup", add_import_batches),
+    (9, "Add net_amount to equity_state", add_equity_net_amount),
+    (10, "Add owner_pid to import_jobs", add_import_job_owner),
+]
+
+
+def get_schema_version(conn):
+    return conn.execute(select(func.max(SchemaVersion.version))).scalar() or 0
+
+
+def run_migrations(engine):
+    with engine.connect() as conn:
+        current_version = get_schema_version(conn)
+
+    for version, description, migrate in migrations:
+        if version <= current_version:
+            continue
+        logging.info(f"Applying migration {version}: {description}")
+        try:
+            with engine.begin() as conn:
+                # pysqlite only opens a transaction before DML, so the DDL of a
+                # failed migration would otherwise stay behind
+                conn.exec_driver_sql("BEGIN")
+                migrate(conn)
+                conn.execute(
+                    insert(SchemaVersion).values(
+                        version=version,
+                        description=description,
+                        applied_on=datetime.now(),
+                    )
+                )
+        except Exception as e:
+            logging.error(f"Migration {version} failed: {e}")
+            raise RuntimeError(f"Unable to apply database migration {version}: {e}")
+        current_version = version
+
+    logging.info(f"Database schema at version {current_version}")
+    return current_version
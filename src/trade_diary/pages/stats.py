@@ -1,81 +1,157 @@
 import logging
 import numpy as np
 import pandas as pd
-from functools import reduce
 
 import dash
 from dash import Dash, html, dcc, callback, Output, Input, no_update, set_props
 import dash_bootstrap_components as dbc
+import dash_ag_grid as dag
+import plotly.graph_objects as go
+from plotly.subplots import make_subplots
 
 from datetime import datetime
+from src.trade_diary.cache import cached_by_generation
+from src.trade_diary.equity import drawdown_summary, get_equity_curve
+from src.trade_diary.excursions import get_excursions
 from src.trade_diary.db_interface import (
     get_all_financial_years,
-    get_all_entries,
-    get_all_exits,
-    get_all_trades,
+    get_trade_stats,
 )
 
 
 dash.register_page(__name__)
 
 
-def get_display_data(financial_year):
-    entries = get_all_entries(financial_year=financial_year)
-    if entries.empty:
-        logging.debug("get_display_data: No entries found")
-        return None
-
-    entries["entry_date"] = pd.to_datetime(entries["entry_date"], format="%Y-%m-%d")
-    entries["entry_amount"] = entries["entry_price"] * entries["quantity"]
-    entries["risked_amount"] = entries["quantity"] * (
-        entries["entry_price"] - entries["stop_loss"]
+groupers = {
+    "Month-Year": "month_year",
+    "Quarter": "qtr",
+    "FY": "financial_year",
+    "Set-Up": "setup",
+}
+
+trade_list_columns = {
+    "symbol": "Symbol",
+    "i_entry_date": "Initial Entry Date",
+    "setup": "Setup",
+    "financial_year": "Financial Year",
+    "qtr": "Quarter",
+    "risk_percentage": "Risk %",
+    "charges": "Charges",
+    "gross_pl": "Gross P&L",
+    "net_pl": "Net P&L",
+    "net_pl_percentage": "Net P&L %",
+    "gross_R": "Gross R",
+    "net_R": "Net R",
+    "win": "Win",
+    "holding_days": "No. of Days",
+    "no_of_days_win": "No. of Days (Win)",
+    "no_of_days_loss": "No. of Days (Loss)",
+}
+
+summary_columns = [
+    "Total Trades",
+    "Gross R",
+    "Net R",
+    "Wins",
+    "Losses",
+    "Win %",
+    "Win Avg",
+    "Loss Avg",
+    "RR",
+    "AWLR",
+    "Max Win",
+    "Max Loss",
+    "Max R",
+    "Min R",
+    "Avg Win Days",
+    "Avg Loss Days",
+]
+
+
+# Summarizes every grouping in one groupby: the trades are stacked once per
+# grouping, GROUPING SETS style, and the win/loss splits are precomputed as masked
+# columns so that only built-in aggregations run.
+def group_summaries(trades):
+    net_pl_percentage = trades["net_pl_percentage"]
+    measures = pd.DataFrame(
+        {
+            "initial_entry_date": trades["initial_entry_date"],
+            "win": trades["win"],
+            "loss": 1 - trades["win"].astype("int64"),
+            "gross_R": trades["gross_R"],
+            "net_R": trades["net_R"],
+            "win_pl": net_pl_percentage.where(net_pl_percentage > 0),
+            "loss_pl": -net_pl_percentage.where(net_pl_percentage <= 0),
+            "no_of_days_win": trades["no_of_days_win"],
+            "no_of_days_loss": trades["no_of_days_loss"],
+        }
+    )
+    stacked = pd.concat(
+        [
+            measures.assign(grouping=name, group=trades[grouper].astype(str))
+            for name, grouper in groupers.items()
+        ],
+        ignore_index=True,
     )
 
-    entries_agg = (
-        entries.groupby("trade_id")
-        .agg(
-            {
-                "entry_id": "count",
-                "entry_date": "min",
-                "entry_amount": "sum",
-                "quantity": "sum",
-                "remaining_quantity": "sum",
-                "risk_percentage": "sum",
-                "exit_amount": "sum",
-                "charges": "sum",
-                "risked_amount": "sum",
-            }
-        )
-        .reset_index()
+    summary = stacked.groupby(["grouping", "group"], sort=True).agg(
+        **{
+            "sdate": ("initial_entry_date", "min"),
+            "Total Trades": ("initial_entry_date", "count"),
+            "Wins": ("win", "sum"),
+            "Losses": ("loss", "sum"),
+            "Gross R": ("gross_R", "sum"),
+            "Net R": ("net_R", "sum"),
+            "Win %": ("win", "mean"),
+            "Win Avg": ("win_pl", "mean"),
+            "Loss Avg": ("loss_pl", "mean"),
+            "Max Win": ("win_pl", "max"),
+            "Max Loss": ("loss_pl", "max"),
+            "Max R": ("net_R", "max"),
+            "Min R": ("net_R", "min"),
+            "Avg Win Days": ("no_of_days_win", "mean"),
+            "Avg Loss Days": ("no_of_days_loss", "mean"),
+        }
     )
+    summary["Win %"] = summary["Win %"] * 100
 
-    entries_agg["gross_pl"] = (
-        entries_agg["exit_amount"] - entries_agg["entry_amount"]
-    ).round(2)
-    entries_agg["net_pl"] = (entries_agg["gross_pl"] - entries_agg["charges"]).round(2)
-    entries_agg["net_pl_percentage"] = (
-        (entries_agg["net_pl"] / entries_agg["entry_amount"]) * 100
-    ).round(2)
-    entries_agg["gross_R"] = (
-        entries_agg["net_pl"] / entries_agg["risked_amount"]
-    ).round(2)
-    entries_agg["net_R"] = (
-        entries_agg["risk_percentage"] * entries_agg["gross_R"]
-    ).round(2)
-    entries_agg["win"] = entries_agg["net_pl"].apply(lambda x: 1 if x > 0 else 0)
-
-    exits = get_all_exits(financial_year=financial_year)
-    exits["exit_date"] = pd.to_datetime(exits["exit_date"], format="%Y-%m-%d")
-    exits_agg = (
-        exits.groupby("trade_id")
-        .agg(exit_count=("exit_id", "count"), exit_date=("exit_date", "max"))
-        .reset_index()
+    summary["RR"] = np.where(
+        summary["Loss Avg"] == 0,
+        0,
+        (summary["Win Avg"] / summary["Loss Avg"]),
+    )
+    summary["AWLR"] = np.where(
+        summary["Loss Avg"] == 0,
+        0,
+        (
+            (summary["Win %"] * summary["Win Avg"])
+            / ((100 - summary["Win %"]) * summary["Loss Avg"])
+        ),
     )
+    for col in summary.select_dtypes(include=[float]).columns:
+        summary[col] = summary[col].round(2)
 
-    trades = get_all_trades(financial_year=financial_year)
-    trades["initial_entry_date"] = pd.to_datetime(
-        trades["initial_entry_date"], format="%Y-%m-%d"
+    summary["Win %"] = np.ceil(summary["Win %"]).fillna(0).astype("int")
+    summary["Avg Win Days"] = np.ceil(summary["Avg Win Days"]).fillna(0).astype("int")
+    summary["Avg Loss Days"] = (
+        np.ceil(summary["Avg Loss Days"]).fillna(0).astype("int")
     )
+
+    display_dfs = {}
+    for name in groupers:
+        display_dfs[name] = (
+            summary.loc[name]
+            .sort_values(by="sdate")
+            .drop("sdate", axis=1)
+            .reindex(columns=summary_columns)
+            .rename_axis(name)
+            .reset_index()
+        )
+    return display_dfs
+
+
+# Adds the grouping keys and the win/loss holding days to get_trade_stats output
+def add_grouping_columns(trades):
     trades["i_entry_date"] = trades["initial_entry_date"].dt.date
     trades["month_year"] = trades["initial_entry_date"].dt.strftime("%B-%Y")
     trade_month = trades["initial_entry_date"].dt.month
@@ -90,149 +166,30 @@ def get_display_data(financial_year):
     trades["qtr"] = (
         trades["initial_entry_date"].dt.year.astype(str) + "-" + trades["qtr"]
     )
-    trades["setup"] = trades["setup"].fillna("N/A").str.upper()
+    trades["setup"] = trades["setup"].str.upper().astype("category")
 
-    trades = reduce(
-        lambda left, right: pd.merge(left, right, on="trade_id", how="inner"),
-        [trades, entries_agg, exits_agg],
-    )
-    trades["no_of_days"] = (
-        trades["exit_date"] - trades["initial_entry_date"]
-    ).dt.days.fillna(0)
     trades["no_of_days_win"] = np.where(
-        trades["win"] == 1, trades["no_of_days"], np.nan
+        trades["win"] == 1, trades["holding_days"], np.nan
     )
     trades["no_of_days_loss"] = np.where(
-        trades["win"] == 0, trades["no_of_days"], np.nan
-    )
-
-    trades_disp_cols = [
-        "symbol",
-        "i_entry_date",
-        "setup",
-        "financial_year",
-        "qtr",
-        "risk_percentage",
-        "charges",
-        "gross_pl",
-        "net_pl",
-        "net_pl_percentage",
-        "gross_R",
-        "net_R",
-        "win",
-        "no_of_days",
-        "no_of_days_win",
-        "no_of_days_loss",
-    ]
-    renamed_cols = {
-        "symbol": "Symbol",
-        "i_entry_date": "Initial Entry Date",
-        "setup": "Setup",
-        "financial_year": "Financial Year",
-        "qtr": "Quarter",
-        "risk_percentage": "Risk %",
-        "charges": "Charges",
-        "gross_pl": "Gross P&L",
-        "net_pl": "Net P&L",
-        "net_pl_percentage": "Net P&L %",
-        "gross_R": "Gross R",
-        "net_R": "Net R",
-        "win": "Win",
-        "no_of_days": "No. of Days",
-        "no_of_days_win": "No. of Days (Win)",
-        "no_of_days_loss": "No. of Days (Loss)",
-    }
-    trades_display = (
-        trades[trades_disp_cols]
-        .sort_values(by="i_entry_date")
-        .rename(columns=renamed_cols)
+        trades["win"] == 0, trades["holding_days"], np.nan
     )
-    groupers = {
-        "Month-Year": "month_year",
-        "Quarter": "qtr",
-        "FY": "financial_year",
-        "Set-Up": "setup",
-    }
-    display_dfs = {}
-    for name, grouper in groupers.items():
-        display_df = (
-            trades.groupby(grouper)
-            .agg(
-                **{
-                    "sdate": ("initial_entry_date", "min"),
-                    "Total Trades": ("initial_entry_date", "count"),
-                    "Wins": ("win", "sum"),
-                    "Losses": ("win", lambda x: x.count() - x.sum()),
-                    "Gross R": ("gross_R", "sum"),
-                    "Net R": ("net_R", "sum"),
-                    "Win %": ("win", lambda x: x.mean() * 100),
-                    "Win Avg": ("net_pl_percentage", lambda x: x[x > 0].mean()),
-                    "Loss Avg": (
-                        "net_pl_percentage",
-                        lambda x: (x[x <= 0].mean()) * -1,
-                    ),
-                    "Max Win": ("net_pl_percentage", lambda x: x[x > 0].max()),
-                    "Max Loss": ("net_pl_percentage", lambda x: (x[x <= 0].min()) * -1),
-                    "Max R": ("net_R", "max"),
-                    "Min R": ("net_R", "min"),
-                    "Avg Win Days": ("no_of_days_win", "mean"),
-                    "Avg Loss Days": ("no_of_days_loss", "mean"),
-                }
-            )
-            # .reset_index()
-            .sort_values(by="sdate")
-        )
-
-        display_df["RR"] = np.where(
-            display_df["Loss Avg"] == 0,
-            0,
-            (display_df["Win Avg"] / display_df["Loss Avg"]),
-        )
-        display_df["AWLR"] = np.where(
-            display_df["Loss Avg"] == 0,
-            0,
-            (
-                (display_df["Win %"] * display_df["Win Avg"])
-                / ((100 - display_df["Win %"]) * display_df["Loss Avg"])
-            ),
-        )
-        for col in display_df.select_dtypes(include=[float]).columns:
-            display_df[col] = display_df[col].round(2)
+    return trades
 
-        display_df["Win %"] = np.ceil(display_df["Win %"]).fillna(0).astype("int")
-        display_df["Avg Win Days"] = (
-            np.ceil(display_df["Avg Win Days"]).fillna(0).astype("int")
-        )
-        display_df["Avg Loss Days"] = (
-            np.ceil(display_df["Avg Loss Days"]).fillna(0).astype("int")
-        )
 
-        column_order = [
-            "Total Trades",
-            "Gross R",
-            "Net R",
-            "Wins",
-            "Losses",
-            "Win %",
-            "Win Avg",
-            "Loss Avg",
-            "RR",
-            "AWLR",
-            "Max Win",
-            "Max Loss",
-            "Max R",
-            "Min R",
-            "Avg Win Days",
-            "Avg Loss Days",
-        ]
+@cached_by_generation
+def get_display_data(financial_year):
+    trades = get_trade_stats(financial_year)
+    if trades is None or trades.empty:
+        logging.debug("get_display_data: No closed trades found")
+        return None
 
-        display_dfs[name] = (
-            display_df.drop("sdate", axis=1)
-            .reindex(columns=column_order)
-            .reset_index()
-            .rename(columns={grouper: name})
-        )
+    trades = add_grouping_columns(trades)
 
+    trades_display = trades[list(trade_list_columns)].sort_values(
+        by="i_entry_date", kind="stable"
+    )
+    display_dfs = group_summaries(trades)
     display_dfs["trades"] = trades_display
     return display_dfs
 
@@ -312,6 +269,61 @@ summary_setup = dbc.Row(
     ],
 )
 
+summary_equity = dbc.Row(
+    [
+        html.H5(
+            "Equity Curve",
+            style={
+                "textAlign": "center",
+                "marginTop": "20px",
+                "display": "block",
+                "fontWeight": "500",
+                "fontSize": "1.3rem",
+            },
+        ),
+        html.Hr(),
+        html.Div(id="equity-stats", style={"textAlign": "center"}),
+        dcc.Graph(id="equity-graph", config={"displaylogo": False}),
+    ],
+)
+
+summary_excursions = dbc.Row(
+    [
+        html.H5(
+            "MAE / MFE by Set-Up",
+            style={
+                "textAlign": "center",
+                "marginTop": "20px",
+                "display": "block",
+                "fontWeight": "500",
+                "fontSize": "1.3rem",
+            },
+        ),
+        html.Hr(),
+        html.Div(id="summary-tab-excursions", className="table-responsive"),
+    ],
+)
+
+text_columns = {"symbol", "i_entry_date", "setup", "financial_year", "qtr"}
+
+# Client-side row model: AG Grid only renders the rows in view, so thousands of
+# trades cost one JSON payload instead of a Dash component per cell
+trades_grid = dag.AgGrid(
+    id="summary-trades-grid",
+    columnDefs=[
+        {"field": field, "headerName": header}
+        if field in text_columns
+        else {"field": field, "headerName": header, "type": "numericColumn"}
+        for field, header in trade_list_columns.items()
+    ],
+    defaultColDef={"sortable": True, "filter": True, "resizable": True},
+    rowData=[],
+    className="ag-theme-quartz",
+    columnSize="autoSize",
+    dashGridOptions={"rowBuffer": 10, "animateRows": False},
+    style={"height": "600px"},
+)
+
 summary_trades = dbc.Row(
     [
         html.H5(
@@ -325,7 +337,7 @@ summary_trades = dbc.Row(
             },
         ),
         html.Hr(),
-        html.Div("trsting", id="summary-tab-trades", className="table-responsive"),
+        trades_grid,
     ],
     id="summary-trades-row",
     style={"display": "None"},
@@ -392,6 +404,8 @@ layout = dbc.Row(
                     summary_qtr,
                     summary_month,
                     summary_setup,
+                    summary_equity,
+                    summary_excursions,
                     summary_trades,
                 ],
                 className="content_style",
@@ -407,12 +421,10 @@ layout = dbc.Row(
     Output("summary-tab-quarterly", "children"),
     Output("summary-tab-monthly", "children"),
     Output("summary-tab-setup", "children"),
-    Output("summary-tab-trades", "children"),
     Output("display-year", "options"),
     Input("display-year", "value"),
-    Input("show-trades", "value"),
 )
-def update_summary_header(input_value, show_trades):
+def update_summary_header(input_value):
     fy_years = get_all_financial_years()
 
     if fy_years:
@@ -438,7 +450,6 @@ def update_summary_header(input_value, show_trades):
             empty_df,
             empty_df,
             empty_df,
-            empty_df,
             drop_down_options,
         )
 
@@ -451,7 +462,6 @@ def update_summary_header(input_value, show_trades):
             empty_df,
             empty_df,
             empty_df,
-            empty_df,
             drop_down_options,
         )
 
@@ -491,26 +501,156 @@ def update_summary_header(input_value, show_trades):
     )
     centre_table_contents(summary_tab_setup)
 
-    summary_trades = dbc.Table.from_dataframe(
-        display_dfs["trades"],
-        striped=True,
-        bordered=True,
-        hover=True,
-        style={"textAlign": "center"},
-    )
-    centre_table_contents(summary_trades)
-
-    if show_trades and "yes" in show_trades:
-        set_props("summary-trades-row", {"style": {"display": "block"}})
-    else:
-        set_props("summary-trades-row", {"style": {"display": "none"}})
-
     return (
         header,
         summary_tab_yearly,
         summary_tab_quarterly,
         summary_tab_monthly,
         summary_tab_setup,
-        summary_trades,
         drop_down_options,
     )
+
+
+def trade_list_rows(trades):
+    trades = trades.assign(i_entry_date=trades["i_entry_date"].astype(str))
+    return trades.astype(object).where(trades.notna(), None).to_dict("records")
+
+
+# The trade list is only built while "Show Trades" is ticked. It reuses the cached
+# display data, so toggling it never recomputes the summaries.
+@callback(
+    Output("summary-trades-grid", "rowData"),
+    Output("summary-trades-row", "style"),
+    Input("display-year", "value"),
+    Input("show-trades", "value"),
+)
+def update_trade_list(input_value, show_trades):
+    if not (show_trades and "yes" in show_trades) or not input_value:
+        return [], {"display": "none"}
+
+    display_dfs = get_display_data("all" if input_value == "All" else input_value)
+    if display_dfs is None:
+        return [], {"display": "none"}
+
+    return trade_list_rows(display_dfs["trades"]), {"display": "block"}
+
+
+def equity_figure(points):
+    fig = make_subplots(
+        rows=2,
+        cols=1,
+        shared_xaxes=True,
+        row_heights=[0.7, 0.3],
+        vertical_spacing=0.05,
+    )
+    fig.add_trace(
+        go.Scatter(x=points["date"], y=points["cum_net_pl"], name="Net P&L"),
+        row=1,
+        col=1,
+    )
+    fig.add_trace(
+        go.Scatter(
+            x=points["date"],
+            y=points["peak"],
+            name="Peak",
+            line={"dash": "dot", "width": 1},
+        ),
+        row=1,
+        col=1,
+    )
+    fig.add_trace(
+        go.Scatter(
+            x=points["date"],
+            y=points["drawdown"],
+            name="Drawdown",
+            fill="tozeroy",
+            line={"color": "#f13921"},
+        ),
+        row=2,
+        col=1,
+    )
+    fig.update_layout(
+        height=500,
+        margin={"l": 40, "r": 20, "t": 20, "b": 20},
+        hovermode="x unified",
+        legend={"orientation": "h"},
+    )
+    return fig
+
+
+def equity_stats_text(points):
+    summary = drawdown_summary(points)
+    recovery = (
+        f"{summary['recovery_days']} days"
+        if summary["recovery_days"] is not None
+        else "not yet recovered"
+    )
+    return (
+        f"Net P&L: {points['cum_net_pl'].iloc[-1]:,.2f} | "
+        f"Net R: {points['cum_net_R'].iloc[-1]:.2f} | "
+        f"Max Drawdown: {summary['max_drawdown']:,.2f} "
+        f"on {summary['max_drawdown_date']} | "
+        f"Longest Drawdown: {summary['max_drawdown_days']} days | "
+        f"Recovery: {recovery}"
+    )
+
+
+@callback(
+    Output("equity-graph", "figure"),
+    Output("equity-stats", "children"),
+    Input("display-year", "value"),
+)
+def update_equity_curve(input_value):
+    if not input_value:
+        return go.Figure(), "No Data"
+
+    points = get_equity_curve("all" if input_value == "All" else input_value)
+    if points is None or points.empty:
+        return go.Figure(), "No Data"
+
+    return equity_figure(points), equity_stats_text(points)
+
+
+# MAE is negative, so its worst decile is the 10th percentile; MFE's best decile is
+# the 90th
+def excursion_summary(excursions):
+    grouped = excursions.groupby(
+        excursions["setup"].astype(str).str.upper(), sort=True
+    )
+    summary = pd.DataFrame(
+        {
+            "Trades": grouped["trade_id"].count(),
+            "Median MAE R": grouped["mae_R"].median(),
+            "Worst 10% MAE R": grouped["mae_R"].quantile(0.1),
+            "Median MFE R": grouped["mfe_R"].median(),
+            "Best 10% MFE R": grouped["mfe_R"].quantile(0.9),
+            "Median MAE": grouped["mae"].median(),
+            "Median MFE": grouped["mfe"].median(),
+        }
+    ).round(2)
+    return summary.rename_axis("Set-Up").reset_index()
+
+
+@callback(
+    Output("summary-tab-excursions", "children"),
+    Input("display-year", "value"),
+)
+def update_excursions(input_value):
+    if not input_value:
+        return "No Data"
+
+    excursions = get_excursions("all" if input_value == "All" else input_value)
+    if excursions is None:
+        return "No Data"
+    if excursions.empty:
+        return "No price data; load daily prices with maintenance.py ingest-prices"
+
+    summary_tab_excursions = dbc.Table.from_dataframe(
+        excursion_summary(excursions),
+        striped=True,
+        bordered=True,
+        hover=True,
+        style={"textAlign": "center"},
+    )
+    centre_table_contents(summary_tab_excursions)
+    return summary_tab_excursions
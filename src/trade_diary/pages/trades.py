@@ -19,6 +19,7 @@ from src.trade_diary.utility_functions import (
     extract_financial_year,
 )
 from datetime import date
+from urllib.parse import urlencode
 import pandas as pd
 
 from src.trade_diary.pages.trades_ui import *
@@ -68,29 +69,25 @@ def refresh_trades_table(data, request, financial_year, show_open):
     ctx = callback_context
     trigger_id = ctx.triggered[0]["prop_id"].split(".")[0]
 
-    filters = {}
     if data == 100 or trigger_id == "display_year" or request:
-        if request and request["filterModel"]:
-            initial_date_filter = request["filterModel"]["initial_entry_date"]
-
-            sdate = datetime.strptime(
-                initial_date_filter["dateFrom"], "%Y-%m-%d %H:%M:%S"
-            ).date()
-            edate = (
-                datetime.strptime(
-                    initial_date_filter["dateTo"], "%Y-%m-%d %H:%M:%S"
-                ).date()
-                if initial_date_filter["dateTo"]
-                else None
-            )
+        start_row = request["startRow"] if request else 0
+        end_row = request["endRow"] if request else None
+        sort_model = request.get("sortModel") if request else None
 
-            filters["initial_entry_date"] = (initial_date_filter["type"], sdate, edate)
+        filter_model = request.get("filterModel") if request else None
 
         trades = get_all_trades_and_entries(
-            show_trades, financial_year=financial_year, filter_conditions=filters
+            show_trades,
+            financial_year=financial_year,
+            filter_model=filter_model,
+            start_row=start_row,
+            end_row=end_row,
+            sort_model=sort_model,
         )
 
         if trades is None or trades.empty:
+            if start_row > 0:
+                return {"rowData": [], "rowCount": start_row}
             logging.error(
                 "refresh_trades_table:No trades found or error fetching trades."
             )
@@ -98,8 +95,11 @@ def refresh_trades_table(data, request, financial_year, show_open):
             return {"rowData": dummy, "rowCount": 1}
 
         trades = add_additional_columns(trades)
+        row_count = get_trades_count(
+            show_trades, financial_year=financial_year, filter_model=filter_model
+        )
 
-        return {"rowData": trades.to_dict("records"), "rowCount": len(trades)}
+        return {"rowData": trades.to_dict("records"), "rowCount": row_count}
     else:
         return no_update
 
@@ -124,6 +124,20 @@ def update_trade_book_header(financial_year):
     return f"Trades For FY {financial_year}"
 
 
+@callback(
+    Output("export-link", "href"),
+    Input("display_year", "value"),
+    Input("export-table", "value"),
+    Input("export-format", "value"),
+    Input("export-all-years", "value"),
+)
+def update_export_link(financial_year, table, file_format, all_years):
+    if all_years:
+        financial_year = "all"
+    query = urlencode({"financial_year": financial_year})
+    return f"/export/{table}.{file_format}?{query}"
+
+
 @callback(
     Output("trade-details", "children"),
     Input("trades-table", "selectedRows"),
@@ -5,34 +5,57 @@ import dash_bootstrap_components as dbc
 
 from datetime import date
 from src.trade_diary.db_interface import get_all_financial_years
+from src.trade_diary.export import available_formats
 from src.trade_diary.utility_functions import extract_financial_year
 
 
 db_update_store = dcc.Store(id="db-update", data=100)
 
 
+filter_buttons = {"buttons": ["apply", "cancel", "clear"], "closeOnApply": True}
+
+text_filter = {"filter": "agTextColumnFilter", "filterParams": filter_buttons}
+number_filter = {"filter": "agNumberColumnFilter", "filterParams": filter_buttons}
+date_filter = {
+    "cellDataType": "dateString",
+    "filter": "agDateColumnFilter",
+    "filterParams": {
+        **filter_buttons,
+        "filterOptions": ["lessThan", "greaterThan", "inRange", "equals"],
+        "maxNumConditions": 1,
+        "defaultOption": "greaterThan",
+    },
+}
+
 display_col_def = [
-    {"field": "symbol", "headerName": "Symbol"},
+    {"field": "symbol", "headerName": "Symbol", **text_filter},
+    {"field": "initial_entry_date", "headerName": "Trade Date", **date_filter},
+    {"field": "avg_entry_price", "headerName": "Avg Entry Price", **number_filter},
+    {"field": "total_quantity", "headerName": "Quantity", **number_filter},
+    {"field": "total_open_position", "headerName": "Open Position", **number_filter},
+    # Filled from the price service cache, not the database, so not sortable/filterable
     {
-        "field": "initial_entry_date",
-        "headerName": "Trade Date",
-        "cellDataType": "dateString",
-        "filter": "agDateColumnFilter",
-        "filterParams": {
-            "buttons": ["apply", "cancel", "clear"],
-            "closeOnApply": True,
-            "filterOptions": ["lessThan", "greaterThan", "inRange", "equals"],
-            "maxNumConditions": 1,
-            "defaultOption": "greaterThan",
-        },
+        "field": "current_close",
+        "headerName": "Current Price",
+        "sortable": False,
+        "filter": False,
     },
-    {"field": "avg_entry_price", "headerName": "Avg Entry Price"},
-    {"field": "total_quantity", "headerName": "Quantity"},
-    {"field": "total_open_position", "headerName": "Open Position"},
-    {"field": "total_risk_percentage", "headerName": "Total Risk %"},
+    {
+        "field": "unrealized_pl",
+        "headerName": "Unrealized P&L",
+        "sortable": False,
+        "filter": False,
+    },
+    {"field": "total_risk_percentage", "headerName": "Total Risk %", **number_filter},
     {
         "field": "status",
         "headerName": "Status",
+        "filter": "agTextColumnFilter",
+        "filterParams": {
+            **filter_buttons,
+            "filterOptions": ["equals"],
+            "maxNumConditions": 1,
+        },
         "cellStyle": {
             "styleConditions": [
                 {
@@ -54,16 +77,47 @@ display_col_def = [
             ]
         },
     },
-    {"field": "setup", "headerName": "Setup"},
-    {"field": "num_entries", "headerName": "Number of Entries", "hide": True},
-    {"field": "num_exits", "headerName": "Number of Exits", "hide": True},
-    {"field": "total_charges", "headerName": "Total Charges", "hide": True},
-    {"field": "total_buy_amount", "headerName": "Investment", "hide": True},
-    {"field": "last_exit_date", "headerName": "Last Exit Date", "hide": True},
-    {"field": "total_sell_amount", "headerName": "Total Sell Amount", "hide": True}
+    {"field": "setup", "headerName": "Setup", **text_filter},
+    {"field": "days_held", "headerName": "Days Held", "hide": True, **number_filter},
+    {
+        "field": "num_entries",
+        "headerName": "Number of Entries",
+        "hide": True,
+        **number_filter,
+    },
+    {
+        "field": "num_exits",
+        "headerName": "Number of Exits",
+        "hide": True,
+        **number_filter,
+    },
+    {
+        "field": "total_charges",
+        "headerName": "Total Charges",
+        "hide": True,
+        **number_filter,
+    },
+    {
+        "field": "total_buy_amount",
+        "headerName": "Investment",
+        "hide": True,
+        **number_filter,
+    },
+    {
+        "field": "last_exit_date",
+        "headerName": "Last Exit Date",
+        "hide": True,
+        **date_filter,
+    },
+    {
+        "field": "total_sell_amount",
+        "headerName": "Total Sell Amount",
+        "hide": True,
+        **number_filter,
+    },
 ]
 
-defaultColDef = {"flex": 1, "headerClass": "center-aligned-header", "sortable": False}
+defaultColDef = {"flex": 1, "headerClass": "center-aligned-header", "sortable": True}
 
 fy_years = get_all_financial_years()
 if not fy_years:
@@ -97,6 +151,42 @@ side_bar_buttons = dbc.ButtonGroup(
             id="show-open",
             labelStyle={"display": "flex", "align-items": "left"},
         ),
+        html.Hr(),
+        dcc.Dropdown(
+            id="export-table",
+            value="trades",
+            options=[
+                {"label": "Trades", "value": "trades"},
+                {"label": "Entries", "value": "entries"},
+                {"label": "Exits", "value": "exits"},
+                {"label": "Trade Stats", "value": "stats"},
+            ],
+            clearable=False,
+        ),
+        dcc.Dropdown(
+            id="export-format",
+            value="csv",
+            options=[{"label": f.upper(), "value": f} for f in available_formats()],
+            clearable=False,
+        ),
+        dcc.Checklist(
+            [
+                {
+                    "label": html.Span(
+                        "All Years", style={"font-size": "1rem", "padding-left": 8}
+                    ),
+                    "value": "all",
+                },
+            ],
+            value=[],
+            id="export-all-years",
+            labelStyle={"display": "flex", "align-items": "left"},
+        ),
+        html.A(
+            dbc.Button("Export", size="md", className="w-100"),
+            id="export-link",
+            href="/export/trades.csv",
+        ),
     ],
     className="d-grid gap-2",
     vertical=True,
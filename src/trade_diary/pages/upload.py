@@ -1,16 +1,14 @@
 import logging
-import numpy as np
-import pandas as pd
-import difflib
-import base64
-import io
+from pathlib import Path
 
 import dash
 from dash import Dash, html, dcc, callback, Output, Input, no_update, State, set_props
 import dash_bootstrap_components as dbc
+import pandas as pd
 
-from datetime import datetime
-from src.trade_diary.db_interface import delete_trade, insert_trade, insert_exit
+from src.trade_diary.db_interface import get_import_jobs
+from src.trade_diary.importer import save_upload, supported_suffixes
+from src.trade_diary.jobs import get_import_runner
 
 
 dash.register_page(__name__)
@@ -36,6 +34,16 @@ layout = dbc.Container(
                 placeholder="Select Date Format",
                 style={"margin": "10px", "marginTop": "120px"},
             ),
+            dbc.RadioItems(
+                id="import-mode",
+                value="trades",
+                options=[
+                    {"label": "Trades (entry and exit per row)", "value": "trades"},
+                    {"label": "Broker fills (buys and sells)", "value": "fills"},
+                ],
+                inline=True,
+                style={"margin": "10px"},
+            ),
             dcc.Upload(
                 id="upload-data",
                 children=html.Div(["Drag and Drop or ", html.A("Select Files")]),
@@ -60,212 +68,172 @@ layout = dbc.Container(
                     "fontWeight": "bold",
                 },
             ),
+            # The running job survives page reloads within the browser session
+            dcc.Store(id="import-job-id", storage_type="session"),
+            dcc.Interval(id="import-job-poll", interval=1000, disabled=True),
+            html.Div(
+                [
+                    dbc.Progress(
+                        id="import-progress", value=0, style={"height": "24px"}
+                    ),
+                    html.Div(
+                        id="import-job-status",
+                        style={"textAlign": "center", "marginTop": "10px"},
+                    ),
+                    dbc.Button(
+                        "Cancel Import",
+                        id="cancel-import",
+                        color="danger",
+                        size="sm",
+                        n_clicks=0,
+                        style={"marginTop": "10px"},
+                    ),
+                ],
+                id="import-job-panel",
+                style={"display": "none", "margin": "10px", "textAlign": "center"},
+            ),
+            html.H5(
+                "Recent Imports",
+                style={
+                    "textAlign": "center",
+                    "marginTop": "40px",
+                    "fontWeight": "500",
+                    "fontSize": "1.3rem",
+                },
+            ),
+            html.Hr(),
+            html.Div(id="import-job-history", className="table-responsive"),
         ]
     ),
 )
 
 
-def get_mappings(df_columns):
-    cols = df_columns
-    to_match_names = [
-        ("symbol", ["symbol", "stock", "name", "scrip"]),
-        ("setup", ["setup", "strategy"]),
-        ("entry_date", ["buy date", "purchase date", "entry date"]),
-        ("entry_price", ["entry price", "buy price"]),
-        ("entry_type", ["entry type", "buy type", "entry"]),
-        (
-            "quantity",
-            ["quantity", "qty", "no of shares", "entry quantity", "entry qty"],
-        ),
-        ("risk_percentage", ["risk percentage", "risk", "risk %"]),
-        ("stop_loss", ["stop loss", "sl"]),
-        ("exit_date", ["sell date", "exit date"]),
-        ("exit_price", ["exit price", "sell price"]),
-        # ('exit_quantity' , ['exit quantity','sell quantity']),
-    ]
-    not_necessary_fields = ['entry_type']
-    fields_to_col_mapping = []
-    for key, possible_names in to_match_names:
-        for possible_name in possible_names:
-            match = difflib.get_close_matches(possible_name, cols, n=1, cutoff=0.9)
-            if match:
-                fields_to_col_mapping.append((key, match[0]))
-                break
+job_history_columns = {
+    "job_id": "Job",
+    "file_name": "File",
+    "status": "Status",
+    "rows": "Rows",
+    "trades": "Trades",
+    "exits": "Exits",
+    "skipped": "Skipped",
+    "message": "Message",
+    "created_on": "Submitted",
+    "finished_on": "Finished",
+}
 
-    matched = [x[0] for x in fields_to_col_mapping]
-    not_matched_fields = [x[0] for x in to_match_names if x[0] not in matched]
-    not_matched_fields = set(not_matched_fields).difference(set(not_necessary_fields))
-    return fields_to_col_mapping, not_matched_fields
+
+def job_history_table():
+    jobs = get_import_jobs()
+    if jobs.empty:
+        return "No imports yet"
+    # read_sql leaves a column of NULLs as object dtype, e.g. while the first job runs
+    for col in ("created_on", "finished_on"):
+        jobs[col] = pd.to_datetime(jobs[col], errors="coerce").dt.strftime(
+            "%Y-%m-%d %H:%M:%S"
+        )
+    return dbc.Table.from_dataframe(
+        jobs[list(job_history_columns)].rename(columns=job_history_columns).fillna(""),
+        striped=True,
+        bordered=True,
+        hover=True,
+        size="sm",
+        style={"textAlign": "center"},
+    )
 
 
 @callback(
     Output("output-data-upload", "children"),
+    Output("import-job-id", "data"),
     Input("upload-data", "contents"),
     State("upload-data", "filename"),
     State("date-format", "value"),
+    State("import-mode", "value"),
     prevent_initial_call=True,
 )
-def upload_file(contents, file_name, date_format):
+def upload_file(contents, file_name, date_format, import_mode):
     if contents is None:
-        return no_update, 0
+        return no_update, no_update
+    if Path(file_name).suffix.lower() not in supported_suffixes:
+        return "File type not supported", no_update
     try:
         logging.info(f"Uploading file: {file_name}")
-        content_type, content_data = contents.split(",")
-        content_data = base64.b64decode(content_data)
+        path = save_upload(contents, file_name)
     except Exception as e:
         logging.error(f"Error decoding file: {e}")
-        return f"Error decoding file: {e}"
-    try:
-        if "csv" in file_name:
-            df = pd.read_csv(io.StringIO(content_data.decode("utf-8")))
-        elif "xls" in file_name or "xlsx" in file_name:
-            df = pd.read_excel(io.BytesIO(content_data))
-        else:
-            return "File type not supported"
-    except Exception as e:
-        logging.error(f"Error processing file: {e}")
-        return f"Error processing file: {e}"
-
-    df = df.rename(columns=lambda x: x.lower())
-    fields_to_col_mapping, not_matched_fields = get_mappings(df.columns.tolist())
-
-
-    if not_matched_fields:
-        return f"Unmatched fields: {', '.join(not_matched_fields)}"
-    logging.info(f"Fields to Column Mapping: {fields_to_col_mapping}")
+        return f"Error decoding file: {e}", no_update
 
-    req_cols = [x[0] for x in fields_to_col_mapping]
-    df = df.rename(columns={d[1]: d[0] for d in fields_to_col_mapping})[req_cols]
+    # Clearing the contents drops the payload from the page and lets the same file
+    # be uploaded again
+    set_props("upload-data", {"contents": None})
+    job_id = get_import_runner().submit(path, file_name, date_format, import_mode)
+    return "", job_id
 
-    trades_fields = ["symbol", "setup"]
-    entry_fields = [
-        "entry_date",
-        "entry_price",
-        "quantity",
-        "risk_percentage",
-        "stop_loss",
-    ]
-    exit_fields = ["exit_date", "exit_price", "exit_quantity"]
-    oth_fields = ["entry_type"]
 
-    nan_error = ""
-    for col in trades_fields + entry_fields:
-        if df[col].isna().sum() > 0:
-            nan_error += f"Column {col} contains NaN values\n"
-    if nan_error:
-        return nan_error
-
-    for col in df.filter(like="date", axis=1):
-        try:
-            df[col] = pd.to_datetime(df[col], format=date_format)
-        except Exception as e:
-            logging.error(f"Error converting date columns {col} : {e}")
-            return f"Error converting date columns {col} : {e}"
-
-    for col in df.filter(like="price|quantity", axis=1):
-        try:
-            df[col] = pd.to_numeric(df[col], errors="coerce")
-        except Exception as e:
-            logging.error(f"Error converting price columns {col} : {e}")
-            return f"Error converting price columns {col} : {e}"
-
-    inserted_trades, not_inserted_trades = [], []
-    # print(df)
-    df_cols = trades_fields + entry_fields
-
-    agg_dict =  {
-                "entry_price": "max",
-                "quantity": "sum",
-                "risk_percentage": lambda x: x.max() * 100,
-                "stop_loss": "max",
-                "setup": "first"
-            }
-    
-    if "entry_type" in df.columns:
-        df_cols += oth_fields
-        agg_dict["entry_type"] = "first"
-
-    df_agg_trades = (
-        df[df_cols]
-        .groupby(["symbol", "entry_date"])
-        .agg(agg_dict)
-        .reset_index()
-    )
-
-    logging.info(f"Processing {len(df_agg_trades)} rows")
-    # print(df_agg_trades)
-
-    for index, row in df_agg_trades.iterrows():
-        try:
-            trade_id = insert_trade(
-                symbol=row["symbol"],
-                setup=row["setup"],
-                entry_date=row["entry_date"],
-                entry_price=float(row["entry_price"]),
-                quantity=int(row["quantity"]),
-                risk_percentage=float(row["risk_percentage"]),
-                stop_loss=float(row["stop_loss"]),
-                entry_type=row.get("entry_type", None),
-            )
-            inserted_trades.append((trade_id, index, row["symbol"], row["entry_date"]))
-            logging.info(
-                f"Inserted trade: {trade_id} {index} {row['symbol']} {row['entry_date']}"
-            )
-        except Exception as e:
-            logging.error(
-                f"Error inserting trade {row['symbol']} {row['entry_date']}: {e}"
-            )
-            not_inserted_trades.append(
-                (index, row["symbol"], row["entry_date"], str(e))
-            )
+def job_progress(job):
+    if job["status"] not in ("queued", "running"):
+        color = {"completed": "success", "cancelled": "warning"}.get(
+            job["status"], "danger"
+        )
+        return 100, job["status"].title(), color, False
+    if job.get("stage") == "finalizing" and job.get("total_trades"):
+        done = job["trades"] / job["total_trades"]
+        label = f"Inserting trades {job['trades']:,} of {job['total_trades']:,}"
+        return round(done * 100), label, "primary", True
+    label = "Queued" if job.get("stage") == "queued" else "Reading file"
+    return 100, label, "info", True
 
-    if not_inserted_trades:
-        logging.error(f"Error inserting trades: {not_inserted_trades}")
-        for trade_id, _, _, _ in inserted_trades:
-            delete_trade(trade_id)
-        return f"Error inserting Following trades:\n {not_inserted_trades}"
 
-    trades = pd.DataFrame(
-        inserted_trades, columns=["trade_id", "index", "symbol", "entry_date"]
+@callback(
+    Output("import-progress", "value"),
+    Output("import-progress", "label"),
+    Output("import-progress", "color"),
+    Output("import-progress", "animated"),
+    Output("import-progress", "striped"),
+    Output("import-job-status", "children"),
+    Output("import-job-panel", "style"),
+    Output("cancel-import", "disabled"),
+    Output("import-job-poll", "disabled"),
+    Output("import-job-history", "children"),
+    Input("import-job-poll", "n_intervals"),
+    Input("import-job-id", "data"),
+    State("import-job-panel", "style"),
+)
+def poll_import_job(n_intervals, job_id, panel_style):
+    job = get_import_runner().status(job_id) if job_id else None
+    if job is None:
+        hidden = {**panel_style, "display": "none"}
+        history = job_history_table()
+        return 0, "", "primary", False, False, "", hidden, True, True, history
+
+    value, label, color, running = job_progress(job)
+    status = (
+        f"{job['file_name']} - Rows parsed: {job['rows']:,} | "
+        f"Trades inserted: {job['trades']:,} | Exits allocated: {job['exits']:,}"
     )
-
-    df_trades = trades.merge(df, on=["symbol", "entry_date"], how="inner").query(
-        "exit_date.notnull()"
+    if not running:
+        status = f"{job['file_name']} - {job['message']}"
+    # Only the history table changes between polls when nothing is running
+    history = job_history_table() if not running else no_update
+    return (
+        value,
+        label,
+        color,
+        running,
+        running,
+        status,
+        {**panel_style, "display": "block"},
+        not running,
+        not running,
+        history,
     )
 
-    if df_trades.empty:
-        logging.warning("No Closed trade found.")
-        return f"File uploaded successfully! {len(inserted_trades)} trades inserted."
 
-    df_exits_agg = (
-        df_trades.groupby(["trade_id", "exit_date"])
-        .agg(
-            {
-                "exit_price": "first",
-                "quantity": "sum",
-            }
-        )
-        .reset_index()
-    )
-
-    failed_exits = []
-    for index, row in df_exits_agg.iterrows():
-        try:
-            result = insert_exit(
-                trade_id=row["trade_id"],
-                exit_price=row["exit_price"],
-                quantity=row["quantity"],
-                exit_date=row["exit_date"],
-                exit_type=None,
-            )
-            if not result:
-                failed_exits.append(row["trade_id"])
-        except Exception as e:
-            logging.error(f"Error inserting exit for trade {row['trade_id']}: {e}")
-            failed_exits.append(row["trade_id"])
-    if failed_exits:
-        logging.error(f"Failed to insert exits for trades: {failed_exits}")
-        for trade_id, _, _, _ in inserted_trades:
-            delete_trade(trade_id)
-        return f"Error inserting Exit details for trades:\n {failed_exits}"
-    return f"File uploaded successfully! {len(inserted_trades)} trades inserted."
+# The import rolls back at its next chunk or batch; polling reports the outcome
+@callback(
+    Input("cancel-import", "n_clicks"),
+    State("import-job-id", "data"),
+    prevent_initial_call=True,
+)
+def cancel_import(n_clicks, job_id):
+    if n_clicks and job_id and get_import_runner().cancel(job_id):
+        set_props("cancel-import", {"disabled": True})
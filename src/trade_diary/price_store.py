@@ -0,0 +1,208 @@
+import logging
+import os
+import threading
+from datetime import timedelta
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import src.trade_diary.config as config
+
+
+# Daily OHLCV per symbol, one raw little-endian file per column under
+# <root>/<SYMBOL>/. Files are read through np.memmap and new days are appended to
+# the end of each file, so neither reads nor appends load the whole history.
+ohlcv_columns = {
+    "date": "<i4",  # days since 1970-01-01
+    "open": "<f8",
+    "high": "<f8",
+    "low": "<f8",
+    "close": "<f8",
+    "volume": "<i8",
+}
+
+
+def _to_days(dates):
+    dates = pd.to_datetime(pd.Series(dates)).to_numpy()
+    return dates.astype("datetime64[D]").astype("<i4")
+
+
+def _to_day(value):
+    return np.datetime64(pd.Timestamp(value), "D").astype("<i4")
+
+
+def _normalize(frame):
+    missing = set(ohlcv_columns) - set(frame.columns)
+    if missing:
+        raise ValueError(f"Price data is missing columns: {sorted(missing)}")
+    frame = pd.DataFrame(
+        {
+            "date": _to_days(frame["date"]),
+            **{
+                col: frame[col].to_numpy(dtype=dtype)
+                for col, dtype in ohlcv_columns.items()
+                if col != "date"
+            },
+        }
+    )
+    return frame.drop_duplicates("date", keep="last").sort_values("date")
+
+
+class PriceStore:
+    def __init__(self, root):
+        self.root = Path(root)
+        self._lock = threading.Lock()
+        self._maps = {}
+
+    def _symbol_dir(self, symbol):
+        if not symbol or os.sep in symbol or symbol.startswith("."):
+            raise ValueError(f"Invalid symbol for price store: {symbol!r}")
+        return self.root / symbol.upper()
+
+    # Maps are reused until the file changes size or is replaced
+    def _column(self, symbol, col):
+        path = self._symbol_dir(symbol) / f"{col}.bin"
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            stat = None
+        if stat is None or stat.st_size == 0:
+            return np.empty(0, dtype=ohlcv_columns[col])
+
+        version = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+        cached = self._maps.get(path)
+        if cached is None or cached[0] != version:
+            cached = (version, np.memmap(path, dtype=ohlcv_columns[col], mode="r"))
+            self._maps[path] = cached
+        return cached[1]
+
+    # An interrupted append can leave some columns longer than others; rows past the
+    # shortest column are ignored until the next write repairs them
+    def _length(self, symbol):
+        return min(len(self._column(symbol, col)) for col in ohlcv_columns)
+
+    def symbols(self):
+        if not self.root.exists():
+            return []
+        return sorted(p.name for p in self.root.iterdir() if p.is_dir())
+
+    def date_range(self, symbol):
+        n = self._length(symbol)
+        if n == 0:
+            return None
+        dates = self._column(symbol, "date")
+        return (
+            np.datetime64(int(dates[0]), "D").astype(object),
+            np.datetime64(int(dates[n - 1]), "D").astype(object),
+        )
+
+    # Stored days as day numbers since 1970-01-01, in order
+    def days(self, symbol):
+        return self._column(symbol, "date")[: self._length(symbol)]
+
+    def read(self, symbol, start=None, end=None, columns=None):
+        columns = columns or [c for c in ohlcv_columns if c != "date"]
+        n = self._length(symbol)
+        dates = self._column(symbol, "date")[:n]
+        lo = 0 if start is None else np.searchsorted(dates, _to_day(start), "left")
+        hi = n if end is None else np.searchsorted(dates, _to_day(end), "right")
+        return pd.DataFrame(
+            {col: np.array(self._column(symbol, col)[lo:hi]) for col in columns},
+            index=pd.DatetimeIndex(
+                np.array(dates[lo:hi]).astype("datetime64[D]"), name="date"
+            ),
+        )
+
+    def _write_columns(self, symbol, frame, mode):
+        symbol_dir = self._symbol_dir(symbol)
+        symbol_dir.mkdir(parents=True, exist_ok=True)
+        # date is written last so a partial append never exposes a date without prices
+        for col in [c for c in ohlcv_columns if c != "date"] + ["date"]:
+            path = symbol_dir / f"{col}.bin"
+            if mode == "replace":
+                tmp = path.with_suffix(".tmp")
+                frame[col].to_numpy(dtype=ohlcv_columns[col]).tofile(tmp)
+                os.replace(tmp, path)
+            else:
+                with open(path, "ab") as f:
+                    f.write(frame[col].to_numpy(dtype=ohlcv_columns[col]).tobytes())
+
+    # Appends the days after the stored history. Days that overlap or precede it
+    # are merged in with a one-off rewrite of the symbol's files.
+    def append(self, symbol, frame):
+        frame = _normalize(frame)
+        if frame.empty:
+            return 0
+        with self._lock:
+            n = self._length(symbol)
+            dates = self._column(symbol, "date")
+            if n == 0 or frame["date"].iloc[0] > dates[n - 1]:
+                torn = any(len(self._column(symbol, c)) != n for c in ohlcv_columns)
+                if torn:
+                    self._rewrite(symbol, frame, n)
+                else:
+                    self._write_columns(symbol, frame, "append")
+                return len(frame)
+
+            new_days = ~np.isin(frame["date"].to_numpy(), dates[:n])
+            self._rewrite(symbol, frame, n)
+            return int(new_days.sum())
+
+    def _rewrite(self, symbol, frame, n):
+        stored = pd.DataFrame(
+            {col: np.array(self._column(symbol, col)[:n]) for col in ohlcv_columns}
+        )
+        merged = (
+            pd.concat([stored, frame], ignore_index=True)
+            .drop_duplicates("date", keep="last")
+            .sort_values("date")
+        )
+        self._write_columns(symbol, merged, "replace")
+
+    def missing_ranges(self, symbol, start, end):
+        stored = self.date_range(symbol)
+        if stored is None:
+            return [(start, end)]
+        ranges = []
+        if start < stored[0]:
+            ranges.append((start, stored[0] - timedelta(days=1)))
+        if end > stored[1]:
+            ranges.append((stored[1] + timedelta(days=1), end))
+        return ranges
+
+    # Fills only the date ranges not already stored; fetch(symbol, start, end) must
+    # return a frame with the OHLCV columns
+    def update(self, symbol, fetch, start, end):
+        added = 0
+        for range_start, range_end in self.missing_ranges(symbol, start, end):
+            frame = fetch(symbol, range_start, range_end)
+            if frame is not None and not frame.empty:
+                added += self.append(symbol, frame)
+        return added
+
+    # Loads local CSV dumps with date, open, high, low, close and volume columns,
+    # plus symbol unless the file holds a single symbol.
+    def ingest_csv(self, path, symbol=None, chunksize=100000):
+        added = 0
+        for chunk in pd.read_csv(path, chunksize=chunksize):
+            chunk.columns = [c.strip().lower() for c in chunk.columns]
+            if symbol is not None:
+                added += self.append(symbol, chunk)
+                continue
+            if "symbol" not in chunk.columns:
+                raise ValueError(f"{path} has no symbol column; pass symbol=")
+            for chunk_symbol, rows in chunk.groupby("symbol", sort=False):
+                added += self.append(str(chunk_symbol), rows)
+        logging.info(f"Ingested {added} new price rows from {path}")
+        return added
+
+
+_store = None
+
+
+def get_price_store():
+    global _store
+    if _store is None:
+        _store = PriceStore(config.PRICE_STORE_PATH)
+    return _store
@@ -0,0 +1,185 @@
+import logging
+import threading
+import time
+from abc import ABC, abstractmethod
+from datetime import timedelta
+from pathlib import Path
+
+import pandas as pd
+
+import src.trade_diary.config as config
+
+
+class PriceProvider(ABC):
+    # Returns {symbol: last close} for as many of symbols as it can price
+    @abstractmethod
+    def fetch(self, symbols):
+        pass
+
+
+class YFinanceProvider(PriceProvider):
+    def __init__(self, symbol_suffix=""):
+        self.symbol_suffix = symbol_suffix
+
+    def fetch(self, symbols):
+        import yfinance as yf
+
+        tickers = {f"{symbol}{self.symbol_suffix}": symbol for symbol in symbols}
+        data = yf.download(
+            tickers=" ".join(tickers),
+            period="5d",
+            interval="1d",
+            group_by="column",
+            progress=False,
+            threads=False,
+        )
+        if data.empty:
+            return {}
+
+        closes = data["Close"]
+        if isinstance(closes, pd.Series):
+            closes = closes.to_frame(next(iter(tickers)))
+        last_closes = closes.ffill().iloc[-1].dropna()
+        return {
+            tickers[ticker]: round(float(close), 2)
+            for ticker, close in last_closes.items()
+            if ticker in tickers
+        }
+
+    # Daily OHLCV between start and end inclusive, in the price store's layout
+    def fetch_history(self, symbol, start, end):
+        import yfinance as yf
+
+        data = yf.Ticker(f"{symbol}{self.symbol_suffix}").history(
+            start=start, end=end + timedelta(days=1), interval="1d", auto_adjust=False
+        )
+        if data.empty:
+            return None
+        data = data.rename(columns=str.lower)
+        return data.assign(date=data.index.tz_localize(None).normalize())[
+            ["date", "open", "high", "low", "close", "volume"]
+        ]
+
+
+# Offline provider for testing and for journals kept without network access. The
+# file needs symbol and close columns; with a date column the latest row wins.
+class CSVProvider(PriceProvider):
+    def __init__(self, path):
+        self.path = Path(path)
+
+    def fetch(self, symbols):
+        prices = pd.read_csv(self.path)
+        if "date" in prices.columns:
+            prices = prices.sort_values("date", kind="stable")
+        last_closes = prices.groupby("symbol")["close"].last()
+        return last_closes.reindex(list(symbols)).dropna().round(2).to_dict()
+
+
+# Keeps last closes for the watched symbols fresh from a background thread. Readers
+# only ever see the cache: a symbol without a fresh price is registered for the
+# next batch and reported as missing, so no callback waits on the network.
+class PriceService:
+    def __init__(self, provider, ttl_seconds=900, refresh_seconds=60):
+        self.provider = provider
+        self.ttl_seconds = ttl_seconds
+        self.refresh_seconds = refresh_seconds
+        self._prices = {}
+        self._watched = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="price-service", daemon=True
+        )
+        self._thread.start()
+        logging.info(f"Price service started with {type(self.provider).__name__}")
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _stale(self, now):
+        return [
+            symbol
+            for symbol in self._watched
+            if symbol not in self._prices
+            or now - self._prices[symbol][1] > self.ttl_seconds
+        ]
+
+    def refresh(self):
+        with self._lock:
+            symbols = sorted(self._stale(time.time()))
+        if not symbols:
+            return 0
+        try:
+            prices = self.provider.fetch(symbols)
+        except Exception as e:
+            logging.error(f"Error fetching prices for {len(symbols)} symbols: {e}")
+            return 0
+        fetched_at = time.time()
+        with self._lock:
+            for symbol, price in prices.items():
+                self._prices[symbol] = (price, fetched_at)
+        logging.debug(f"Fetched prices for {len(prices)} of {len(symbols)} symbols")
+        return len(prices)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.refresh()
+            self._wake.wait(self.refresh_seconds)
+            self._wake.clear()
+
+    def get_prices(self, symbols):
+        now = time.time()
+        prices = {}
+        with self._lock:
+            self._watched.update(symbols)
+            for symbol in symbols:
+                cached = self._prices.get(symbol)
+                if cached and now - cached[1] <= self.ttl_seconds:
+                    prices[symbol] = cached[0]
+        if len(prices) < len(set(symbols)):
+            self._wake.set()
+        return prices
+
+
+def create_provider(name, **options):
+    if name == "yfinance":
+        return YFinanceProvider(options.get("symbol_suffix", ""))
+    if name == "csv":
+        return CSVProvider(options["csv_path"])
+    raise ValueError(f"Unknown price provider: {name}")
+
+
+_service = None
+
+
+def get_price_service():
+    global _service
+    if _service is None and config.PRICES_ENABLED:
+        provider = create_provider(
+            config.PRICES_PROVIDER,
+            symbol_suffix=config.PRICES_SYMBOL_SUFFIX,
+            csv_path=config.PRICES_CSV_PATH,
+        )
+        _service = PriceService(
+            provider, config.PRICES_TTL_SECONDS, config.PRICES_REFRESH_SECONDS
+        )
+        _service.start()
+    return _service
+
+
+def get_current_prices(symbols):
+    service = get_price_service()
+    if service is None:
+        return {}
+    return service.get_prices(symbols)
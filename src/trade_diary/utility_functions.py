@@ -1,70 +1,97 @@
-# import yfinance as yf
-# def fetch_current_prices(symbols):
-#     tickers = " ".join(symbols.unique())
-#     try :
-#         data = yf.download(tickers=tickers, period="1d", interval="1d", progress=False,keepna=True)
-#     except Exception as e:
-#         logging.error(f"Error fetching data from Yahoo Finance: {e}")
-#         return pd.Series(index = symbols)
-#     if data.empty:
-#         return pd.Series(index = symbols)
-
-#     prices = pd.Series(index=symbols, dtype=float)
-#     for symbol in symbols:
-#         try:
-#             # Get the last available close price
-#             last_price = data['Close'][symbol].dropna().iloc[-1]
-#             prices[symbol] = last_price
-#         except Exception:
-#             prices[symbol] = None
-#     return prices.round(2)
-
+import bisect
+import logging
 import numpy as np
 import pandas as pd
-from datetime import datetime
+from datetime import date, datetime
+
+from .prices import get_current_prices
 
 
 charges = {
     "brokerage": {"intraday": 0.0003, "delivery": 0},
+    "brokerage_cap": {"intraday": 20, "delivery": 20},
     "stt": {"intraday": 0.00025, "delivery": 0.001},
     "transaction_tax": {"intraday": 0.0000307, "delivery": 0.0000307},
     "sebi_charges": {"intraday": 10 / 10000000, "delivery": 10 / 10000000},
     "stamp_duty": {"intraday": 0.00003, "delivery": 0.00015},
+    "dp_charges": {"intraday": 0, "delivery": 15.34},
     "gst": 0.18,
 }
 
+# Rate tables by the date they take effect. A trade leg is charged with the table in
+# force on its exit date, so appending a new (date, rates) pair only affects exits
+# from that date on.
+charge_schedule = [
+    (date(1900, 1, 1), charges),
+]
+
+
+def _to_days(dates):
+    return pd.to_datetime(pd.Series(dates)).to_numpy().astype("datetime64[D]")
+
+
+def _schedule_rates(schedule, table_idx, intraday, name):
+    if name == "gst":
+        return np.array([rates["gst"] for _, rates in schedule])[table_idx]
+    intraday_rates = np.array([rates[name]["intraday"] for _, rates in schedule])
+    delivery_rates = np.array([rates[name]["delivery"] for _, rates in schedule])
+    return np.where(intraday, intraday_rates[table_idx], delivery_rates[table_idx])
 
-def calculate_charges(entry_date, exit_date, buy_amount, sell_amount):
-    trade_type = "intraday" if entry_date == exit_date else "delivery"
-    turnover = buy_amount + sell_amount
 
-    brokerage = min(charges["brokerage"][trade_type] * buy_amount, 20) + min(
-        charges["brokerage"][trade_type] * sell_amount, 20
+def calculate_charges_vectorized(
+    entry_dates, exit_dates, buy_amounts, sell_amounts, schedule=None
+):
+    schedule = sorted(schedule or charge_schedule, key=lambda x: x[0])
+    entry_days = _to_days(entry_dates)
+    exit_days = _to_days(exit_dates)
+    buy_amounts = np.asarray(buy_amounts, dtype="float64")
+    sell_amounts = np.asarray(sell_amounts, dtype="float64")
+
+    effective_from = np.array([d for d, _ in schedule], dtype="datetime64[D]")
+    table_idx = np.searchsorted(effective_from, exit_days, side="right") - 1
+    if (table_idx < 0).any():
+        raise ValueError("Exit date before the first charge schedule entry")
+
+    intraday = entry_days == exit_days
+
+    def rate(name):
+        return _schedule_rates(schedule, table_idx, intraday, name)
+
+    turnover = buy_amounts + sell_amounts
+
+    brokerage_cap = rate("brokerage_cap")
+    brokerage = np.minimum(rate("brokerage") * buy_amounts, brokerage_cap) + np.minimum(
+        rate("brokerage") * sell_amounts, brokerage_cap
     )
-    stt = (
-        charges["stt"][trade_type] * sell_amount
-        if trade_type == "intraday"
-        else charges["stt"][trade_type] * turnover
+    stt = rate("stt") * np.where(intraday, sell_amounts, turnover)
+    transaction_tax = rate("transaction_tax") * buy_amounts + (
+        rate("transaction_tax") * sell_amounts
     )
-    transaction_tax = (
-        charges["transaction_tax"][trade_type] * buy_amount
-        + charges["transaction_tax"][trade_type] * sell_amount
+    sebi_charges = rate("sebi_charges") * turnover
+    stamp_duty = rate("stamp_duty") * buy_amounts
+    gst = (brokerage + transaction_tax + sebi_charges) * rate("gst")
+
+    return (
+        brokerage
+        + stt
+        + transaction_tax
+        + sebi_charges
+        + stamp_duty
+        + gst
+        + rate("dp_charges")
     )
-    sebi_charges = charges["sebi_charges"][trade_type] * turnover
-    stamp_duty = charges["stamp_duty"][trade_type] * buy_amount
-    gst = (brokerage + transaction_tax + sebi_charges) * charges["gst"]
-    dp_charges = 15.34 if trade_type == "delivery" else 0
 
-    total_charges = (
-        brokerage + stt + transaction_tax + sebi_charges + stamp_duty + gst + dp_charges
+
+def calculate_charges(entry_date, exit_date, buy_amount, sell_amount):
+    return float(
+        calculate_charges_vectorized(
+            [entry_date], [exit_date], [buy_amount], [sell_amount]
+        )[0]
     )
-    # print(f"Turnover: {turnover}, buy_amount: {buy_amount}, sell_amount: {sell_amount}")
-    # print(f"brokerage: {brokerage}, stt: {stt}, transaction_tax: {transaction_tax}, sebi_charges: {sebi_charges}, stamp_duty: {stamp_duty}, gst: {gst}, total_charges: {total_charges}")
-    return total_charges
 
 
 def get_entry_adjustment_details(entries, exit_date, exit_quantity, exit_price):
-    entries = entries.sort_values(by="entry_date", ascending=False)
+    entries = entries.sort_values(by="entry_date", ascending=False, kind="stable")
     adjust_entry_details = []
     remaining_exit_quantity = exit_quantity
 
@@ -105,29 +132,107 @@ def get_entry_adjustment_details(entries, exit_date, exit_quantity, exit_price):
     return adjust_entry_details
 
 
+# Allocates exits against entries of the same trade the way insert_exit does,
+# newest lot first, but only against lots entered on or before the exit date.
+# Returns one row per (entry, exit) pair with the allocated quantity, the remaining
+# quantity of every entry, and the trades whose exits could not be allocated. An
+# exit larger than the lots open on its date raises ValueError, or with
+# skip_invalid the whole trade is left out of the allocations and reported.
+def allocate_exits(entries, exits, key="trade_key", skip_invalid=False):
+    # Walked from the end: newest date first, earlier rows first within a day
+    entry_order = entries.assign(_pos=np.arange(len(entries))).sort_values(
+        [key, "entry_date", "_pos"], ascending=[True, True, False]
+    )
+    exit_order = exits.assign(_pos=np.arange(len(exits))).sort_values(
+        [key, "exit_date", "_pos"]
+    )
+
+    remaining = dict(zip(entries.index, entries["remaining_quantity"]))
+    # Lots are contiguous per trade after the sort, so each trade is one slice
+    trade_keys = entry_order[key].to_numpy()
+    new_trade = np.ones(len(trade_keys), dtype=bool)
+    new_trade[1:] = trade_keys[1:] != trade_keys[:-1]
+    starts = np.flatnonzero(new_trade)
+    ends = np.append(starts[1:], len(trade_keys))
+    entry_ids = entry_order.index.to_numpy()
+    entry_dates = entry_order["entry_date"].to_numpy()
+    lots_by_trade = {
+        trade_keys[start]: (entry_ids[start:end], entry_dates[start:end])
+        for start, end in zip(starts, ends)
+    }
+
+    allocations, invalid = [], []
+    # Exits are contiguous per trade too, so a trade's allocations are kept apart
+    # until its last exit and can be dropped if one of them does not fit
+    trade_allocations, current = [], None
+    for exit_idx, trade, exit_date, quantity in zip(
+        exit_order.index,
+        exit_order[key],
+        exit_order["exit_date"],
+        exit_order["quantity"],
+    ):
+        if trade != current:
+            allocations.extend(trade_allocations)
+            trade_allocations, current = [], trade
+        elif invalid and invalid[-1] == trade:
+            continue
+        lot_ids, lot_dates = lots_by_trade.get(trade, ([], []))
+        to_allocate = quantity
+        j = bisect.bisect_right(lot_dates, exit_date) - 1
+        while to_allocate > 0 and j >= 0:
+            entry_idx = lot_ids[j]
+            considered_qty = min(remaining[entry_idx], to_allocate)
+            if considered_qty > 0:
+                remaining[entry_idx] -= considered_qty
+                to_allocate -= considered_qty
+                trade_allocations.append((entry_idx, exit_idx, considered_qty))
+            j -= 1
+        if to_allocate > 0:
+            message = (
+                f"Exit of {quantity} on {exit_date} exceeds open position for trade {trade}"
+            )
+            if not skip_invalid:
+                raise ValueError(message)
+            logging.warning(f"{message}; skipping the trade")
+            for entry_idx, _, considered_qty in trade_allocations:
+                remaining[entry_idx] += considered_qty
+            trade_allocations = []
+            invalid.append(trade)
+    allocations.extend(trade_allocations)
+
+    allocations = pd.DataFrame(
+        allocations, columns=["entry_idx", "exit_idx", "quantity"]
+    )
+    return allocations, pd.Series(remaining, name="remaining_quantity"), invalid
+
+
+def allocation_charges(allocations):
+    return calculate_charges_vectorized(
+        allocations["entry_date"],
+        allocations["exit_date"],
+        allocations["quantity"] * allocations["entry_price"],
+        allocations["quantity"] * allocations["exit_price"],
+    )
+
+
 def add_additional_columns(trades):
     if trades is None or trades.empty:
         return trades
 
+    # avg_entry_price, days_held and status are computed in SQL so the grid can sort
+    # on them
     trades.index = trades["symbol"]
-    trades["avg_entry_price"] = (
-        trades["total_buy_amount"] / trades["total_quantity"]
-    ).round(2)
-    trades["days_held"] = np.where(
-        trades["total_open_position"] > 0,
-        (datetime.now() - pd.to_datetime(trades["initial_entry_date"])).dt.days,
-        (
-            pd.to_datetime(trades["last_exit_date"])
-            - pd.to_datetime(trades["initial_entry_date"])
-        ).dt.days,
-    )
-    trades["status"] = np.where(trades["total_open_position"] > 0, "Open", "Closed")
-
-    # trades['initial_entry_date'] = pd.to_datetime(trades['initial_entry_date']).dt.strftime('%Y-%m-%d')
 
-    # to fetch current price from yahoo finance
-    # current_close = fetch_current_prices(trades['symbol']).rename('current_close')
-    # trades = trades.join(current_close)
+    # Prices come from the background price service cache and are missing until its
+    # first refresh, so this never waits on the network
+    open_symbols = trades.loc[trades["total_open_position"] > 0, "symbol"].unique()
+    prices = get_current_prices(list(open_symbols))
+    trades["current_close"] = trades["symbol"].map(prices).astype(float)
+    trades.loc[trades["total_open_position"] <= 0, "current_close"] = np.nan
+    trades["unrealized_pl"] = (
+        (trades["current_close"] - trades["open_entry_price"])
+        * trades["total_open_position"]
+    ).round(2)
 
     return trades
 
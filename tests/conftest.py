@@ -0,0 +1,84 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import src.trade_diary.db_interface as db_interface
+
+
+def close_database():
+    if db_interface._engine is not None:
+        db_interface._engine.dispose()
+    db_interface._engine = None
+    db_interface._SessionMaker = None
+
+
+# Opens and migrates a database file in place of the one open before
+@pytest.fixture
+def open_database():
+    def open_database(path):
+        close_database()
+        return db_interface.init_db(f"sqlite:///{path}")
+
+    yield open_database
+    close_database()
+
+
+# Each test runs against its own database file; the configured one is never opened
+@pytest.fixture
+def database(tmp_path, open_database):
+    return open_database(tmp_path / "test.db")
+
+
+# A book of closed and open trades written through bulk_import, so exit amounts and
+# charges carry the four decimals real exits do. Pyramids have up to three lots and
+# exits are partial, at two-decimal prices, over two financial years.
+@pytest.fixture
+def book(database):
+    rng = np.random.default_rng(11)
+    n_trades = 3000
+    start = pd.Timestamp("2023-04-01")
+    entry_days = rng.integers(0, 700, n_trades)
+    n_entries = rng.choice([1, 1, 2, 3], n_trades)
+    trade_key = np.repeat(np.arange(n_trades), n_entries)
+    lot = np.concatenate([np.arange(n) for n in n_entries])
+    price = rng.uniform(20, 3000, n_trades).round(2)
+    entries = pd.DataFrame(
+        {
+            "trade_key": trade_key,
+            "entry_date": start + pd.to_timedelta(entry_days[trade_key] + lot, "D"),
+            "entry_price": (price[trade_key] * (1 + 0.013 * lot)).round(2),
+            "quantity": rng.integers(1, 400, len(trade_key)),
+            "risk_percentage": rng.choice([0.25, 0.5, 0.75, 1.0], len(trade_key)),
+            "stop_loss": (price[trade_key] * 0.93).round(2),
+        }
+    )
+    quantity = entries.groupby("trade_key")["quantity"].sum().to_numpy()
+    # The rest exit in one or two legs; a tenth of the trades stay open, some of
+    # them with the first of two legs taken
+    closed = rng.random(n_trades) >= 0.1
+    first = np.where(rng.random(n_trades) < 0.5, quantity, quantity // 2)
+    held = rng.integers(3, 90, n_trades)
+    legs = [
+        pd.DataFrame(
+            {
+                "trade_key": np.arange(n_trades),
+                "exit_date": start + pd.to_timedelta(entry_days + held + day, "D"),
+                "exit_price": (price * rng.uniform(0.85, 1.3, n_trades)).round(2),
+                "quantity": qty,
+            }
+        )
+        for day, qty in ((0, first), (5, quantity - first))
+    ]
+    exits = pd.concat(legs, keys=["first", "second"]).reset_index(level=0)
+    partial = (exits["level_0"] == "first") & (first < quantity)[exits["trade_key"]]
+    keep = closed[exits["trade_key"]] | partial
+    exits = exits[keep & (exits["quantity"] > 0)].drop(columns="level_0")
+    trades = pd.DataFrame(
+        {
+            "trade_key": np.arange(n_trades),
+            "symbol": [f"SYM{i % 300:03d}" for i in range(n_trades)],
+            "setup": rng.choice(["BREAKOUT", "PULLBACK", "REVERSAL"], n_trades),
+        }
+    )
+    assert db_interface.bulk_import(trades, entries, exits) is not None
+    return database
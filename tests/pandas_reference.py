@@ -0,0 +1,124 @@
+## The stats pipeline as the Statistics page ran it in pandas, before the per-trade
+## numbers moved into SQL and the summaries into one groupby. The tests compare the
+## current code against it.
+
+from functools import reduce
+
+import numpy as np
+import pandas as pd
+
+from src.trade_diary.db_interface import get_all_entries, get_all_exits, get_all_trades
+
+
+# The per-trade numbers as the stats page computed them in pandas before
+# get_trade_stats moved them into SQL
+def reference_stats(financial_year):
+    entries = get_all_entries(financial_year)
+    entries["entry_amount"] = entries["entry_price"] * entries["quantity"]
+    entries["risked_amount"] = entries["quantity"] * (
+        entries["entry_price"] - entries["stop_loss"]
+    )
+    entries_agg = (
+        entries.groupby("trade_id")
+        .agg(
+            {
+                "entry_amount": "sum",
+                "quantity": "sum",
+                "risk_percentage": "sum",
+                "exit_amount": "sum",
+                "charges": "sum",
+                "risked_amount": "sum",
+            }
+        )
+        .reset_index()
+    )
+    entries_agg["gross_pl"] = (
+        entries_agg["exit_amount"] - entries_agg["entry_amount"]
+    ).round(2)
+    entries_agg["net_pl"] = (entries_agg["gross_pl"] - entries_agg["charges"]).round(2)
+    entries_agg["net_pl_percentage"] = (
+        (entries_agg["net_pl"] / entries_agg["entry_amount"]) * 100
+    ).round(2)
+    entries_agg["gross_R"] = (
+        entries_agg["net_pl"] / entries_agg["risked_amount"]
+    ).round(2)
+    entries_agg["net_R"] = (
+        entries_agg["risk_percentage"] * entries_agg["gross_R"]
+    ).round(2)
+    entries_agg["win"] = entries_agg["net_pl"].apply(lambda x: 1 if x > 0 else 0)
+
+    exits = get_all_exits(financial_year)
+    exits_agg = exits.groupby("trade_id").agg(exit_date=("exit_date", "max"))
+
+    trades = get_all_trades(financial_year)
+    trades = reduce(
+        lambda left, right: pd.merge(left, right, on="trade_id", how="inner"),
+        [trades, entries_agg, exits_agg.reset_index()],
+    )
+    holding = trades["exit_date"] - trades["initial_entry_date"]
+    trades["holding_days"] = holding.dt.days
+    return trades.set_index("trade_id").sort_index()
+
+
+# The per-group loop with Python lambdas that group_summaries replaced
+def reference_summaries(trades, groupers, summary_columns):
+    display_dfs = {}
+    for name, grouper in groupers.items():
+        display_df = (
+            trades.groupby(grouper, observed=True)
+            .agg(
+                **{
+                    "sdate": ("initial_entry_date", "min"),
+                    "Total Trades": ("initial_entry_date", "count"),
+                    "Wins": ("win", "sum"),
+                    "Losses": ("win", lambda x: x.count() - x.sum()),
+                    "Gross R": ("gross_R", "sum"),
+                    "Net R": ("net_R", "sum"),
+                    "Win %": ("win", lambda x: x.mean() * 100),
+                    "Win Avg": ("net_pl_percentage", lambda x: x[x > 0].mean()),
+                    "Loss Avg": (
+                        "net_pl_percentage",
+                        lambda x: (x[x <= 0].mean()) * -1,
+                    ),
+                    "Max Win": ("net_pl_percentage", lambda x: x[x > 0].max()),
+                    "Max Loss": ("net_pl_percentage", lambda x: (x[x <= 0].min()) * -1),
+                    "Max R": ("net_R", "max"),
+                    "Min R": ("net_R", "min"),
+                    "Avg Win Days": ("no_of_days_win", "mean"),
+                    "Avg Loss Days": ("no_of_days_loss", "mean"),
+                }
+            )
+            .sort_values(by="sdate")
+        )
+
+        display_df["RR"] = np.where(
+            display_df["Loss Avg"] == 0,
+            0,
+            (display_df["Win Avg"] / display_df["Loss Avg"]),
+        )
+        display_df["AWLR"] = np.where(
+            display_df["Loss Avg"] == 0,
+            0,
+            (
+                (display_df["Win %"] * display_df["Win Avg"])
+                / ((100 - display_df["Win %"]) * display_df["Loss Avg"])
+            ),
+        )
+        for col in display_df.select_dtypes(include=[float]).columns:
+            display_df[col] = display_df[col].round(2)
+
+        display_df["Win %"] = np.ceil(display_df["Win %"]).fillna(0).astype("int")
+        display_df["Avg Win Days"] = (
+            np.ceil(display_df["Avg Win Days"]).fillna(0).astype("int")
+        )
+        display_df["Avg Loss Days"] = (
+            np.ceil(display_df["Avg Loss Days"]).fillna(0).astype("int")
+        )
+
+        display_dfs[name] = (
+            display_df.drop("sdate", axis=1)
+            .reindex(columns=summary_columns)
+            .reset_index()
+            .rename(columns={grouper: name})
+        )
+    return display_dfs
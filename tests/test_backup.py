@@ -0,0 +1,150 @@
+import gzip
+import json
+import sqlite3
+from datetime import date
+
+import pytest
+
+import backup
+from src.trade_diary.db_interface import insert_exit, insert_trade
+
+
+def dump(path):
+    conn = sqlite3.connect(path)
+    try:
+        return list(conn.iterdump())
+    finally:
+        conn.close()
+
+
+@pytest.fixture
+def journal(database, tmp_path):
+    trade_id = insert_trade("AAA", 100.0, 10, date(2024, 5, 2), 1.0, 95.0, "BREAKOUT")
+    insert_exit(trade_id, 110.0, 10, date(2024, 5, 20), "Market")
+    return tmp_path / "test.db"
+
+
+@pytest.fixture
+def backup_day(monkeypatch):
+    def backup_day(day):
+        class Today(date):
+            @classmethod
+            def today(cls):
+                return day
+
+        monkeypatch.setattr(backup, "date", Today)
+
+    return backup_day
+
+
+def test_full_backup_is_a_compressed_consistent_snapshot(journal, tmp_path, backup_day):
+    backup_day(date(2025, 1, 31))
+    destination = backup.LocalDestination(tmp_path / "backups")
+    # A write transaction left open while the backup runs is not part of it
+    writer = sqlite3.connect(journal)
+    writer.execute("BEGIN IMMEDIATE")
+    writer.execute("UPDATE trades SET symbol = 'ZZZ'")
+    try:
+        assert backup.run_backup(journal, destination) == date(2025, 1, 31)
+    finally:
+        writer.rollback()
+        writer.close()
+
+    restored = tmp_path / "restored.db"
+    with gzip.open(tmp_path / "backups" / "trade_diary_backup_20250131.db.gz") as src:
+        restored.write_bytes(src.read())
+    assert dump(restored) == dump(journal)
+
+
+def test_missing_database_fails_the_backup(tmp_path):
+    destination = backup.LocalDestination(tmp_path / "backups")
+
+    assert backup.run_backup(tmp_path / "missing.db", destination) is None
+    assert destination.list_names() == []
+
+
+def test_rotation_keeps_recent_days_and_month_ends(tmp_path):
+    destination = backup.LocalDestination(tmp_path)
+    days = ["20241130", "20241215", "20241231", "20250105", "20250110", "20250111"]
+    for day in days:
+        destination.put(f"trade_diary_backup_{day}.db.gz", b"")
+    destination.put("notes.txt", b"")
+
+    deleted = backup.rotate_backups(destination, keep_daily=2, keep_monthly=2)
+
+    assert sorted(deleted) == [
+        "trade_diary_backup_20241130.db.gz",
+        "trade_diary_backup_20241215.db.gz",
+        "trade_diary_backup_20250105.db.gz",
+    ]
+    assert "notes.txt" in destination.list_names()
+
+
+def chunk_names(root):
+    return {p.name for p in (root / backup.chunk_folder).iterdir()}
+
+
+def test_incremental_backups_store_changed_chunks_and_restore_each_day(
+    journal, tmp_path, backup_day
+):
+    root = tmp_path / "backups"
+    destination = backup.LocalDestination(root)
+    backup_day(date(2025, 1, 30))
+    backup.run_backup(journal, destination, incremental=True, chunk_size=4096)
+    first_day = dump(journal)
+    first_chunks = chunk_names(root)
+
+    insert_trade("BBB", 250.0, 8, date(2024, 6, 3), 0.75, 240.0, "PULLBACK")
+    backup_day(date(2025, 1, 31))
+    backup.run_backup(journal, destination, incremental=True, chunk_size=4096)
+
+    added = chunk_names(root) - first_chunks
+    manifest = json.loads(
+        (root / "trade_diary_backup_20250131.manifest.json").read_bytes()
+    )
+    assert 0 < len(added) < len(manifest["chunks"])
+
+    assert backup.restore_backup(destination, "20250130", tmp_path / "a.db")
+    assert dump(tmp_path / "a.db") == first_day
+    assert backup.restore_backup(destination, "latest", tmp_path / "b.db") == "20250131"
+    assert dump(tmp_path / "b.db") == dump(journal)
+    assert backup.list_backups(destination) == [
+        ("20250131", ["manifest.json"]),
+        ("20250130", ["manifest.json"]),
+    ]
+
+
+def test_corrupt_chunk_fails_the_restore(journal, tmp_path, backup_day):
+    root = tmp_path / "backups"
+    destination = backup.LocalDestination(root)
+    backup_day(date(2025, 1, 31))
+    backup.run_backup(journal, destination, incremental=True, chunk_size=4096)
+    chunk = sorted((root / backup.chunk_folder).iterdir())[0]
+    chunk.write_bytes(gzip.compress(b"\0" * 4096))
+    target = tmp_path / "restored.db"
+    target.write_bytes(b"keep")
+
+    with pytest.raises(ValueError, match="is corrupt"):
+        backup.restore_backup(destination, "latest", target)
+
+    assert target.read_bytes() == b"keep"
+    assert [p.name for p in tmp_path.iterdir() if "partial" in p.name] == []
+
+
+def test_rotation_deletes_chunks_only_old_manifests_used(
+    journal, tmp_path, backup_day
+):
+    root = tmp_path / "backups"
+    destination = backup.LocalDestination(root)
+    for day in (date(2025, 1, 30), date(2025, 1, 31)):
+        backup_day(day)
+        backup.run_backup(journal, destination, incremental=True, chunk_size=4096)
+        insert_trade("BBB", 250.0, 8, date(2024, 6, 3), 0.75, 240.0, "PULLBACK")
+
+    backup.rotate_backups(destination, keep_daily=1, keep_monthly=1)
+
+    kept = json.loads(
+        (root / "trade_diary_backup_20250131.manifest.json").read_bytes()
+    )
+    assert chunk_names(root) == set(kept["chunks"])
+    assert backup.restore_backup(destination, "latest", tmp_path / "r.db")
@@ -0,0 +1,137 @@
+from datetime import date
+
+import pandas as pd
+import pytest
+from sqlalchemy import select
+
+import src.trade_diary.db_interface as db_interface
+from src.trade_diary.db_interface import (
+    Entry,
+    Exits,
+    Trade,
+    TradeSummary,
+    bulk_import,
+    get_write_generation,
+    insert_entry,
+    insert_exit,
+    insert_trade,
+)
+
+trades = pd.DataFrame(
+    {
+        "trade_key": [7, 3, 5],
+        "symbol": ["AAA", "BBB", "CCC"],
+        "setup": ["BREAKOUT", "PULLBACK", "REVERSAL"],
+    }
+)
+entries = pd.DataFrame(
+    {
+        "trade_key": [7, 7, 3, 5],
+        "entry_date": ["2024-05-02", "2024-05-06", "2024-06-03", "2024-07-01"],
+        "entry_price": [100.0, 104.35, 250.5, 42.0],
+        "quantity": [10, 10, 8, 100],
+        "risk_percentage": [1.0, 0.5, 0.75, 0.5],
+        "stop_loss": [95.0, 99.0, 240.0, 40.0],
+        "entry_type": [None, "Pyramid", None, None],
+    }
+)
+exits = pd.DataFrame(
+    {
+        "trade_key": [7, 7, 3],
+        "exit_date": ["2024-05-13", "2024-05-20", "2024-06-10"],
+        "exit_price": [108.0, 110.2, 262.75],
+        "quantity": [5, 15, 3],
+    }
+)
+
+
+def insert_one_by_one():
+    trade_ids = {}
+    for trade in trades.itertuples():
+        first = entries[entries["trade_key"] == trade.trade_key].iloc[0]
+        trade_ids[trade.trade_key] = insert_trade(
+            trade.symbol,
+            first["entry_price"],
+            int(first["quantity"]),
+            date.fromisoformat(first["entry_date"]),
+            first["risk_percentage"],
+            first["stop_loss"],
+            trade.setup,
+        )
+    for entry in entries[entries.duplicated("trade_key")].itertuples():
+        insert_entry(
+            trade_ids[entry.trade_key],
+            entry.entry_price,
+            entry.quantity,
+            date.fromisoformat(entry.entry_date),
+            entry.risk_percentage,
+            entry.entry_type,
+            entry.stop_loss,
+        )
+    for leg in exits.itertuples():
+        insert_exit(
+            trade_ids[leg.trade_key],
+            leg.exit_price,
+            leg.quantity,
+            date.fromisoformat(leg.exit_date),
+            "Market",
+        )
+
+
+def contents():
+    tables = {
+        "trades": select(Trade.symbol, Trade.setup, Trade.trade_closed).order_by(
+            Trade.trade_id
+        ),
+        "entries": select(
+            Entry.entry_date,
+            Entry.entry_price,
+            Entry.quantity,
+            Entry.remaining_quantity,
+            Entry.exit_amount,
+            Entry.charges,
+        ).order_by(Entry.trade_id, Entry.entry_date),
+        "exits": select(Exits.exit_date, Exits.exit_price, Exits.quantity).order_by(
+            Exits.trade_id, Exits.exit_date
+        ),
+        "summary": select(
+            *[c for c in TradeSummary.__table__.columns if c.name != "trade_id"]
+        ).order_by(TradeSummary.trade_id),
+    }
+    with db_interface.get_engine().connect() as conn:
+        return {name: conn.execute(stmt).all() for name, stmt in tables.items()}
+
+
+def test_bulk_import_writes_what_single_inserts_write(tmp_path, open_database):
+    open_database(tmp_path / "single.db")
+    insert_one_by_one()
+    expected = contents()
+
+    open_database(tmp_path / "bulk.db")
+    trade_ids = bulk_import(trades, entries, exits)
+
+    assert trade_ids == [1, 2, 3]
+    for name, rows in contents().items():
+        # Charges are rounded per exit by insert_exit and per lot by bulk_import
+        assert [tuple(row) for row in rows] == [
+            pytest.approx(tuple(row), abs=1e-4) for row in expected[name]
+        ]
+
+
+@pytest.mark.parametrize(
+    "exits_df",
+    [
+        # More than the position open on the exit date
+        exits.assign(quantity=[5, 16, 3]),
+        # An exit for a trade that is not in the batch
+        exits.assign(trade_key=[7, 7, 4]),
+        exits.drop(columns="exit_price"),
+    ],
+)
+def test_failed_bulk_import_writes_nothing(database, exits_df):
+    generation = get_write_generation()
+
+    assert bulk_import(trades, entries, exits_df) is None
+
+    assert contents() == {"trades": [], "entries": [], "exits": [], "summary": []}
+    assert get_write_generation() == generation
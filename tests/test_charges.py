@@ -0,0 +1,120 @@
+from datetime import date
+
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy import select
+
+import src.trade_diary.db_interface as db_interface
+from src.trade_diary.db_interface import (
+    Entry,
+    insert_entry,
+    insert_exit,
+    insert_trade,
+    recompute_charges,
+)
+from src.trade_diary.utility_functions import (
+    allocate_exits,
+    calculate_charges,
+    calculate_charges_vectorized,
+    charges,
+)
+
+
+# The per-leg formula calculate_charges used before it was vectorized
+def scalar_charges(entry_date, exit_date, buy_amount, sell_amount):
+    trade_type = "intraday" if entry_date == exit_date else "delivery"
+    turnover = buy_amount + sell_amount
+    brokerage = min(charges["brokerage"][trade_type] * buy_amount, 20) + min(
+        charges["brokerage"][trade_type] * sell_amount, 20
+    )
+    stt = (
+        charges["stt"][trade_type] * sell_amount
+        if trade_type == "intraday"
+        else charges["stt"][trade_type] * turnover
+    )
+    transaction_tax = (
+        charges["transaction_tax"][trade_type] * buy_amount
+        + charges["transaction_tax"][trade_type] * sell_amount
+    )
+    sebi_charges = charges["sebi_charges"][trade_type] * turnover
+    stamp_duty = charges["stamp_duty"][trade_type] * buy_amount
+    gst = (brokerage + transaction_tax + sebi_charges) * charges["gst"]
+    dp_charges = 15.34 if trade_type == "delivery" else 0
+    return (
+        brokerage + stt + transaction_tax + sebi_charges + stamp_duty + gst + dp_charges
+    )
+
+
+def lots():
+    rng = np.random.default_rng(7)
+    entry_dates = pd.Timestamp("2024-04-01") + pd.to_timedelta(
+        rng.integers(0, 300, 500), unit="D"
+    )
+    # A third of the legs are intraday; amounts span the brokerage cap
+    held = np.where(rng.random(500) < 0.33, 0, rng.integers(1, 60, 500))
+    exit_dates = entry_dates + pd.to_timedelta(held, unit="D")
+    buy = rng.uniform(500, 500_000, 500).round(2)
+    sell = (buy * rng.uniform(0.8, 1.3, 500)).round(2)
+    return list(entry_dates.date), list(exit_dates.date), buy, sell
+
+
+def test_vectorized_charges_match_scalar_formula():
+    entry_dates, exit_dates, buy, sell = lots()
+
+    legs = list(zip(entry_dates, exit_dates, buy, sell))
+
+    vectorized = calculate_charges_vectorized(entry_dates, exit_dates, buy, sell)
+    expected = [scalar_charges(*leg) for leg in legs]
+    single = [calculate_charges(*leg) for leg in legs]
+
+    np.testing.assert_allclose(vectorized, expected, rtol=1e-12)
+    np.testing.assert_allclose(single, expected, rtol=1e-12)
+
+
+def test_allocate_exits_raises_or_skips_over_exits():
+    entries = pd.DataFrame(
+        {
+            "trade_key": [1, 1, 2],
+            "entry_date": [date(2024, 5, 1), date(2024, 5, 3), date(2024, 5, 1)],
+            "remaining_quantity": [10, 10, 10],
+        }
+    )
+    # Trade 1 exits 15 on 2 May, when only its first lot of 10 was open
+    exits = pd.DataFrame(
+        {
+            "trade_key": [1, 2],
+            "exit_date": [date(2024, 5, 2), date(2024, 5, 2)],
+            "quantity": [15, 4],
+        }
+    )
+
+    with pytest.raises(ValueError, match="exceeds open position for trade 1"):
+        allocate_exits(entries, exits)
+
+    allocations, remaining, invalid = allocate_exits(entries, exits, skip_invalid=True)
+    assert invalid == [1]
+    assert allocations.values.tolist() == [[2, 1, 4]]
+    assert remaining.tolist() == [10, 10, 6]
+
+
+def stored_charges():
+    with db_interface.get_engine().connect() as conn:
+        return dict(conn.execute(select(Entry.entry_id, Entry.charges)).all())
+
+
+def test_recompute_matches_insert_exit_and_skips_over_exits(database):
+    trade_id = insert_trade("AAA", 100.0, 10, date(2024, 5, 2), 1.0, 95.0, "BREAKOUT")
+    insert_entry(trade_id, 104.0, 10, date(2024, 5, 6), 0.5, "Pyramid", 99.0)
+    insert_exit(trade_id, 110.0, 15, date(2024, 5, 6), "Market")
+    insert_exit(trade_id, 112.0, 5, date(2024, 6, 12), "Market")
+    # insert_exit takes an exit dated before the entry it consumes
+    backdated = insert_trade("BBB", 50.0, 10, date(2024, 5, 10), 1.0, 45.0, "PULLBACK")
+    insert_exit(backdated, 55.0, 10, date(2024, 5, 1), "Market")
+    recorded = stored_charges()
+
+    assert recompute_charges()
+
+    # insert_exit stores each exit's charges as it goes, so a lot exited twice can
+    # differ from the replay in the last stored digit
+    assert stored_charges() == pytest.approx(recorded, abs=1e-4)
@@ -0,0 +1,70 @@
+from datetime import date
+
+import pandas as pd
+import pytest
+
+import src.trade_diary.equity as equity
+from src.trade_diary.db_interface import (
+    delete_equity_curve,
+    insert_exit,
+    insert_trade,
+)
+
+
+def closed_trade(symbol, entry_date, exit_date, exit_price):
+    trade_id = insert_trade(symbol, 100.0, 10, entry_date, 1.0, 95.0, "BREAKOUT")
+    insert_exit(trade_id, exit_price, 10, exit_date, "Market")
+
+
+@pytest.fixture
+def stats_reads(monkeypatch):
+    reads = []
+
+    def get_trade_stats(financial_year="all", closed_after=None):
+        trades = read(financial_year, closed_after)
+        reads.append((closed_after, len(trades)))
+        return trades
+
+    read = equity.get_trade_stats
+    monkeypatch.setattr(equity, "get_trade_stats", get_trade_stats)
+    return reads
+
+
+def rebuilt(financial_year):
+    delete_equity_curve(financial_year)
+    return equity.get_equity_curve(financial_year)
+
+
+def test_curve_reads_only_trades_closed_after_last_date(database, stats_reads):
+    closed_trade("AAA", date(2024, 5, 2), date(2024, 5, 10), 110.0)
+    closed_trade("BBB", date(2024, 5, 6), date(2024, 5, 20), 93.5)
+    assert len(equity.get_equity_curve("2024-2025")) == 2
+
+    closed_trade("CCC", date(2024, 6, 3), date(2024, 6, 14), 104.25)
+    extended = equity.get_equity_curve("2024-2025")
+
+    assert stats_reads == [(None, 2), (date(2024, 5, 20), 1)]
+    assert extended["date"].dt.date.tolist()[-1] == date(2024, 6, 14)
+    pd.testing.assert_frame_equal(extended, rebuilt("2024-2025"))
+
+
+def test_curve_rebuilds_when_earlier_trades_change(database, stats_reads):
+    closed_trade("AAA", date(2024, 5, 2), date(2024, 5, 10), 110.0)
+    closed_trade("BBB", date(2024, 5, 6), date(2024, 5, 20), 93.5)
+    equity.get_equity_curve("2024-2025")
+
+    # Closes on or before the curve's last date, so the stored totals no longer match
+    closed_trade("CCC", date(2024, 5, 3), date(2024, 5, 15), 104.25)
+    curve = equity.get_equity_curve("2024-2025")
+
+    assert stats_reads == [(None, 2), (None, 3)]
+    assert len(curve) == 3
+    pd.testing.assert_frame_equal(curve, rebuilt("2024-2025"))
+
+
+def test_unchanged_generation_reads_no_trades(database, stats_reads):
+    closed_trade("AAA", date(2024, 5, 2), date(2024, 5, 10), 110.0)
+    first = equity.get_equity_curve("2024-2025")
+
+    pd.testing.assert_frame_equal(equity.get_equity_curve("2024-2025"), first)
+    assert stats_reads == [(None, 1)]
@@ -0,0 +1,53 @@
+from datetime import date
+
+from sqlalchemy import event
+
+import src.trade_diary.db_interface as db_interface
+from src.trade_diary.db_interface import insert_entry, insert_exit, insert_trade
+
+
+def pyramid():
+    trade_id = insert_trade("AAA", 100.0, 10, date(2024, 5, 2), 1.0, 95.0, "BREAKOUT")
+    insert_entry(trade_id, 104.0, 10, date(2024, 5, 6), 0.5, "Pyramid", 99.0)
+    return trade_id
+
+
+def trade_state(trade_id):
+    with db_interface.get_engine().connect() as conn:
+        closed = conn.exec_driver_sql(
+            "SELECT trade_closed FROM trades WHERE trade_id = ?", (trade_id,)
+        ).scalar()
+        remaining = conn.exec_driver_sql(
+            "SELECT remaining_quantity FROM entries WHERE trade_id = ? "
+            "ORDER BY entry_id",
+            (trade_id,),
+        ).scalars()
+        return closed, list(remaining)
+
+
+def test_exits_close_the_trade_with_its_last_share(database):
+    trade_id = pyramid()
+
+    assert insert_exit(trade_id, 110.0, 15, date(2024, 5, 10), "Market")
+    assert trade_state(trade_id) == ("N", [5, 0])
+
+    assert insert_exit(trade_id, 112.0, 5, date(2024, 5, 12), "Market")
+    assert trade_state(trade_id) == ("Y", [0, 0])
+
+
+def test_exit_statement_count(database):
+    trade_id = pyramid()
+    statements = []
+
+    @event.listens_for(database, "before_cursor_execute")
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    for quantity in (15, 5):
+        statements.clear()
+        insert_exit(trade_id, 110.0, quantity, date(2024, 5, 10), "Market")
+        assert len(statements) == 6
+
+
+def test_exit_of_unknown_trade(database):
+    assert not insert_exit(999, 110.0, 5, date(2024, 5, 10), "Market")
@@ -0,0 +1,96 @@
+import io
+
+import pandas as pd
+import pytest
+
+from src.trade_diary.db_interface import (
+    get_all_financial_years,
+    get_trade_stats,
+    get_trades_count,
+)
+from src.trade_diary.export import available_formats, export_table
+
+
+def exported(table, file_format, financial_year="all", chunk_rows=500):
+    return b"".join(export_table(table, file_format, financial_year, chunk_rows))
+
+
+def test_csv_stats_match_get_trade_stats(book):
+    financial_year = get_all_financial_years()[0]
+    stats = get_trade_stats(financial_year).sort_values("trade_id")
+    # The CSV holds setup and financial year as plain strings
+    stats = stats.astype({col: str for col in stats.select_dtypes("category")})
+
+    csv = pd.read_csv(
+        io.BytesIO(exported("stats", "csv", financial_year)),
+        parse_dates=["initial_entry_date", "exit_date"],
+    )
+
+    assert len(stats) > 500
+    pd.testing.assert_frame_equal(
+        csv.sort_values("trade_id").reset_index(drop=True),
+        stats[csv.columns].reset_index(drop=True),
+        check_dtype=False,
+    )
+
+
+def test_tables_cover_open_and_closed_trades(book):
+    financial_year = get_all_financial_years()[0]
+    trades = pd.read_csv(io.BytesIO(exported("trades", "csv", financial_year)))
+    entries = pd.read_csv(io.BytesIO(exported("entries", "csv", financial_year)))
+
+    assert len(trades) == get_trades_count(financial_year=financial_year)
+    assert set(trades["trade_closed"]) == {"Y", "N"}
+    assert len(entries) == trades["num_entries"].sum()
+    assert set(entries["trade_id"]) == set(trades["trade_id"])
+    assert len(pd.read_csv(io.BytesIO(exported("trades", "csv")))) == sum(
+        get_trades_count(financial_year=year) for year in get_all_financial_years()
+    )
+
+
+def test_xlsx_keeps_dates_and_numbers(book):
+    pytest.importorskip("openpyxl")
+    financial_year = get_all_financial_years()[0]
+
+    sheet = pd.read_excel(io.BytesIO(exported("exits", "xlsx", financial_year)))
+    csv = pd.read_csv(
+        io.BytesIO(exported("exits", "csv", financial_year)), parse_dates=["exit_date"]
+    )
+
+    assert sheet["exit_date"].dtype == "datetime64[ns]"
+    pd.testing.assert_frame_equal(sheet, csv, check_dtype=False)
+
+
+def test_parquet_keeps_column_types(book):
+    pytest.importorskip("pyarrow")
+    frame = pd.read_parquet(io.BytesIO(exported("stats", "parquet")))
+
+    assert frame["exit_date"].dtype == "object"
+    assert frame["net_pl"].dtype == "float64"
+    assert frame["holding_days"].dtype == "int64"
+
+
+@pytest.mark.parametrize(
+    "table, file_format, message",
+    [("orders", "csv", "Unknown export table"), ("trades", "pdf", "not available")],
+)
+def test_unknown_table_or_format_fails_before_reading(table, file_format, message):
+    with pytest.raises(ValueError, match=message):
+        export_table(table, file_format)
+
+
+def test_download_route_streams_the_export(book):
+    # Building the app imports every page, which reads the database
+    from src.trade_diary.app import app
+
+    client = app.server.test_client()
+    response = client.get("/export/exits.csv?financial_year=2023-2024")
+
+    assert response.status_code == 200
+    assert response.headers["Content-Disposition"] == (
+        'attachment; filename="trade_diary_exits_2023-2024.csv"'
+    )
+    assert response.data == exported("exits", "csv", "2023-2024")
+    assert client.get("/export/orders.csv").status_code == 404
+    if "parquet" not in available_formats():
+        assert client.get("/export/stats.parquet").status_code == 501
@@ -0,0 +1,106 @@
+from datetime import date
+
+import pytest
+
+from src.trade_diary.db_interface import (
+    get_all_trades_and_entries,
+    get_trades_count,
+    insert_entry,
+    insert_exit,
+    insert_trade,
+)
+
+
+@pytest.fixture
+def grid(database):
+    aaa = insert_trade("AAA", 100.0, 10, date(2024, 5, 2), 1.0, 95.0, "BREAKOUT")
+    insert_exit(aaa, 110.0, 10, date(2024, 5, 20), "Market")
+    insert_trade("A_B", 200.0, 5, date(2024, 6, 10), 0.5, 190.0, "PULLBACK")
+    axb = insert_trade("AXB", 50.0, 20, date(2024, 7, 1), 0.5, 47.0, "REVERSAL")
+    insert_exit(axb, 55.0, 10, date(2024, 7, 15), "Market")
+    ccc = insert_trade("CCC", 300.0, 4, date(2024, 8, 1), 1.0, 285.0, "Breakout")
+    insert_entry(ccc, 310.0, 4, date(2024, 8, 5), 0.5, "Pyramid", 295.0)
+    insert_exit(ccc, 320.0, 8, date(2024, 9, 1), "Market")
+    return database
+
+
+def text(op, value=None):
+    return {"filterType": "text", "type": op, "filter": value}
+
+
+def number(op, value=None, value_to=None):
+    return {"filterType": "number", "type": op, "filter": value, "filterTo": value_to}
+
+
+def grid_date(op, date_from, date_to=None):
+    return {"filterType": "date", "type": op, "dateFrom": date_from, "dateTo": date_to}
+
+
+@pytest.mark.parametrize(
+    "filter_model, symbols",
+    [
+        # LIKE wildcards in the value are matched literally
+        ({"symbol": text("contains", "_")}, ["A_B"]),
+        ({"symbol": text("equals", "aaa")}, ["AAA"]),
+        ({"symbol": text("notContains", "a")}, ["CCC"]),
+        ({"setup": text("startsWith", "break")}, ["AAA", "CCC"]),
+        ({"avg_entry_price": number("inRange", 100, 250)}, ["AAA", "A_B"]),
+        ({"avg_entry_price": number("greaterThan", 250)}, ["CCC"]),
+        ({"num_exits": number("blank")}, []),
+        (
+            {
+                "initial_entry_date": grid_date(
+                    "inRange", "2024-06-01 00:00:00", "2024-07-31 00:00:00"
+                )
+            },
+            ["AXB", "A_B"],
+        ),
+        ({"last_exit_date": grid_date("lessThan", "2024-06-01 00:00:00")}, ["AAA"]),
+        ({"status": {"filterType": "set", "values": ["Open"]}}, ["AXB", "A_B"]),
+        (
+            {
+                "symbol": {
+                    "filterType": "text",
+                    "operator": "OR",
+                    "conditions": [text("equals", "AAA"), text("endsWith", "B")],
+                }
+            },
+            ["AAA", "AXB", "A_B"],
+        ),
+        (
+            {
+                "setup": text("equals", "breakout"),
+                "status": {"filterType": "set", "values": ["Closed"]},
+            },
+            ["AAA", "CCC"],
+        ),
+        # Unknown columns, unsupported filter types and filters without a value
+        # are ignored rather than failing the query
+        ({"no_such_column": text("equals", "AAA")}, ["AAA", "AXB", "A_B", "CCC"]),
+        ({"symbol": {"filterType": "multi"}}, ["AAA", "AXB", "A_B", "CCC"]),
+        ({"symbol": text("equals")}, ["AAA", "AXB", "A_B", "CCC"]),
+    ],
+)
+def test_filter_model_selects_rows_and_count(grid, filter_model, symbols):
+    trades = get_all_trades_and_entries(
+        financial_year="2024-2025", filter_model=filter_model
+    )
+    found = [] if trades is None else sorted(trades["symbol"])
+
+    assert found == symbols
+    assert (
+        get_trades_count(financial_year="2024-2025", filter_model=filter_model)
+        == len(symbols)
+    )
+
+
+def test_filters_combine_with_open_trades_and_paging(grid):
+    filter_model = {"symbol": text("startsWith", "a")}
+    sort_model = [{"colId": "avg_entry_price", "sort": "desc"}]
+
+    page = get_all_trades_and_entries(
+        "open", "2024-2025", filter_model, 0, 1, sort_model
+    )
+
+    assert page["symbol"].tolist() == ["A_B"]
+    assert get_trades_count("open", "2024-2025", filter_model) == 2
@@ -0,0 +1,79 @@
+import pandas as pd
+import pytest
+
+from src.trade_diary.db_interface import get_all_entries, get_trades_count
+from src.trade_diary.importer import import_fills, import_tradebook
+
+
+def tradebook(path, exit_date=None, exit_price=None):
+    pd.DataFrame(
+        {
+            "Symbol": ["AAA"],
+            "Setup": ["Breakout"],
+            "Entry Date": ["2024-05-02"],
+            "Entry Price": [100.0],
+            "Quantity": [10],
+            "Risk %": [1.0],
+            "Stop Loss": [95.0],
+            "Exit Date": [exit_date],
+            "Exit Price": [exit_price],
+        }
+    ).to_csv(path, index=False)
+    return path
+
+
+def test_reimport_skips_imported_rows(database, tmp_path):
+    path = tradebook(tmp_path / "tradebook.csv", "2024-05-20", 110.0)
+
+    first = import_tradebook(path, "%Y-%m-%d")
+    again = import_tradebook(path, "%Y-%m-%d")
+
+    assert (first["trades"], first["exits"], first["skipped"]) == (1, 1, 0)
+    assert (again["trades"], again["exits"], again["skipped"]) == (0, 0, 1)
+    assert get_trades_count(financial_year="2024-2025") == 1
+
+
+def test_reimport_of_open_row_once_closed(database, tmp_path):
+    import_tradebook(tradebook(tmp_path / "open.csv"), "%Y-%m-%d")
+    closed = tradebook(tmp_path / "closed.csv", "2024-05-20", 110.0)
+
+    with pytest.raises(ValueError, match="row 2: AAA entered 2024-05-02"):
+        import_tradebook(closed, "%Y-%m-%d")
+
+    assert get_trades_count(financial_year="2024-2025") == 1
+    assert get_trades_count("open", financial_year="2024-2025") == 1
+
+
+def fills(path, stop_loss):
+    pd.DataFrame(
+        {
+            "Symbol": ["AAA", "AAA", "AAA"],
+            "Trade Time": ["2024-05-02 09:20:00", "2024-05-03 10:00:00", "2024-05-20"],
+            "Side": ["buy", "buy", "sell"],
+            "Quantity": [10, 5, 15],
+            "Price": [100.0, 104.0, 110.0],
+            "Stop Loss": stop_loss,
+            "Risk %": [0.01, 0.005, None],
+        }
+    ).to_csv(path, index=False)
+    return path
+
+
+def test_fills_import_keeps_stop_loss_and_risk(database, tmp_path):
+    path = fills(tmp_path / "fills.csv", [95.0, 99.0, None])
+
+    counts = import_fills(path, "%Y-%m-%d")
+    entries = get_all_entries("2024-2025")
+
+    assert (counts["trades"], counts["exits"]) == (1, 1)
+    assert entries["stop_loss"].tolist() == [95.0, 99.0]
+    assert entries["risk_percentage"].tolist() == [1.0, 0.5]
+
+
+def test_fills_without_stop_loss_on_a_buy_are_rejected(database, tmp_path):
+    path = fills(tmp_path / "fills.csv", [95.0, None, None])
+
+    with pytest.raises(ValueError, match=r"stop_loss is empty for buys \(rows 3\)"):
+        import_fills(path, "%Y-%m-%d")
+
+    assert get_trades_count(financial_year="2024-2025") == 0
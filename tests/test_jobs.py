@@ -0,0 +1,35 @@
+import os
+
+import src.trade_diary.jobs as jobs
+from src.trade_diary.db_interface import (
+    create_import_job,
+    fail_interrupted_import_jobs,
+    get_import_job,
+    update_import_job,
+)
+
+
+def test_runner_fails_only_its_own_interrupted_jobs(database, monkeypatch):
+    own = create_import_job("own.csv")
+    other = create_import_job("other.csv")
+    update_import_job(other, status="running", owner_pid=os.getpid() + 1)
+    legacy = create_import_job("legacy.csv")
+    update_import_job(legacy, owner_pid=None)
+    monkeypatch.setattr(jobs, "_runner", None)
+
+    jobs.get_import_runner()
+
+    assert get_import_job(own)["status"] == "failed"
+    assert get_import_job(legacy)["status"] == "failed"
+    assert get_import_job(other)["status"] == "running"
+
+
+def test_sweep_without_owner_fails_every_unfinished_job(database):
+    running = create_import_job("running.csv")
+    update_import_job(running, status="running", owner_pid=os.getpid() + 1)
+    done = create_import_job("done.csv")
+    update_import_job(done, status="completed")
+
+    assert fail_interrupted_import_jobs() == 1
+    assert get_import_job(running)["status"] == "failed"
+    assert get_import_job(done)["status"] == "completed"
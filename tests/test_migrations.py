@@ -0,0 +1,146 @@
+import sqlite3
+
+import pytest
+from sqlalchemy import delete, inspect, select
+
+import src.trade_diary.migrations as migrations
+from src.trade_diary.db_interface import (
+    Entry,
+    Exits,
+    SchemaVersion,
+    TradeSummary,
+    get_all_entries,
+    get_all_exits,
+)
+
+
+def applied_versions(engine):
+    with engine.connect() as conn:
+        return conn.execute(
+            select(SchemaVersion.version).order_by(SchemaVersion.version)
+        ).scalars().all()
+
+
+def test_fresh_database_records_every_migration(database):
+    indexes = {index["name"] for index in inspect(database).get_indexes("trades")}
+
+    assert applied_versions(database) == [v for v, _, _ in migrations.migrations]
+    assert "ix_trades_closed_fy" in indexes
+
+
+def test_rerun_applies_nothing(database):
+    before = applied_versions(database)
+
+    assert migrations.run_migrations(database) == before[-1]
+    assert applied_versions(database) == before
+
+
+def test_failed_migration_rolls_back_and_raises(database, monkeypatch):
+    latest = migrations.migrations[-1][0]
+
+    def broken(conn):
+        conn.exec_driver_sql("CREATE TABLE half_done (id INTEGER)")
+        raise ValueError("boom")
+
+    monkeypatch.setattr(
+        migrations, "migrations", migrations.migrations + [(latest + 1, "", broken)]
+    )
+
+    try:
+        migrations.run_migrations(database)
+    except RuntimeError as e:
+        assert f"migration {latest + 1}: boom" in str(e)
+    else:
+        raise AssertionError("run_migrations did not raise")
+
+    assert applied_versions(database)[-1] == latest
+    assert not inspect(database).has_table("half_done")
+
+
+# The tables as they were before migrations: prices and amounts as NUMERIC
+legacy_schema = """
+CREATE TABLE trades (
+    trade_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    symbol VARCHAR NOT NULL,
+    initial_entry_date DATE NOT NULL,
+    setup VARCHAR NOT NULL,
+    trade_closed CHAR(1) NOT NULL,
+    financial_year VARCHAR NOT NULL
+);
+CREATE TABLE entries (
+    entry_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    trade_id INTEGER NOT NULL REFERENCES trades (trade_id),
+    entry_date DATE NOT NULL,
+    entry_price NUMERIC(10, 4) NOT NULL,
+    quantity INTEGER NOT NULL,
+    remaining_quantity INTEGER NOT NULL,
+    risk_percentage NUMERIC(5, 2) NOT NULL,
+    entry_type VARCHAR,
+    stop_loss NUMERIC(10, 4) NOT NULL,
+    exit_amount NUMERIC(10, 4) NOT NULL,
+    charges NUMERIC(10, 2) NOT NULL
+);
+CREATE TABLE exits (
+    exit_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    trade_id INTEGER NOT NULL REFERENCES trades (trade_id),
+    exit_date DATE NOT NULL,
+    exit_price NUMERIC(10, 4) NOT NULL,
+    quantity INTEGER NOT NULL,
+    exit_type VARCHAR,
+    exit_reason VARCHAR
+);
+INSERT INTO trades VALUES (1, 'AAA', '2024-05-02', 'BREAKOUT', 'Y', '2024-2025');
+INSERT INTO entries VALUES
+    (1, 1, '2024-05-02', 123.45, 10, 0, 0.75, NULL, 120.5, 1300.5, 21.37),
+    (2, 1, '2024-05-06', 100, 5, 0, 0.5, 'Pyramid', 96.25, 650.25, 9.4);
+INSERT INTO exits VALUES (1, 1, '2024-05-20', 130.05, 15, 'Market', NULL);
+"""
+
+
+@pytest.fixture
+def legacy_database(tmp_path, open_database):
+    path = tmp_path / "legacy.db"
+    with sqlite3.connect(path) as conn:
+        conn.executescript(legacy_schema)
+    return open_database(path)
+
+
+def stored(engine, sql):
+    with engine.connect() as conn:
+        return conn.exec_driver_sql(sql).all()
+
+
+def test_legacy_database_is_converted_to_fixed_point(legacy_database):
+    entries = get_all_entries("2024-2025").sort_values("entry_id")
+
+    assert entries["entry_price"].tolist() == [123.45, 100.0]
+    assert entries["stop_loss"].tolist() == [120.5, 96.25]
+    assert entries["risk_percentage"].tolist() == [0.75, 0.5]
+    assert entries["charges"].tolist() == [21.37, 9.4]
+    assert get_all_exits("2024-2025")["exit_price"].tolist() == [130.05]
+    raw = "SELECT entry_price, charges FROM entries ORDER BY entry_id"
+    assert stored(legacy_database, raw) == [(1234500, 213700), (1000000, 94000)]
+    with legacy_database.connect() as conn:
+        summary = conn.execute(select(TradeSummary.total_buy_amount)).scalar()
+    assert summary == pytest.approx(1734.5)
+
+
+def test_conversion_is_not_repeated_when_schema_version_is_lost(legacy_database):
+    with legacy_database.begin() as conn:
+        conn.execute(delete(SchemaVersion))
+
+    migrations.run_migrations(legacy_database)
+
+    entries = get_all_entries("2024-2025").sort_values("entry_id")
+    assert entries["entry_price"].tolist() == [123.45, 100.0]
+    assert get_all_exits("2024-2025")["exit_price"].tolist() == [130.05]
+    assert applied_versions(legacy_database) == [
+        v for v, _, _ in migrations.migrations
+    ]
+
+
+def test_converted_tables_keep_the_model_indexes(legacy_database):
+    for model in (Entry, Exits):
+        table = model.__table__
+        indexes = inspect(legacy_database).get_indexes(table.name)
+        assert {index["name"] for index in indexes} == {i.name for i in table.indexes}
@@ -0,0 +1,48 @@
+import pandas as pd
+import pytest
+
+from src.trade_diary.db_interface import get_all_financial_years, get_trade_stats
+from tests.pandas_reference import reference_stats, reference_summaries
+
+# A groupby mean uses compensated summation and the reference's Series.mean does
+# not, so a win or loss average that lands exactly on a half cent may round a cent
+# apart; RR and AWLR are ratios of those averages. Every other cell must be exact.
+averaged = {"Win Avg": 0.01, "Loss Avg": 0.01, "RR": 0.01, "AWLR": 0.01}
+
+
+@pytest.mark.parametrize("scope", ["years", "all"])
+def test_group_summaries_match_per_group_loop(book, scope):
+    # Imported once the test database is in place: building the app imports every
+    # page, and the Trades page reads the financial years when it loads
+    import src.trade_diary.app  # noqa: F401
+    from src.trade_diary.pages import stats
+
+    years = get_all_financial_years() if scope == "years" else ["all"]
+    for financial_year in years:
+        trades = stats.add_grouping_columns(get_trade_stats(financial_year))
+        actual = stats.group_summaries(trades)
+        reference = stats.add_grouping_columns(
+            reference_stats(financial_year).reset_index()
+        )
+        expected = reference_summaries(
+            reference, stats.groupers, stats.summary_columns
+        )
+
+        for name in stats.groupers:
+            # The reference keeps Set-Up as a category; the values are the same
+            expected[name][name] = expected[name][name].astype(str)
+            exact = actual[name].columns.difference(list(averaged), sort=False)
+            pd.testing.assert_frame_equal(
+                actual[name][exact],
+                expected[name][exact],
+                check_dtype=False,
+                check_exact=True,
+            )
+            for column, tolerance in averaged.items():
+                pd.testing.assert_series_equal(
+                    actual[name][column],
+                    expected[name][column],
+                    check_exact=False,
+                    rtol=0,
+                    atol=tolerance + 1e-9,
+                )
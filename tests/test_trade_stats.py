@@ -0,0 +1,126 @@
+from datetime import date
+
+import numpy as np
+import pytest
+from sqlalchemy import insert
+
+from src.trade_diary.db_interface import (
+    Entry,
+    Exits,
+    Trade,
+    get_all_exits,
+    get_all_financial_years,
+    get_trade_stats,
+)
+from tests.pandas_reference import reference_stats
+
+
+compared = [
+    "quantity",
+    "entry_amount",
+    "risked_amount",
+    "risk_percentage",
+    "charges",
+    "gross_pl",
+    "net_pl",
+    "net_pl_percentage",
+    "gross_R",
+    "net_R",
+    "win",
+    "holding_days",
+]
+
+
+@pytest.mark.parametrize("scope", ["years", "all"])
+def test_trade_stats_match_pandas_reference(book, scope):
+    years = get_all_financial_years() if scope == "years" else ["all"]
+    for financial_year in years:
+        stats = get_trade_stats(financial_year).set_index("trade_id").sort_index()
+        expected = reference_stats(financial_year)
+
+        assert stats.index.equals(expected.index)
+        for column in compared:
+            mismatched = stats[column].to_numpy() != expected[column].to_numpy()
+            assert not mismatched.any(), (
+                f"{financial_year} {column}: {mismatched.sum()} trades differ, e.g. "
+                f"{stats.loc[mismatched, column].head(3).tolist()} != "
+                f"{expected.loc[mismatched, column].head(3).tolist()}"
+            )
+
+
+def test_cumulative_totals_follow_exit_order(book):
+    stats = get_trade_stats("all")
+    by_exit = stats.sort_values(["exit_date", "trade_id"])
+
+    np.testing.assert_allclose(
+        by_exit["cumulative_net_pl"], by_exit["net_pl"].cumsum(), atol=1e-6
+    )
+    np.testing.assert_allclose(
+        by_exit["cumulative_net_R"], by_exit["net_R"].cumsum(), atol=1e-6
+    )
+
+
+# Charges of 169.0128 and 263.8022 add up to 432.81500000000005 as floats, so the
+# pandas path rounded a net P&L of -6847.325 down; exact fixed-point sums round up
+def test_half_cent_ties_round_like_pandas(database):
+    with database.begin() as conn:
+        conn.execute(
+            insert(Trade),
+            [
+                {
+                    "trade_id": 1,
+                    "symbol": "AAA",
+                    "initial_entry_date": date(2024, 5, 2),
+                    "setup": "BREAKOUT",
+                    "trade_closed": "Y",
+                    "financial_year": "2024-2025",
+                }
+            ],
+        )
+        conn.execute(
+            insert(Entry),
+            [
+                {
+                    "trade_id": 1,
+                    "entry_date": date(2024, 5, day),
+                    "entry_price": 100.0,
+                    "quantity": 100,
+                    "remaining_quantity": 0,
+                    "risk_percentage": 0.5,
+                    "stop_loss": 95.0,
+                    "exit_amount": exit_amount,
+                    "charges": charges,
+                }
+                for day, exit_amount, charges in (
+                    (2, 6792.74, 169.0128),
+                    (3, 6792.75, 263.8022),
+                )
+            ],
+        )
+        conn.execute(
+            insert(Exits),
+            [
+                {
+                    "trade_id": 1,
+                    "exit_date": date(2024, 5, 20),
+                    "exit_price": 67.9275,
+                    "quantity": 200,
+                    "exit_type": "Market",
+                    "exit_reason": "",
+                }
+            ],
+        )
+
+    stats = get_trade_stats("2024-2025")
+
+    assert stats["gross_pl"].tolist() == [-6414.51]
+    assert stats["net_pl"].tolist() == [-6847.33]
+    assert stats["net_pl"].tolist() == reference_stats("2024-2025")["net_pl"].tolist()
+
+
+def test_exits_are_scoped_like_the_stats(book):
+    for financial_year in get_all_financial_years():
+        exits = get_all_exits(financial_year)
+        stats = get_trade_stats(financial_year)
+
+        assert set(exits["trade_id"]) == set(stats["trade_id"])
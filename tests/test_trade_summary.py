@@ -0,0 +1,46 @@
+from datetime import date
+
+import pytest
+from sqlalchemy import select
+
+import src.trade_diary.db_interface as db_interface
+from src.trade_diary.db_interface import (
+    TradeSummary,
+    delete_trade,
+    insert_entry,
+    insert_exit,
+    insert_trade,
+    rebuild_trade_summary,
+)
+
+
+def summaries():
+    with db_interface.get_engine().connect() as conn:
+        rows = conn.execute(select(*TradeSummary.__table__.columns)).all()
+    return {row.trade_id: row._asdict() for row in rows}
+
+
+def test_writes_keep_summary_equal_to_a_rebuild(database):
+    pyramid = insert_trade("AAA", 100.0, 10, date(2024, 5, 2), 1.0, 95.0, "BREAKOUT")
+    insert_entry(pyramid, 104.35, 10, date(2024, 5, 6), 0.5, "Pyramid", 99.0)
+    insert_exit(pyramid, 110.2, 15, date(2024, 5, 20), "Market")
+    # An exit dated before the last one leaves last_exit_date where it was
+    insert_exit(pyramid, 108.0, 5, date(2024, 5, 13), "Market")
+    partial = insert_trade("BBB", 250.5, 8, date(2024, 6, 3), 0.75, 240.0, "PULLBACK")
+    insert_exit(partial, 262.75, 3, date(2024, 6, 10), "Stop Loss")
+    untouched = insert_trade("CCC", 42.0, 100, date(2024, 7, 1), 0.5, 40.0, "REVERSAL")
+    deleted = insert_trade("DDD", 10.0, 10, date(2024, 7, 2), 0.5, 9.0, "REVERSAL")
+    insert_exit(deleted, 11.0, 10, date(2024, 7, 9), "Market")
+    assert delete_trade(deleted)
+
+    incremental = summaries()
+    assert rebuild_trade_summary()
+    rebuilt = summaries()
+
+    assert set(incremental) == set(rebuilt) == {pyramid, partial, untouched}
+    assert incremental[pyramid]["last_exit_date"] == date(2024, 5, 20)
+    assert incremental[partial]["total_remaining_quantity"] == 5
+    for trade_id, expected in rebuilt.items():
+        # insert_exit adds each exit's charges to the total as it goes; a rebuild
+        # sums the per-entry charges, which can differ in the fourth decimal
+        assert incremental[trade_id] == pytest.approx(expected, abs=1e-4)
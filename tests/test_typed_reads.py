@@ -0,0 +1,37 @@
+from datetime import date
+
+from src.trade_diary.db_interface import (
+    get_all_entries,
+    get_all_exits,
+    get_all_trades,
+    insert_exit,
+    insert_trade,
+)
+
+
+def test_readers_return_typed_frames(database):
+    trade_id = insert_trade("aaa", 100.0, 10, date(2024, 5, 2), 1.0, 95.0, "breakout")
+    insert_exit(trade_id, 110.0, 10, date(2024, 5, 20), "Market")
+    insert_trade("BBB", 50.0, 5, date(2024, 6, 3), 1.0, 45.0, "PULLBACK")
+
+    trades = get_all_trades("2024-2025")
+    entries = get_all_entries("2024-2025")
+    exits = get_all_exits()
+
+    assert trades["symbol"].tolist() == ["AAA"]
+    assert str(trades["symbol"].dtype) == "category"
+    assert str(trades["initial_entry_date"].dtype) == "datetime64[ns]"
+    assert str(trades["trade_id"].dtype) == "int64"
+    assert entries["entry_price"].tolist() == [100.0]
+    assert str(entries["quantity"].dtype) == "int32"
+    assert str(entries["entry_date"].dtype) == "datetime64[ns]"
+    assert exits["exit_date"].dt.date.tolist() == [date(2024, 5, 20)]
+
+
+def test_readers_keep_dtypes_when_empty(database):
+    trades = get_all_trades()
+    exits = get_all_exits("2024-2025")
+
+    assert trades.empty and exits.empty
+    assert str(trades["initial_entry_date"].dtype) == "datetime64[ns]"
+    assert str(exits["quantity"].dtype) == "int32"
@@ -0,0 +1,47 @@
+from datetime import datetime
+
+from src.trade_diary.db_interface import create_import_job, update_import_job
+
+
+def job_history():
+    # Building the app imports every page, which reads the database; the fixture
+    # has to be in place first
+    import src.trade_diary.app  # noqa: F401
+    from src.trade_diary.pages.upload import job_history_table
+
+    return job_history_table()
+
+
+def history_rows(table):
+    body = table.children[1]
+    return [[cell.children for cell in row.children] for row in body.children]
+
+
+def test_job_history_while_first_job_runs(database):
+    job_id = create_import_job("tradebook.csv")
+    update_import_job(job_id, status="running", started_on=datetime.now())
+
+    rows = history_rows(job_history())
+
+    assert len(rows) == 1
+    assert rows[0][2] == "running"
+    assert rows[0][-1] == ""
+
+
+def test_job_history_with_finished_job(database):
+    create_import_job("first.csv")
+    finished = create_import_job("second.csv")
+    update_import_job(
+        finished,
+        status="completed",
+        finished_on=datetime(2025, 1, 31, 10, 30),
+        rows=4,
+        trades=2,
+        exits=2,
+    )
+
+    rows = history_rows(job_history())
+
+    assert [row[1] for row in rows] == ["second.csv", "first.csv"]
+    assert rows[0][-1] == "2025-01-31 10:30:00"
+    assert rows[1][-1] == ""